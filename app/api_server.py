@@ -1,21 +1,31 @@
-from fastapi import FastAPI, UploadFile, File, Form, Request, Response
+from fastapi import FastAPI, UploadFile, File, Form, Request, Response, Body, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from app.config import config
 import uvicorn
 from pydantic import BaseModel, field_validator
-from typing import Dict, Any, Optional, List
-from app.database.transactions import insert_email_queues, check_email_type_registration
-from app.utils.attachment_processor import process_attachments
-from app.utils.rabbitmq_publisher import publish_to_rabbitmq
+from typing import Dict, Any, Optional, List, Union
+from app.database.connect import open_pool, close_pool, get_pool_stats
+from app.database.transactions import insert_email_queues, insert_email_queues_batch, get_email_statuses
+from app.database.email_type_cache import email_type_cache, EMAIL_TYPES_CHANNEL
+from app.database.listener import notification_listener
+from app.utils.attachment_processor import prepare_attachments, discard_attachments
+from app.utils.template_registry import template_registry
+from app.utils.rate_limiter import build_rate_limiter
+from app.utils.quota_admission import quota_admission, get_client_id
+from app.utils.backpressure import queue_backpressure
+from app.utils.rabbitmq_publisher import rabbitmq_publisher
+from app.utils.status_hub import email_status_hub, describe_status, EMAIL_STATUS_CHANNEL, FINAL_STATUSES, RESYNC
+from app.utils.server_utils import PreforkServer
 from app.utils.logger import print_logging
+import asyncio
 import json
+import math
+import orjson
 import time
+import uuid
 from datetime import datetime
 from functools import wraps
-
-if config.RATE_LIMIT_ENABLED:
-    from slowapi import Limiter, _rate_limit_exceeded_handler
-    from slowapi.util import get_remote_address
-    from slowapi.errors import RateLimitExceeded
+from contextlib import asynccontextmanager
 
 
 class EmailQueueRequest(BaseModel):
@@ -32,13 +42,10 @@ class EmailQueueRequest(BaseModel):
     @classmethod
     def validate_template_exists(cls, v):
         template_name = v if v.endswith('.html') else f"{v}.html"
-        try:
-            from app.config import jinja_env
-            jinja_env.get_template(template_name)
-            return v
-        except Exception as e:
-            error_msg = f"Template '{template_name}' does not exist in templates folders: {str(e)}"
+        if not template_registry.exists(template_name):
+            error_msg = f"Template '{template_name}' does not exist in templates folders"
             raise ValueError(error_msg)
+        return v
 
 class QueueEmailResponse(BaseModel):
     success: bool
@@ -47,31 +54,185 @@ class QueueEmailResponse(BaseModel):
     email_id: Optional[str] = None
     attachments_processed: Optional[int] = None
 
-app = FastAPI()
+class FastJSONResponse(Response):
+    """JSON response rendered with orjson instead of the standard library encoder."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+class SlimQueueEmailResponse(BaseModel):
+    success: bool
+    email_id: Optional[str] = None
+    status: str
+
+class BatchQueueItemResult(BaseModel):
+    index: int
+    success: bool
+    email_id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchQueueEmailResponse(BaseModel):
+    success: bool
+    message: str
+    queued: int
+    failed: int
+    results: List[BatchQueueItemResult]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        open_pool()
+    except Exception as e:
+        print_logging("error", f"Database pool could not be opened at startup, will retry on first use: {str(e)}")
+    await asyncio.to_thread(email_type_cache.load)
+    template_registry.load()
+    template_registry.start()
+    if config.EMAIL_TYPE_CACHE_LISTEN:
+        notification_listener.subscribe(EMAIL_TYPES_CHANNEL, email_type_cache.invalidate, on_reconnect=email_type_cache.load)
+    notification_listener.subscribe(EMAIL_STATUS_CHANNEL, email_status_hub.publish, on_reconnect=email_status_hub.resync)
+    notification_listener.start()
+    if queue_backpressure is not None:
+        queue_backpressure.start()
+    yield
+    if queue_backpressure is not None:
+        await queue_backpressure.stop()
+    await rabbitmq_publisher.stop()
+    template_registry.stop()
+    notification_listener.stop()
+    close_pool()
+
+app = FastAPI(lifespan=lifespan)
 app_start_time = time.time()
 
-if config.RATE_LIMIT_ENABLED:
-    limiter = Limiter(
-        key_func=get_remote_address,
-        default_limits=[],
-        headers_enabled=True
-    )
-    app.state.limiter = limiter
-    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+rate_limiter = build_rate_limiter() if config.RATE_LIMIT_ENABLED else None
 
-def rate_limit_exempt_with_grace_period(f):
+def rate_limited(f):
+    """
+    Enforce the per-IP and global limits on an endpoint taking `request` and `response` arguments,
+    and report the tightest limit in X-RateLimit-Limit, X-RateLimit-Remaining and X-RateLimit-Reset.
+    Requests are exempt during the first RATE_LIMIT_GRACE_PERIOD_SECONDS after startup.
+    """
     @wraps(f)
     async def wrapper(*args, **kwargs):
         elapsed = time.time() - app_start_time
-        if elapsed < config.RATE_LIMIT_GRACE_PERIOD_SECONDS:
+        if rate_limiter is None or elapsed < config.RATE_LIMIT_GRACE_PERIOD_SECONDS:
             return await f(*args, **kwargs)
-        return await f(*args, **kwargs)
+
+        request = kwargs["request"]
+        client_ip = request.client.host if request.client else "unknown"
+        allowed, retry_after, headers = rate_limiter.check(client_ip)
+        if not allowed:
+            return JSONResponse(
+                status_code=429,
+                content={"error": "Rate limit exceeded"},
+                headers={**headers, "Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+        result = await f(*args, **kwargs)
+        # endpoints either return their own response or fill in the injected one
+        (result if isinstance(result, Response) else kwargs["response"]).headers.update(headers)
+        return result
     return wrapper
 
+async def enqueue_email(payload, attachments=None, slim=False, client_id=None):
+    """
+    Store the attachments, then register a validated payload together with its outbox message
+    and attachment rows in one transaction.
+    The outbox relay publishes the message, so the request only waits for the database commit.
+    Returns the HTTP status code, the response body and extra response headers;
+    slim bodies carry only the id and status.
+    """
+    # check first if the payload's email type is registered to avoid PK and FK relationship
+    # a TTL or miss reload queries the database, which must not block the event loop
+    is_email_type_exists = await asyncio.to_thread(email_type_cache.is_registered, payload.email_type)
+
+    if not is_email_type_exists:
+        if slim:
+            return 422, SlimQueueEmailResponse(success=False, status="rejected"), {}
+        return 422, QueueEmailResponse(
+            success=False,
+            message="Email type is not registered"
+        ), {}
+
+    if queue_backpressure is not None:
+        admitted, status_code, retry_after = queue_backpressure.admit(payload.priority_level)
+        if not admitted:
+            headers = {"Retry-After": str(retry_after)}
+            if slim:
+                return status_code, SlimQueueEmailResponse(success=False, status="throttled" if status_code == 429 else "unavailable"), headers
+            return status_code, QueueEmailResponse(
+                success=False,
+                message=f"Queue backlog too large for priority {payload.priority_level}, retry after {retry_after} seconds"
+            ), headers
+
+    if quota_admission is not None:
+        admitted, retry_after = quota_admission.admit(client_id, payload.email_type)
+        if not admitted:
+            headers = {"Retry-After": str(max(1, math.ceil(retry_after)))}
+            if slim:
+                return 429, SlimQueueEmailResponse(success=False, status="throttled"), headers
+            return 429, QueueEmailResponse(
+                success=False,
+                message=f"Quota exceeded, retry after {headers['Retry-After']} seconds"
+            ), headers
+
+    # files are stored before the insert, so the committed message always has its attachments
+    prepared_attachments = await prepare_attachments(attachments) if attachments else []
+    email_data = await asyncio.to_thread(insert_email_queues, payload, attachments=prepared_attachments)
+    if not email_data:
+        await discard_attachments(prepared_attachments)
+
+    if email_data is None:
+        if slim:
+            return 422, SlimQueueEmailResponse(success=False, status="rejected"), {}
+        return 422, QueueEmailResponse(
+            success=False,
+            message="Email type is not registered"
+        ), {}
+
+    if not email_data:
+        if slim:
+            return 500, SlimQueueEmailResponse(success=False, status="failed"), {}
+        return 500, QueueEmailResponse(
+            success=False,
+            message="Failed to register the request into email queue",
+            data=None
+        ), {}
+
+    email_queue_id = email_data["id"]
+
+    if slim:
+        return 201, SlimQueueEmailResponse(success=True, email_id=email_queue_id, status="queued"), {}
+
+    return 201, QueueEmailResponse(
+        success=True,
+        message=f"Email {email_queue_id} received and queued successfully",
+        data=payload.model_dump(),
+        email_id=email_queue_id,
+        attachments_processed=len(prepared_attachments) if attachments else None
+    ), {}
+
+@app.get("/api/v1/health")
+async def health():
+    return {
+        "uptime_seconds": round(time.time() - app_start_time, 3),
+        "database_pool": get_pool_stats(),
+        "email_type_cache": email_type_cache.stats(),
+        "template_registry": template_registry.stats(),
+        "quota_admission": quota_admission.stats() if quota_admission is not None else None,
+        "backpressure": queue_backpressure.stats() if queue_backpressure is not None else None,
+        "status_hub": email_status_hub.stats()
+    }
+
+@app.post("/api/v1/templates/reload")
+async def reload_templates():
+    return {
+        "success": True,
+        "templates": template_registry.reload()
+    }
+
 @app.post("/api/v1/emails/queue")
-@limiter.limit(f"{config.RATE_LIMIT_PER_MINUTE}/minute") if config.RATE_LIMIT_ENABLED else lambda f: f
-@limiter.limit(f"{config.RATE_LIMIT_PER_HOUR}/hour") if config.RATE_LIMIT_ENABLED else lambda f: f
-@rate_limit_exempt_with_grace_period if config.RATE_LIMIT_ENABLED else lambda f: f
+@rate_limited
 async def queue_email(
     response: Response,
     request: Request,
@@ -83,10 +244,11 @@ async def queue_email(
     to_addresses: Optional[List[str]] = Form(None),
     cc_addresses: Optional[List[str]] = Form(None),
     bcc_addresses: Optional[List[str]] = Form(None),
-    attachments: Optional[List[UploadFile]] = File(None)
-) -> QueueEmailResponse:
+    attachments: Optional[List[UploadFile]] = File(None),
+    slim: bool = False
+) -> Union[QueueEmailResponse, SlimQueueEmailResponse]:
     try:
-        email_data_dict = json.loads(email_data)
+        email_data_dict = orjson.loads(email_data)
 
         if isinstance(email_data_dict, dict) and "email_data" in email_data_dict:
             email_data_dict = email_data_dict["email_data"]
@@ -122,53 +284,298 @@ async def queue_email(
             data=None
         )
         
-    # check first if the payload's email type is registered to avoid PK and FK relationship
-    is_email_type_exists = check_email_type_registration(payload.email_type)
-    
-    if not is_email_type_exists:
-        response.status_code = 422
-        return QueueEmailResponse(
-            success=False,
-            message="Email type is not registered"
+    status_code, result, headers = await enqueue_email(payload, attachments, slim, get_client_id(request))
+    response.status_code = status_code
+    response.headers.update(headers)
+    return result
+
+@app.post(
+    "/api/v1/emails/queue/json",
+    response_class=FastJSONResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": EmailQueueRequest.model_json_schema()}}
+        }
+    }
+)
+@rate_limited
+async def queue_email_json(
+    response: Response,
+    request: Request,
+    slim: bool = False
+) -> FastJSONResponse:
+    try:
+        payload_dict = orjson.loads(await request.body())
+    except orjson.JSONDecodeError as e:
+        print_logging("error", f"Invalid JSON request body: {str(e)}")
+        return FastJSONResponse(
+            status_code=400,
+            content={"success": False, "message": "Invalid JSON format in request body", "data": None}
         )
 
-    email_data = insert_email_queues(payload)
+    try:
+        payload = EmailQueueRequest.model_validate(payload_dict)
+    except Exception as e:
+        print_logging("error", f"Payload validation failed: {str(e)}")
+        return FastJSONResponse(
+            status_code=400,
+            content={"success": False, "message": f"Payload validation failed: {str(e)}", "data": None}
+        )
 
-    if not email_data:
-        response.status_code = 500
-        return QueueEmailResponse(
+    status_code, result, headers = await enqueue_email(payload, slim=slim, client_id=get_client_id(request))
+    return FastJSONResponse(status_code=status_code, content=result.model_dump(exclude_none=slim), headers=headers)
+
+@app.post("/api/v1/emails/queue/batch")
+@rate_limited
+async def queue_email_batch(
+    response: Response,
+    request: Request,
+    emails: List[Dict[str, Any]] = Body(...)
+) -> BatchQueueEmailResponse:
+    if len(emails) == 0 or len(emails) > config.BATCH_MAX_SIZE:
+        response.status_code = 400
+        return BatchQueueEmailResponse(
             success=False,
-            message="Failed to register the request into email queue",
-            data=None
+            message=f"Batch must contain between 1 and {config.BATCH_MAX_SIZE} emails",
+            queued=0,
+            failed=len(emails),
+            results=[]
         )
-    
-    email_queue_id = email_data["id"]
-    attachment_count = 0
-    
-    if attachments:
-        attachment_count = await process_attachments(attachments, email_queue_id)
-    
-    published = publish_to_rabbitmq(email_data, payload.priority_level)
 
-    if published:
+    results = [None] * len(emails)
+    valid = []
+    server_error = False
+
+    for index, item in enumerate(emails):
+        try:
+            valid.append((index, EmailQueueRequest(**item)))
+        except Exception as e:
+            results[index] = BatchQueueItemResult(index=index, success=False, error=f"Payload validation failed: {str(e)}")
+
+    registered_types = set()
+    for email_type in {payload.email_type for _, payload in valid}:
+        if await asyncio.to_thread(email_type_cache.is_registered, email_type):
+            registered_types.add(email_type)
+    client_id = get_client_id(request)
+    accepted = []
+    retry_after = 0.0
+    shed_status = None
+    for index, payload in valid:
+        if payload.email_type not in registered_types:
+            results[index] = BatchQueueItemResult(index=index, success=False, error="Email type is not registered")
+            continue
+
+        if queue_backpressure is not None:
+            admitted, status_code, wait = queue_backpressure.admit(payload.priority_level)
+            if not admitted:
+                retry_after = max(retry_after, wait)
+                shed_status = max(shed_status or 0, status_code)
+                results[index] = BatchQueueItemResult(index=index, success=False, error="Queue backlog too large")
+                continue
+
+        if quota_admission is not None:
+            admitted, wait = quota_admission.admit(client_id, payload.email_type)
+            if not admitted:
+                retry_after = max(retry_after, wait)
+                results[index] = BatchQueueItemResult(index=index, success=False, error="Quota exceeded")
+                continue
+
+        accepted.append((index, payload))
+
+    if accepted:
+        email_data_list = await asyncio.to_thread(insert_email_queues_batch, [payload for _, payload in accepted])
+        if email_data_list is None:
+            # one item violated a constraint and rolled back the statement; insert them one by one
+            # so the valid items are kept and each failure is reported on its own item
+            email_data_list = [await asyncio.to_thread(insert_email_queues, payload) for _, payload in accepted]
+
+        if email_data_list is False:
+            email_data_list = [False] * len(accepted)
+        for (index, _), email_data in zip(accepted, email_data_list):
+            if email_data:
+                results[index] = BatchQueueItemResult(index=index, success=True, email_id=str(email_data["id"]))
+            elif email_data is None:
+                results[index] = BatchQueueItemResult(index=index, success=False, error="Email type is not registered")
+            else:
+                server_error = True
+                results[index] = BatchQueueItemResult(index=index, success=False, error="Failed to register the request into email queue")
+
+    queued = sum(1 for result in results if result.success)
+    failed = len(results) - queued
+
+    if failed == 0:
         response.status_code = 201
-        return QueueEmailResponse(
-            success=True,
-            message=f"Email {email_queue_id} received and published successfully",
-            data=payload.model_dump(),
-            email_id=email_queue_id,
-            attachments_processed=attachment_count if attachments else None
-        )
-    else:
+    elif queued > 0:
+        response.status_code = 207
+    elif server_error:
         response.status_code = 500
-        print_logging('critical', f"Email {email_queue_id} inserted but failed to publish to queue")
-        return QueueEmailResponse(
-            success=False,
-            message=f"Email {email_queue_id} inserted but failed to publish to queue",
-            data=payload.model_dump(),
-            email_id=email_queue_id,
-            attachments_processed=attachment_count if attachments else None
-        )
-    
+    elif shed_status is not None:
+        response.status_code = shed_status
+    else:
+        response.status_code = 429 if retry_after > 0 else 400
+
+    if retry_after > 0:
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+
+    return BatchQueueEmailResponse(
+        success=failed == 0,
+        message=f"{queued} of {len(results)} emails received and queued successfully",
+        queued=queued,
+        failed=failed,
+        results=results
+    )
+
+def parse_email_ids(values):
+    """Normalize email ids to canonical UUID strings, dropping duplicates. Raises ValueError on an invalid id."""
+    return list(dict.fromkeys(str(uuid.UUID(value)) for value in values))
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+async def stream_email_statuses(request, email_ids):
+    """
+    Server-sent events for the given emails.
+    - A status (or missing) event per email first, then one status event per change
+    - Ends with an end event once every email reached a final status or after STATUS_STREAM_MAX_SECONDS
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    # subscribe before reading the current statuses so no change falls in between
+    email_status_hub.subscribe(email_ids, queue, loop)
+    try:
+        rows = await asyncio.to_thread(get_email_statuses, email_ids)
+        if rows is False:
+            yield format_sse("error", {"message": "Failed to look up email statuses"})
+            return
+
+        pending = set()
+        for email_id in email_ids:
+            row = rows.get(email_id)
+            if row is None:
+                yield format_sse("missing", {"id": email_id})
+                continue
+            yield format_sse("status", describe_status(row))
+            if row["status"] not in FINAL_STATUSES:
+                pending.add(email_id)
+
+        deadline = loop.time() + config.STATUS_STREAM_MAX_SECONDS
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            try:
+                update = await asyncio.wait_for(queue.get(), timeout=min(remaining, config.STATUS_STREAM_KEEPALIVE_SECONDS))
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+
+            if update is RESYNC:
+                rows = await asyncio.to_thread(get_email_statuses, sorted(pending)) or {}
+                updates = list(rows.values())
+            else:
+                updates = [update] if update.get("id") in pending else []
+
+            for row in updates:
+                yield format_sse("status", describe_status(row))
+                if row["status"] in FINAL_STATUSES:
+                    pending.discard(row["id"])
+
+        yield format_sse("end", {"pending": sorted(pending)})
+    finally:
+        email_status_hub.unsubscribe(email_ids, queue, loop)
+
+@app.get("/api/v1/emails/events")
+async def email_status_events(request: Request, ids: List[str] = Query(...)):
+    try:
+        email_ids = parse_email_ids(ids)
+    except ValueError:
+        return FastJSONResponse(status_code=400, content={"success": False, "message": "Email ids must be UUIDs"})
+
+    if len(email_ids) > config.BATCH_MAX_SIZE:
+        return FastJSONResponse(status_code=400, content={"success": False, "message": f"At most {config.BATCH_MAX_SIZE} emails can be watched per stream"})
+
+    return StreamingResponse(
+        stream_email_statuses(request, email_ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/v1/emails/status", response_class=FastJSONResponse)
+async def email_statuses(emails: List[str] = Body(...)):
+    if len(emails) == 0 or len(emails) > config.BATCH_MAX_SIZE:
+        return FastJSONResponse(status_code=400, content={"success": False, "message": f"Lookup must contain between 1 and {config.BATCH_MAX_SIZE} email ids"})
+
+    try:
+        email_ids = parse_email_ids(emails)
+    except ValueError:
+        return FastJSONResponse(status_code=400, content={"success": False, "message": "Email ids must be UUIDs"})
+
+    rows = await asyncio.to_thread(get_email_statuses, email_ids)
+    if rows is False:
+        return FastJSONResponse(status_code=500, content={"success": False, "message": "Failed to look up email statuses"})
+
+    return FastJSONResponse(content={
+        "success": True,
+        "results": [describe_status(rows[email_id]) for email_id in email_ids if email_id in rows],
+        "missing": [email_id for email_id in email_ids if email_id not in rows]
+    })
+
+@app.get("/api/v1/emails/{email_id}", response_class=FastJSONResponse)
+async def email_status(email_id: str, wait: float = 0):
+    """
+    Current status of one email.
+    With wait > 0 a pending email is held open (long poll) until its status changes or
+    min(wait, STATUS_LONG_POLL_MAX_SECONDS) passes.
+    """
+    try:
+        email_id = parse_email_ids([email_id])[0]
+    except ValueError:
+        return FastJSONResponse(status_code=400, content={"success": False, "message": "Email id must be a UUID"})
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    timeout = min(wait, config.STATUS_LONG_POLL_MAX_SECONDS)
+    if timeout > 0:
+        email_status_hub.subscribe([email_id], queue, loop)
+
+    try:
+        rows = await asyncio.to_thread(get_email_statuses, [email_id])
+        if rows is False:
+            return FastJSONResponse(status_code=500, content={"success": False, "message": "Failed to look up email status"})
+        if email_id not in rows:
+            return FastJSONResponse(status_code=404, content={"success": False, "message": f"Email {email_id} not found"})
+
+        row = rows[email_id]
+        if timeout > 0 and row["status"] not in FINAL_STATUSES:
+            try:
+                update = await asyncio.wait_for(queue.get(), timeout=timeout)
+                if update is RESYNC:
+                    row = (await asyncio.to_thread(get_email_statuses, [email_id]) or {}).get(email_id, row)
+                else:
+                    row = {**row, "status": update["status"], "sent_at": update.get("sent_at")}
+            except asyncio.TimeoutError:
+                pass
+
+        return FastJSONResponse(content=describe_status(row))
+    finally:
+        if timeout > 0:
+            email_status_hub.unsubscribe([email_id], queue, loop)
+
 if __name__ == '__main__':
-    uvicorn.run(app, host=config.API_HOST, port=config.API_PORT)
\ No newline at end of file
+    if config.API_WORKERS > 1:
+        # the app is already imported here, so workers share it; the lifespan opens pools and threads per worker
+        PreforkServer(
+            app,
+            host=config.API_HOST,
+            port=config.API_PORT,
+            workers=config.API_WORKERS,
+            reuse_port=config.API_REUSE_PORT,
+            backlog=config.API_BACKLOG,
+            graceful_timeout=config.API_GRACEFUL_TIMEOUT_SECONDS
+        ).run()
+    else:
+        uvicorn.run(app, host=config.API_HOST, port=config.API_PORT)
\ No newline at end of file
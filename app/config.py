@@ -1,6 +1,7 @@
 from dotenv import load_dotenv
 import os
-from jinja2 import Environment, FileSystemLoader, ChoiceLoader
+import socket
+from jinja2 import Environment, FileSystemLoader, ChoiceLoader, FileSystemBytecodeCache
 
 load_dotenv(override=True)
 
@@ -9,6 +10,10 @@ class Config:
     
     API_HOST = os.getenv("API_HOST", "0.0.0.0")
     API_PORT = int(os.getenv("API_PORT", "8000"))
+    API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+    API_REUSE_PORT = os.getenv("API_REUSE_PORT", "True") == "True" and hasattr(socket, "SO_REUSEPORT")
+    API_BACKLOG = int(os.getenv("API_BACKLOG", "2048"))
+    API_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("API_GRACEFUL_TIMEOUT_SECONDS", "30"))
     API_DEBUG = os.getenv("API_DEBUG", "True") == "True"
     
     RABBITMQ_HOST = os.getenv("RABBITMQ_HOST")
@@ -17,16 +22,36 @@ class Config:
     RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD")
     RABBITMQ_VHOST = os.getenv("RABBITMQ_VHOST", "/")
     RABBITMQ_URL = os.getenv("RABBITMQ_URL")
+    RABBITMQ_CHANNEL_POOL_SIZE = int(os.getenv("RABBITMQ_CHANNEL_POOL_SIZE", "4"))
+    RABBITMQ_CONFIRM_TIMEOUT_SECONDS = float(os.getenv("RABBITMQ_CONFIRM_TIMEOUT_SECONDS", "5"))
+    RABBITMQ_RECONNECT_INTERVAL_SECONDS = float(os.getenv("RABBITMQ_RECONNECT_INTERVAL_SECONDS", "5"))
+    MESSAGE_FORMAT = os.getenv("MESSAGE_FORMAT", "json")
+    MESSAGE_COMPRESSION = os.getenv("MESSAGE_COMPRESSION", "none")
+    MESSAGE_COMPRESSION_THRESHOLD_BYTES = int(os.getenv("MESSAGE_COMPRESSION_THRESHOLD_BYTES", "16384"))
+    MESSAGE_COMPRESSION_LEVEL = int(os.getenv("MESSAGE_COMPRESSION_LEVEL", "3"))
+    MESSAGE_STATS_LOG_INTERVAL_SECONDS = int(os.getenv("MESSAGE_STATS_LOG_INTERVAL_SECONDS", "300"))
     
     EMAIL_QUEUE_HIGH = os.getenv("EMAIL_QUEUE_HIGH", "email.high")
     EMAIL_QUEUE_NORMAL = os.getenv("EMAIL_QUEUE_NORMAL", "email.normal")
     EMAIL_QUEUE_LOW = os.getenv("EMAIL_QUEUE_LOW", "email.low")
+
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+    OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "1"))
+    OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+    OUTBOX_RETRY_DELAY_SECONDS = int(os.getenv("OUTBOX_RETRY_DELAY_SECONDS", "5"))
+    OUTBOX_MAX_RETRY_DELAY_SECONDS = int(os.getenv("OUTBOX_MAX_RETRY_DELAY_SECONDS", "300"))
     
     SMTP_HOST = os.getenv("SMTP_HOST")
     SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
     SMTP_USER = os.getenv("SMTP_USER")
     SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
     SMTP_FROM = os.getenv("SMTP_FROM")
+    SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "10"))
+    SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+    SMTP_IDLE_TIMEOUT_SECONDS = float(os.getenv("SMTP_IDLE_TIMEOUT_SECONDS", "60"))
+    SMTP_NOOP_AFTER_SECONDS = float(os.getenv("SMTP_NOOP_AFTER_SECONDS", "15"))
+    SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+    SMTP_STATS_LOG_INTERVAL_SECONDS = int(os.getenv("SMTP_STATS_LOG_INTERVAL_SECONDS", "300"))
     
     POSTGRES_HOST = os.getenv("POSTGRES_HOST")
     POSTGRES_DB = os.getenv("POSTGRES_DB")
@@ -34,18 +59,61 @@ class Config:
     POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
     POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", "5432"))
     DATABASE_URL = os.getenv("DATABASE_URL")
+    POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1"))
+    POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+    POSTGRES_POOL_TIMEOUT_SECONDS = float(os.getenv("POSTGRES_POOL_TIMEOUT_SECONDS", "10"))
+    POSTGRES_POOL_HEALTH_CHECK_SECONDS = float(os.getenv("POSTGRES_POOL_HEALTH_CHECK_SECONDS", "30"))
+
+    EMAIL_TYPE_CACHE_TTL_SECONDS = float(os.getenv("EMAIL_TYPE_CACHE_TTL_SECONDS", "300"))
+    EMAIL_TYPE_CACHE_MISS_RELOAD_SECONDS = float(os.getenv("EMAIL_TYPE_CACHE_MISS_RELOAD_SECONDS", "5"))
+    EMAIL_TYPE_CACHE_LISTEN = os.getenv("EMAIL_TYPE_CACHE_LISTEN", "True") == "True"
     
     MAX_RETRIES = int(os.getenv("MAX_RETRIES", "5"))
     RETRY_DELAY_SECONDS = int(os.getenv("RETRY_DELAY_SECONDS", "30"))
+    RETRY_MAX_DELAY_SECONDS = int(os.getenv("RETRY_MAX_DELAY_SECONDS", "900"))
+    RETRY_JITTER = float(os.getenv("RETRY_JITTER", "0.2"))
+
+    DLQ_REPLAY_BATCH_SIZE = int(os.getenv("DLQ_REPLAY_BATCH_SIZE", "100"))
+    DLQ_REPLAY_RATE_PER_SECOND = float(os.getenv("DLQ_REPLAY_RATE_PER_SECOND", "50"))
+
+    WORKER_MODE = os.getenv("WORKER_MODE", "async")
+    WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "20"))
+    WORKER_PREFETCH_HIGH = int(os.getenv("WORKER_PREFETCH_HIGH", "20"))
+    WORKER_PREFETCH_NORMAL = int(os.getenv("WORKER_PREFETCH_NORMAL", "10"))
+    WORKER_PREFETCH_LOW = int(os.getenv("WORKER_PREFETCH_LOW", "5"))
 
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "1000"))
+
+    STATUS_LONG_POLL_MAX_SECONDS = float(os.getenv("STATUS_LONG_POLL_MAX_SECONDS", "30"))
+    STATUS_STREAM_MAX_SECONDS = float(os.getenv("STATUS_STREAM_MAX_SECONDS", "300"))
+    STATUS_STREAM_KEEPALIVE_SECONDS = float(os.getenv("STATUS_STREAM_KEEPALIVE_SECONDS", "15"))
+
     RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True") == "True"
     RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "10"))
     RATE_LIMIT_PER_HOUR = int(os.getenv("RATE_LIMIT_PER_HOUR", "100"))
     RATE_LIMIT_GLOBAL_PER_MINUTE = int(os.getenv("RATE_LIMIT_GLOBAL_PER_MINUTE", "500"))
     RATE_LIMIT_GLOBAL_PER_HOUR = int(os.getenv("RATE_LIMIT_GLOBAL_PER_HOUR", "5000"))
     RATE_LIMIT_GRACE_PERIOD_SECONDS = int(os.getenv("RATE_LIMIT_GRACE_PERIOD_SECONDS", "300"))
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "shared_memory")
+    RATE_LIMIT_SHARED_PATH = os.getenv("RATE_LIMIT_SHARED_PATH", "/dev/shm/email_queue_rate_limit" if os.path.isdir("/dev/shm") else "/tmp/email_queue_rate_limit")
+    RATE_LIMIT_SHARED_SLOTS = int(os.getenv("RATE_LIMIT_SHARED_SLOTS", "65536"))
+    RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+
+    QUOTA_ENABLED = os.getenv("QUOTA_ENABLED", "True") == "True"
+    CLIENT_ID_HEADER = os.getenv("CLIENT_ID_HEADER", "X-Client-Id")
+    CLIENT_ID_TRUSTED_PROXIES = os.getenv("CLIENT_ID_TRUSTED_PROXIES", "")
+    CLIENT_QUOTA_PER_MINUTE = int(os.getenv("CLIENT_QUOTA_PER_MINUTE", "0"))
+    FAIR_SHARE_PER_MINUTE = int(os.getenv("FAIR_SHARE_PER_MINUTE", "0"))
+    FAIR_SHARE_WINDOW_SECONDS = int(os.getenv("FAIR_SHARE_WINDOW_SECONDS", "60"))
+
+    BACKPRESSURE_ENABLED = os.getenv("BACKPRESSURE_ENABLED", "True") == "True"
+    BACKPRESSURE_POLL_SECONDS = float(os.getenv("BACKPRESSURE_POLL_SECONDS", "5"))
+    BACKPRESSURE_SHED_LOW_DEPTH = int(os.getenv("BACKPRESSURE_SHED_LOW_DEPTH", "50000"))
+    BACKPRESSURE_SHED_NORMAL_DEPTH = int(os.getenv("BACKPRESSURE_SHED_NORMAL_DEPTH", "200000"))
+    BACKPRESSURE_SHED_HIGH_DEPTH = int(os.getenv("BACKPRESSURE_SHED_HIGH_DEPTH", "0"))
+    BACKPRESSURE_MAX_RETRY_AFTER_SECONDS = int(os.getenv("BACKPRESSURE_MAX_RETRY_AFTER_SECONDS", "300"))
     
     ALLOWED_MIME_TYPES = {
         "application/pdf",
@@ -81,10 +149,36 @@ class Config:
     }
     
     MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "10485760"))
+    ATTACHMENT_CHUNK_SIZE = int(os.getenv("ATTACHMENT_CHUNK_SIZE", "65536"))
+    ATTACHMENT_MIME_SNIFF_BYTES = int(os.getenv("ATTACHMENT_MIME_SNIFF_BYTES", "8192"))
+    ATTACHMENT_PROCESSING_WORKERS = int(os.getenv("ATTACHMENT_PROCESSING_WORKERS", "4"))
+    ATTACHMENT_BLOB_GRACE_SECONDS = int(os.getenv("ATTACHMENT_BLOB_GRACE_SECONDS", "3600"))
+    ATTACHMENT_BLOB_CLEANUP_INTERVAL_SECONDS = int(os.getenv("ATTACHMENT_BLOB_CLEANUP_INTERVAL_SECONDS", "3600"))
+
+    TEMPLATE_REGISTRY_POLL_SECONDS = float(os.getenv("TEMPLATE_REGISTRY_POLL_SECONDS", "5"))
+    TEMPLATE_PRODUCTION_MODE = os.getenv("TEMPLATE_PRODUCTION_MODE", "False") == "True"
+    TEMPLATE_BYTECODE_CACHE_DIR = os.getenv("TEMPLATE_BYTECODE_CACHE_DIR", ".template_cache")
+    TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "400"))
+    RENDER_CACHE_ENABLED = os.getenv("RENDER_CACHE_ENABLED", "False") == "True"
+    RENDER_CACHE_MAX_ENTRIES = int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "1000"))
+    RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", "67108864"))
     
 config = Config()
 
-jinja_env = Environment(loader=ChoiceLoader([
-    FileSystemLoader("app/user/templates"),
-    FileSystemLoader("app/templates")
-]))
+def build_bytecode_cache():
+    if not config.TEMPLATE_PRODUCTION_MODE or not config.TEMPLATE_BYTECODE_CACHE_DIR:
+        return None
+    os.makedirs(config.TEMPLATE_BYTECODE_CACHE_DIR, exist_ok=True)
+    return FileSystemBytecodeCache(config.TEMPLATE_BYTECODE_CACHE_DIR)
+
+# production mode stops stat-ing template files on every render and keeps compiled
+# bytecode on disk across restarts; template edits then need a worker restart
+jinja_env = Environment(
+    loader=ChoiceLoader([
+        FileSystemLoader("app/user/templates"),
+        FileSystemLoader("app/templates")
+    ]),
+    auto_reload=not config.TEMPLATE_PRODUCTION_MODE,
+    cache_size=config.TEMPLATE_CACHE_SIZE,
+    bytecode_cache=build_bytecode_cache()
+)
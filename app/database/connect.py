@@ -1,4 +1,9 @@
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
 from app.config import config
 from app.utils.logger import print_logging
 
@@ -15,4 +20,188 @@ def connect():
         return conn
     except Exception as e:
         print_logging("error", f"Failed to connect to the database: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+class DatabasePool:
+    """
+    Thread-safe pool of PostgreSQL connections shared by the API server and the worker.
+    - Keeps between POSTGRES_POOL_MIN_SIZE and POSTGRES_POOL_MAX_SIZE connections open
+    - Blocks up to POSTGRES_POOL_TIMEOUT_SECONDS when every connection is checked out
+    - Health checks a connection that sat idle longer than POSTGRES_POOL_HEALTH_CHECK_SECONDS
+    """
+
+    def __init__(self, min_size, max_size, timeout, health_check_interval):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used = {}
+        self._in_use = 0
+        self._waiting = 0
+        self._peak_in_use = 0
+        self._total_checkouts = 0
+        self._total_waits = 0
+        self._total_timeouts = 0
+        self._total_health_check_failures = 0
+
+    def open(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(
+                    self.min_size,
+                    self.max_size,
+                    host=config.POSTGRES_HOST,
+                    database=config.POSTGRES_DB,
+                    user=config.POSTGRES_USER,
+                    password=config.POSTGRES_PASSWORD,
+                    port=config.POSTGRES_PORT
+                )
+                print_logging("info", f"Database pool opened (min={self.min_size}, max={self.max_size})")
+        return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                self._last_used.clear()
+                print_logging("info", "Database pool closed")
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Check out a healthy connection, or return None if none could be obtained."""
+        pool = self.open()
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._waiting += 1
+                self._total_waits += 1
+            try:
+                acquired = self._slots.acquire(timeout=self.timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not acquired:
+                with self._lock:
+                    self._total_timeouts += 1
+                print_logging("error", f"Timed out after {self.timeout}s waiting for a database connection")
+                return None
+
+        try:
+            conn = pool.getconn()
+            if not self._is_healthy(conn):
+                with self._lock:
+                    self._total_health_check_failures += 1
+                print_logging("warning", "Discarding unhealthy pooled database connection")
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+        except Exception as e:
+            self._slots.release()
+            print_logging("error", f"Failed to get a pooled database connection: {e}")
+            return None
+
+        with self._lock:
+            self._in_use += 1
+            self._total_checkouts += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back anything left uncommitted."""
+        close = bool(conn.closed)
+        if not close:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+
+        try:
+            if self._pool is not None:
+                self._pool.putconn(conn, close=close)
+            else:
+                conn.close()
+        finally:
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._pool._pool) if self._pool is not None else 0
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": idle,
+                "waiting": self._waiting,
+                "saturation": round(self._in_use / self.max_size, 3) if self.max_size else 0,
+                "peak_in_use": self._peak_in_use,
+                "total_checkouts": self._total_checkouts,
+                "total_waits": self._total_waits,
+                "total_timeouts": self._total_timeouts,
+                "total_health_check_failures": self._total_health_check_failures,
+            }
+
+
+db_pool = DatabasePool(
+    min_size=config.POSTGRES_POOL_MIN_SIZE,
+    max_size=config.POSTGRES_POOL_MAX_SIZE,
+    timeout=config.POSTGRES_POOL_TIMEOUT_SECONDS,
+    health_check_interval=config.POSTGRES_POOL_HEALTH_CHECK_SECONDS
+)
+
+
+@contextmanager
+def get_connection():
+    """
+    Borrow a pooled connection for the duration of a with-block.
+    Yields None when no connection is available so callers can keep their own error handling.
+    """
+    conn = None
+    try:
+        conn = db_pool.acquire()
+    except Exception as e:
+        print_logging("error", f"Failed to connect to the database: {e}")
+
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            db_pool.release(conn)
+
+
+def open_pool():
+    return db_pool.open()
+
+
+def close_pool():
+    db_pool.close()
+
+
+def get_pool_stats():
+    return db_pool.stats()
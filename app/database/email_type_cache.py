@@ -0,0 +1,114 @@
+import threading
+import time
+from app.config import config
+from app.database.connect import get_connection
+from app.utils.logger import print_logging
+
+EMAIL_TYPES_CHANNEL = "email_types_changed"
+
+
+class EmailTypeCache:
+    """
+    Process-local copy of the email_types table used for type checks, default recipients and quotas.
+    - Loaded once at startup and reloaded when a change notification arrives
+    - Reloaded after ttl seconds in case a notification was missed
+    - A lookup miss triggers at most one reload per miss_reload_interval, so newly
+      registered types are picked up without letting unknown types hammer the database
+    """
+
+    def __init__(self, ttl, miss_reload_interval):
+        self.ttl = ttl
+        self.miss_reload_interval = miss_reload_interval
+        self._email_types = {}
+        self._last_attempt = None
+        self._load_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._reloads = 0
+        self._reload_failures = 0
+
+    def load(self):
+        """Replace the cached rows with a fresh copy of email_types. Returns True on success."""
+        if not self._load_lock.acquire(blocking=False):
+            # another thread is already reloading; keep serving the current rows
+            return False
+
+        try:
+            self._last_attempt = time.monotonic()
+            with get_connection() as conn:
+                if conn is None:
+                    print_logging("error", "Database connection unavailable. Cannot load email types")
+                    self._reload_failures += 1
+                    return False
+
+                cursor = None
+                try:
+                    query = (
+                        "SELECT type, to_address, cc_addresses, bcc_addresses, quota_per_minute, quota_weight "
+                        "FROM email_types"
+                    )
+                    cursor = conn.cursor()
+                    cursor.execute(query)
+
+                    self._email_types = {
+                        row[0]: {
+                            "to_address": row[1],
+                            "cc_addresses": row[2],
+                            "bcc_addresses": row[3],
+                            "quota_per_minute": row[4],
+                            "quota_weight": row[5]
+                        }
+                        for row in cursor.fetchall()
+                    }
+                    self._reloads += 1
+                    return True
+
+                except Exception as e:
+                    print_logging("error", f"Database error while loading email types: {str(e)}")
+                    self._reload_failures += 1
+                    return False
+                finally:
+                    if cursor:
+                        cursor.close()
+        finally:
+            self._load_lock.release()
+
+    def invalidate(self, payload=None):
+        print_logging("info", f"Email types changed{f' ({payload})' if payload else ''}, reloading cache")
+        self.load()
+
+    def get(self, email_type):
+        """Return the cached row for an email type, or None if it is not registered."""
+        now = time.monotonic()
+        if self._last_attempt is None or now - self._last_attempt > self.ttl:
+            self.load()
+
+        row = self._email_types.get(email_type)
+        if row is None and self._last_attempt is not None and now - self._last_attempt > self.miss_reload_interval:
+            self.load()
+            row = self._email_types.get(email_type)
+
+        if row is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return row
+
+    def is_registered(self, email_type):
+        return self.get(email_type) is not None
+
+    def stats(self):
+        return {
+            "size": len(self._email_types),
+            "hits": self._hits,
+            "misses": self._misses,
+            "reloads": self._reloads,
+            "reload_failures": self._reload_failures,
+            "age_seconds": round(time.monotonic() - self._last_attempt, 3) if self._last_attempt is not None else None
+        }
+
+
+email_type_cache = EmailTypeCache(
+    ttl=config.EMAIL_TYPE_CACHE_TTL_SECONDS,
+    miss_reload_interval=config.EMAIL_TYPE_CACHE_MISS_RELOAD_SECONDS
+)
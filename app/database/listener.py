@@ -0,0 +1,90 @@
+import select
+import threading
+from psycopg2 import sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from app.database.connect import connect
+from app.utils.logger import print_logging
+
+
+class NotificationListener:
+    """
+    Background thread holding one dedicated connection that LISTENs on Postgres channels
+    and dispatches every NOTIFY payload to the callbacks subscribed to that channel.
+    Reconnect callbacks run after the connection is re-established, since notifications
+    sent while disconnected are lost.
+    """
+
+    def __init__(self, reconnect_delay=5, poll_timeout=1.0):
+        self.reconnect_delay = reconnect_delay
+        self.poll_timeout = poll_timeout
+        self._handlers = {}
+        self._reconnect_handlers = []
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._connected_once = False
+
+    def subscribe(self, channel, callback, on_reconnect=None):
+        self._handlers.setdefault(channel, []).append(callback)
+        if on_reconnect is not None:
+            self._reconnect_handlers.append(on_reconnect)
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running or not self._handlers:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="pg-notification-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_timeout * 2)
+            self._thread = None
+
+    def _dispatch(self, notify):
+        for callback in self._handlers.get(notify.channel, []):
+            try:
+                callback(notify.payload)
+            except Exception as e:
+                print_logging("error", f"Error handling notification on channel {notify.channel}: {str(e)}")
+
+    def _listen(self, conn):
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            for channel in self._handlers:
+                cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+        print_logging("info", f"Listening for database notifications on: {', '.join(self._handlers)}")
+
+        if self._connected_once:
+            for callback in self._reconnect_handlers:
+                try:
+                    callback()
+                except Exception as e:
+                    print_logging("error", f"Error resynchronizing after listener reconnect: {str(e)}")
+        self._connected_once = True
+
+        while not self._stop_event.is_set():
+            if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                self._dispatch(conn.notifies.pop(0))
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            conn = connect()
+            if conn is not None:
+                try:
+                    self._listen(conn)
+                except Exception as e:
+                    print_logging("error", f"Database notification listener error: {str(e)}")
+                finally:
+                    conn.close()
+            self._stop_event.wait(self.reconnect_delay)
+
+
+notification_listener = NotificationListener()
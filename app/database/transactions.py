@@ -1,64 +1,158 @@
 import json
-from app.database.connect import connect
+import psycopg2
+from psycopg2.extras import execute_values, execute_batch, Json
+from app.database.connect import get_connection
+from app.database.email_type_cache import email_type_cache
 from app.utils.logger import print_logging
 
 
-def insert_email_queues(payload):
-    conn = connect()
-    if conn is None:
-        print_logging("error", "Failed to connect to database")
-        return False
-    cursor = None
-    try:
-        query = """
-           INSERT INTO email_queues (email_type, subject, email_template, email_data, priority_level)
-           VALUES (%s, %s, %s, %s, %s)
-           RETURNING id
-        """
-        cursor = conn.cursor()
-        email_data_json = json.dumps(payload.email_data)
-        cursor.execute(query, (
-            payload.email_type,
-            payload.subject,
-            payload.email_template,
-            email_data_json,
-            payload.priority_level
-        ))
-        email_id = cursor.fetchone()[0]
-        conn.commit()
-        
-        query = """
-            SELECT et.to_address, et.cc_addresses, et.bcc_addresses
-            FROM email_types et
-            WHERE et.type = %s
-        """
-        cursor.execute(query, (payload.email_type,))
-        result = cursor.fetchone()
-        
-        to_address = payload.to_address if payload.to_address else result[0]
-        cc_addresses = payload.cc_addresses if payload.cc_addresses else result[1]
-        bcc_addresses = payload.bcc_addresses if payload.bcc_addresses else result[2]
-        
-        email_data = {
-            "id": email_id,
-            "email_type": payload.email_type,
-            "subject": payload.subject,
-            "email_template": payload.email_template,
-            "email_data": email_data_json,
-            "to_address": to_address,
-            "cc_addresses": cc_addresses,
-            "bcc_addresses": bcc_addresses
+def _insert_attachment_rows(cursor, email_queue_id, attachments):
+    """
+    Reference already stored blobs from an email with two multi-row statements
+    - Blob references are summed per checksum first, since one statement cannot
+      upsert the same attachment_blobs row twice
+    """
+    blobs = {}
+    for attachment in attachments:
+        checksum = attachment["checksum"]
+        if checksum in blobs:
+            blobs[checksum][4] += 1
+        else:
+            blobs[checksum] = [checksum, attachment["file_path"], attachment["mime_type"], attachment["file_size"], 1]
+
+    execute_values(
+        cursor,
+        "INSERT INTO attachment_blobs "
+        "(checksum_sha256, file_path, mime_type, file_size, ref_count) VALUES %s "
+        "ON CONFLICT (checksum_sha256) DO UPDATE "
+        "SET ref_count = attachment_blobs.ref_count + EXCLUDED.ref_count, updated_at = NOW()",
+        [tuple(blob) for blob in blobs.values()],
+        page_size=len(blobs)
+    )
+    execute_values(
+        cursor,
+        "INSERT INTO email_attachments "
+        "(email_queue_id, file_name, file_path, mime_type, file_size, checksum_sha256) VALUES %s",
+        [
+            (email_queue_id, attachment["file_name"], attachment["file_path"],
+             attachment["mime_type"], attachment["file_size"], attachment["checksum"])
+            for attachment in attachments
+        ],
+        page_size=len(attachments)
+    )
+
+
+def _attachment_manifest(attachments):
+    """Attachment entries carried in the message, so the worker needs no database lookup."""
+    return [
+        {
+            "file_name": attachment["file_name"],
+            "file_path": attachment["file_path"],
+            "mime_type": attachment["mime_type"],
+            "file_size": attachment["file_size"],
+            "checksum": attachment["checksum"]
         }
-        return email_data
+        for attachment in attachments or []
+    ]
+
+
+def insert_email_queues(payload, attachments=None):
+    """
+    Validate the email type, insert the queue row, resolve its recipients and write the
+    outbox message in one statement, so the relay publishes exactly what was committed.
+    Recipients given in the payload override the email_types defaults field by field.
+    Stored attachments (see prepare_attachments) are referenced in the same transaction,
+    so the message is never published without them, and listed in the message's attachment manifest.
+    Returns the queue message, None if the email type is not registered, or False on error.
+    """
+    with get_connection() as conn:
+        if conn is None:
+            print_logging("error", "Failed to connect to database")
+            return False
+        cursor = None
+        try:
+            query = """
+                WITH et AS (
+                    SELECT type, to_address, cc_addresses, bcc_addresses
+                    FROM email_types
+                    WHERE type = %(email_type)s
+                ), inserted AS (
+                    INSERT INTO email_queues (email_type, subject, email_template, email_data, priority_level)
+                    SELECT et.type, %(subject)s, %(email_template)s, %(email_data)s, %(priority_level)s
+                    FROM et
+                    RETURNING id
+                ), message AS (
+                    SELECT inserted.id,
+                           COALESCE(%(to_address)s::text[], et.to_address) AS to_address,
+                           COALESCE(%(cc_addresses)s::text[], et.cc_addresses) AS cc_addresses,
+                           COALESCE(%(bcc_addresses)s::text[], et.bcc_addresses) AS bcc_addresses
+                    FROM inserted CROSS JOIN et
+                ), outbox AS (
+                    INSERT INTO email_outbox (email_queue_id, priority_level, payload)
+                    SELECT message.id, %(priority_level)s, jsonb_build_object(
+                               'id', message.id,
+                               'email_type', %(email_type)s::text,
+                               'subject', %(subject)s::text,
+                               'email_template', %(email_template)s::text,
+                               'email_data', %(email_data)s::jsonb,
+                               'to_address', message.to_address,
+                               'cc_addresses', message.cc_addresses,
+                               'bcc_addresses', message.bcc_addresses,
+                               'has_attachments', %(has_attachments)s,
+                               'attachments', %(attachments)s::jsonb
+                           )
+                    FROM message
+                )
+                SELECT id, to_address, cc_addresses, bcc_addresses FROM message
+            """
+            cursor = conn.cursor()
+            manifest = _attachment_manifest(attachments)
+            cursor.execute(query, {
+                "email_type": payload.email_type,
+                "subject": payload.subject,
+                "email_template": payload.email_template,
+                "email_data": json.dumps(payload.email_data),
+                "priority_level": payload.priority_level,
+                "to_address": payload.to_addresses or None,
+                "cc_addresses": payload.cc_addresses or None,
+                "bcc_addresses": payload.bcc_addresses or None,
+                "has_attachments": bool(manifest),
+                "attachments": Json(manifest)
+            })
+            result = cursor.fetchone()
+
+            if result is not None and attachments:
+                _insert_attachment_rows(cursor, result[0], attachments)
+
+            conn.commit()
+
+            if result is None:
+                print_logging("warning", f"Email type {payload.email_type} is not registered")
+                return None
 
-    except Exception as e:
-        print_logging("error", f"Error inserting in email queues: {str(e)}")
-        return False
+            email_id, to_address, cc_addresses, bcc_addresses = result
 
-    finally:
-        if cursor:
-            cursor.close()
-        conn.close()
+            email_data = {
+                "id": email_id,
+                "email_type": payload.email_type,
+                "subject": payload.subject,
+                "email_template": payload.email_template,
+                "email_data": payload.email_data,
+                "to_address": to_address,
+                "cc_addresses": cc_addresses,
+                "bcc_addresses": bcc_addresses,
+                "has_attachments": bool(manifest),
+                "attachments": manifest
+            }
+            return email_data
+
+        except Exception as e:
+            print_logging("error", f"Error inserting in email queues: {str(e)}")
+            return False
+
+        finally:
+            if cursor:
+                cursor.close()
 
 
 def update_email_status(status, email_id):
@@ -69,102 +163,324 @@ def update_email_status(status, email_id):
     - 0: Pending (In queue, not yet processed)
     - 1: Sent (Successfully delivered)
     - 2: Failed (Permanent or temporary delivery failure)
+
+    The change is announced on the email_status channel when the transaction commits.
+    Returns True once the update is committed, or False on error.
     """
-    conn = connect()
-    if conn is None:
-        print_logging("error", f"Database connection unavailable. Cannot update email {email_id}")
-        return
-
-    cursor = None
-    try:
-        query = "UPDATE email_queues SET status = %s, sent_at = NOW() WHERE id = %s"      
-        cursor = conn.cursor()
-        cursor.execute(query, (status, email_id))
-        conn.commit()
-    except Exception as e:
-        print_logging("error", f"Database error while updating email {email_id}: {str(e)}")
-    finally:
-        if cursor:
-            cursor.close()
-        conn.close()
-
-def insert_email_attachments(email_queue_id, file_name, file_path, mime_type, file_size, checksum):
-
-    conn = connect()
-    if conn is None:
-        print_logging("error", f"Database connection unavailable. Cannot insert file attachment for email id {email_queue_id}")
-        return
-
-    cursor = None
-    try:
-        query = (
-            "INSERT INTO email_attachments "
-            "(email_queue_id, file_name, file_path, mime_type, file_size, checksum_sha256) "
-            "VALUES (%s, %s, %s, %s, %s, %s) "
-            "RETURNING id"
-        )   
-        
-        cursor = conn.cursor()
-        cursor.execute(query, (email_queue_id, file_name, file_path, mime_type, file_size, checksum))
-        conn.commit()
-    except Exception as e:
-        print_logging("error", f"Database error while inserting email attachment for queue id {email_queue_id}: {str(e)}")
-    finally:
-        if cursor:
-            cursor.close()
-        conn.close()
-        
+    with get_connection() as conn:
+        if conn is None:
+            print_logging("error", f"Database connection unavailable. Cannot update email {email_id}")
+            return False
+
+        cursor = None
+        try:
+            query = """
+                WITH updated AS (
+                    UPDATE email_queues SET status = %s, sent_at = NOW() WHERE id = %s
+                    RETURNING id, status, sent_at
+                )
+                SELECT pg_notify('email_status', json_build_object('id', id, 'status', status, 'sent_at', sent_at)::text)
+                FROM updated
+            """
+            cursor = conn.cursor()
+            cursor.execute(query, (status, email_id))
+            conn.commit()
+            return True
+        except Exception as e:
+            print_logging("error", f"Database error while updating email {email_id}: {str(e)}")
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+def get_email_statuses(email_ids):
+    """
+    Look up the delivery status of many emails with one query.
+    Returns {email_id: {"id", "status", "created_at", "sent_at"}} for the ids that exist, or False on error.
+    """
+    with get_connection() as conn:
+        if conn is None:
+            print_logging("error", "Database connection unavailable. Cannot look up email statuses")
+            return False
+
+        cursor = None
+        try:
+            query = "SELECT id::text, status, created_at, sent_at FROM email_queues WHERE id = ANY(%s::uuid[])"
+            cursor = conn.cursor()
+            cursor.execute(query, (list(email_ids),))
+
+            return {
+                row[0]: {"id": row[0], "status": row[1], "created_at": row[2], "sent_at": row[3]}
+                for row in cursor.fetchall()
+            }
+        except Exception as e:
+            print_logging("error", f"Database error while looking up email statuses: {str(e)}")
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+def delete_unreferenced_attachment_blobs(grace_seconds, limit, remove_file):
+    """
+    Delete blobs unreferenced for longer than grace_seconds and return their file paths
+    - The rows stay locked while remove_file(file_path) runs, and only rows whose file is gone
+      (remove_file returned True) are deleted, so a crash never leaves a file without a row
+    """
+    with get_connection() as conn:
+        if conn is None:
+            print_logging("error", "Database connection unavailable. Cannot clean up attachment blobs")
+            return []
+
+        cursor = None
+        try:
+            query = (
+                "SELECT checksum_sha256, file_path FROM attachment_blobs "
+                "WHERE ref_count <= 0 AND updated_at < NOW() - make_interval(secs => %s) "
+                "LIMIT %s FOR UPDATE SKIP LOCKED"
+            )
+            cursor = conn.cursor()
+            cursor.execute(query, (grace_seconds, limit))
+            removed = [(checksum, file_path) for checksum, file_path in cursor.fetchall() if remove_file(file_path)]
+
+            if removed:
+                cursor.execute(
+                    "DELETE FROM attachment_blobs WHERE checksum_sha256 = ANY(%s)",
+                    ([checksum for checksum, _ in removed],)
+                )
+            conn.commit()
+            return [file_path for _, file_path in removed]
+        except Exception as e:
+            print_logging("error", f"Database error while cleaning up attachment blobs: {str(e)}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
 def is_has_file_attachments(email_queue_id):
-    conn = connect()
-    if conn is None:
-        print_logging("error", f"Database connection unavailable. Cannot check if there's email attachment for {email_queue_id}")
-        return []
+    with get_connection() as conn:
+        if conn is None:
+            print_logging("error", f"Database connection unavailable. Cannot check if there's email attachment for {email_queue_id}")
+            return []
 
-    cursor = None
-    try:
-        query = "SELECT file_name, file_path FROM email_attachments WHERE email_queue_id = %s"      
-        cursor = conn.cursor()
-        cursor.execute(query, (email_queue_id,))
+        cursor = None
+        try:
+            query = "SELECT file_name, file_path FROM email_attachments WHERE email_queue_id = %s"      
+            cursor = conn.cursor()
+            cursor.execute(query, (email_queue_id,))
         
-        result = cursor.fetchall()
+            result = cursor.fetchall()
         
-        attachments = []
-        for row in result:
-            attachments.append({
-                "file_name": row[0],
-                "file_path": row[1]
-            })
+            attachments = []
+            for row in result:
+                attachments.append({
+                    "file_name": row[0],
+                    "file_path": row[1]
+                })
         
-        return attachments
+            return attachments
         
-    except Exception as e:
-        print_logging("error", f"Database error while checking if there's email attachment for {email_queue_id}: {str(e)}")
-        return []
-    finally:
-        if cursor:
-            cursor.close()
-        conn.close()
+        except Exception as e:
+            print_logging("error", f"Database error while checking if there's email attachment for {email_queue_id}: {str(e)}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
         
-def check_email_type_registration(email_type: str):
-    conn = connect()
-    if conn is None:
-        print_logging("error", f"Database connection unavailable. Cannot check email type registration for {email_type}")
-        return False
-
-    cursor = None
-    try:
-        query = "SELECT 1 FROM email_types WHERE type = %s"
-        cursor = conn.cursor()
-        cursor.execute(query, (email_type,))
-
-        result = cursor.fetchall()
-
-        return len(result) > 0
-
-    except Exception as e:
-        print_logging("error", f"Database error while checking email type registration for {email_type}: {str(e)}")
-        return False
-    finally:
-        if cursor:
-            cursor.close()
-        conn.close()
\ No newline at end of file
+def insert_email_queues_batch(payloads):
+    """
+    Insert many email queue rows and their outbox messages with multi-row INSERTs in one
+    transaction, resolving default recipients from the email_types cache.
+    Returns the queue messages in the same order as the payloads, None if a payload violated
+    a constraint (nothing is inserted, so the payloads can be inserted one by one), or False on error.
+    """
+    if not payloads:
+        return []
+
+    with get_connection() as conn:
+        if conn is None:
+            print_logging("error", "Failed to connect to database")
+            return False
+
+        cursor = None
+        try:
+            rows = [
+                (
+                    payload.email_type,
+                    payload.subject,
+                    payload.email_template,
+                    json.dumps(payload.email_data),
+                    payload.priority_level
+                )
+                for payload in payloads
+            ]
+            query = """
+               INSERT INTO email_queues (email_type, subject, email_template, email_data, priority_level)
+               VALUES %s
+               RETURNING id
+            """
+            cursor = conn.cursor()
+            inserted = execute_values(cursor, query, rows, page_size=len(rows), fetch=True)
+
+            defaults = {}
+            for email_type in {payload.email_type for payload in payloads}:
+                row = email_type_cache.get(email_type)
+                if row is not None:
+                    defaults[email_type] = (row["to_address"], row["cc_addresses"], row["bcc_addresses"])
+
+            missing_types = {payload.email_type for payload in payloads} - defaults.keys()
+            if missing_types:
+                query = """
+                    SELECT et.type, et.to_address, et.cc_addresses, et.bcc_addresses
+                    FROM email_types et
+                    WHERE et.type = ANY(%s)
+                """
+                cursor.execute(query, (list(missing_types),))
+                defaults.update({row[0]: row[1:] for row in cursor.fetchall()})
+
+            email_data_list = []
+            for payload, (email_id,) in zip(payloads, inserted):
+                default_to, default_cc, default_bcc = defaults.get(payload.email_type, (None, None, None))
+                email_data_list.append({
+                    "id": email_id,
+                    "email_type": payload.email_type,
+                    "subject": payload.subject,
+                    "email_template": payload.email_template,
+                    "email_data": payload.email_data,
+                    "to_address": payload.to_addresses if payload.to_addresses else default_to,
+                    "cc_addresses": payload.cc_addresses if payload.cc_addresses else default_cc,
+                    "bcc_addresses": payload.bcc_addresses if payload.bcc_addresses else default_bcc,
+                    "has_attachments": False,
+                    "attachments": []
+                })
+
+            query = """
+                INSERT INTO email_outbox (email_queue_id, priority_level, payload)
+                VALUES %s
+            """
+            execute_values(cursor, query, [
+                (email_data["id"], payload.priority_level, Json(email_data))
+                for payload, email_data in zip(payloads, email_data_list)
+            ], page_size=len(email_data_list))
+            conn.commit()
+
+            return email_data_list
+
+        except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+            print_logging("warning", f"Batch of {len(payloads)} rejected by a constraint: {str(e)}")
+            return None
+        except Exception as e:
+            print_logging("error", f"Error inserting batch of {len(payloads)} into email queues: {str(e)}")
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+
+def claim_email_outbox(limit, lease_seconds):
+    """
+    Lease up to limit outbox messages that are due for publishing, highest priority first.
+    Claimed rows become invisible to other relays for lease_seconds, so a relay that dies
+    mid-batch only delays its messages.
+    """
+    with get_connection() as conn:
+        if conn is None:
+            print_logging("error", "Database connection unavailable. Cannot claim outbox messages")
+            return []
+
+        cursor = None
+        try:
+            query = """
+                UPDATE email_outbox
+                SET available_at = NOW() + make_interval(secs => %(lease_seconds)s)
+                WHERE id IN (
+                    SELECT id FROM email_outbox
+                    WHERE available_at <= NOW()
+                    ORDER BY priority_level, id
+                    LIMIT %(limit)s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, email_queue_id, priority_level, payload, attempts
+            """
+            cursor = conn.cursor()
+            cursor.execute(query, {
+                "limit": limit,
+                "lease_seconds": lease_seconds
+            })
+            rows = cursor.fetchall()
+            conn.commit()
+
+            return [
+                {
+                    "id": row[0],
+                    "email_queue_id": row[1],
+                    "priority_level": row[2],
+                    "payload": row[3],
+                    "attempts": row[4]
+                }
+                for row in sorted(rows, key=lambda row: (row[2], row[0]))
+            ]
+        except Exception as e:
+            print_logging("error", f"Database error while claiming outbox messages: {str(e)}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
+
+def complete_email_outbox(published_ids, failed, retry_delay_seconds, max_retry_delay_seconds):
+    """
+    Delete published outbox messages and reschedule failed ones with exponential backoff.
+    failed is a list of (outbox_id, error_message) pairs.
+    """
+    with get_connection() as conn:
+        if conn is None:
+            print_logging("error", "Database connection unavailable. Cannot complete outbox messages")
+            return False
+
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            if published_ids:
+                cursor.execute("DELETE FROM email_outbox WHERE id = ANY(%s)", (list(published_ids),))
+
+            if failed:
+                query = """
+                    UPDATE email_outbox
+                    SET attempts = attempts + 1,
+                        last_error = %s,
+                        available_at = NOW() + make_interval(secs => LEAST(%s * POWER(2, attempts), %s))
+                    WHERE id = %s
+                """
+                execute_batch(cursor, query, [
+                    (error, retry_delay_seconds, max_retry_delay_seconds, outbox_id)
+                    for outbox_id, error in failed
+                ])
+
+            conn.commit()
+            return True
+        except Exception as e:
+            print_logging("error", f"Database error while completing outbox messages: {str(e)}")
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+
+
+def count_email_outbox_backlog():
+    """Return {priority_level: count} of outbox messages not yet published, or None on error."""
+    with get_connection() as conn:
+        if conn is None:
+            print_logging("error", "Database connection unavailable. Cannot count outbox backlog")
+            return None
+
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT priority_level, COUNT(*) FROM email_outbox GROUP BY priority_level")
+            return {priority_level: count for priority_level, count in cursor.fetchall()}
+        except Exception as e:
+            print_logging("error", f"Database error while counting outbox backlog: {str(e)}")
+            return None
+        finally:
+            if cursor:
+                cursor.close()
@@ -0,0 +1,69 @@
+import argparse
+import shlex
+import pika
+from app.config import config
+from app.utils.dead_letter_utils import inspect_dead_letters, replay_dead_letters, dead_letter_policy
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and replay the dead letter queues of the email queues, or print their broker policies.")
+    parser.add_argument("command", choices=["inspect", "replay", "policy"])
+    parser.add_argument("--queue", action="append", help="Priority queue whose dead letters to read (repeatable, default: all)")
+    parser.add_argument("--email-type", help="Only emails of this type")
+    parser.add_argument("--reason", help="Only this failure reason, e.g. retries_exhausted or smtp_permanent")
+    parser.add_argument("--error", help="Only errors containing this text (case-insensitive)")
+    parser.add_argument("--min-age", type=float, help="Only messages dead-lettered at least this many seconds ago")
+    parser.add_argument("--max-age", type=float, help="Only messages dead-lettered at most this many seconds ago")
+    parser.add_argument("--include-sent", action="store_true", help="Also replay emails dead-lettered as status_update_failed, which were already delivered")
+    parser.add_argument("--limit", type=int, help="Handle at most this many matching messages per queue")
+    parser.add_argument("--batch-size", type=int, default=config.DLQ_REPLAY_BATCH_SIZE, help="Messages replayed between progress logs and pauses")
+    parser.add_argument("--rate", type=float, default=config.DLQ_REPLAY_RATE_PER_SECOND, help="Maximum messages replayed per second")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    queue_names = args.queue or [config.EMAIL_QUEUE_HIGH, config.EMAIL_QUEUE_NORMAL, config.EMAIL_QUEUE_LOW]
+    filters = {
+        "email_type": args.email_type,
+        "reason": args.reason,
+        "error": args.error,
+        "min_age": args.min_age,
+        "max_age": args.max_age
+    }
+
+    if args.command == "policy":
+        # print the commands instead of running them, since they need access to rabbitmqctl on the broker host
+        for queue_name in queue_names:
+            print(shlex.join(["rabbitmqctl", "set_policy", "-p", config.RABBITMQ_VHOST] + dead_letter_policy(queue_name)))
+        return
+
+    connection = pika.BlockingConnection(pika.ConnectionParameters(
+        host=config.RABBITMQ_HOST,
+        port=config.RABBITMQ_PORT,
+        virtual_host=config.RABBITMQ_VHOST,
+        credentials=pika.PlainCredentials(config.RABBITMQ_USER, config.RABBITMQ_PASSWORD)
+    ))
+    try:
+        for queue_name in queue_names:
+            channel = connection.channel()
+            if args.command == "inspect":
+                dead_letters = inspect_dead_letters(channel, queue_name, filters, args.limit)
+                for dead_letter in dead_letters:
+                    print(
+                        f"{queue_name}\t{dead_letter['failed_at']}\t{dead_letter['reason']}\t"
+                        f"{dead_letter['email_type']}\t{dead_letter['email_id']}\t"
+                        f"attempt {dead_letter['attempt']}\t{dead_letter['error']}"
+                    )
+                print(f"{queue_name}: {len(dead_letters)} matching dead letters")
+            else:
+                channel.confirm_delivery()
+                replayed = replay_dead_letters(channel, queue_name, filters, args.limit, args.batch_size, args.rate, args.include_sent)
+                print(f"{queue_name}: replayed {replayed} dead letters")
+            channel.close()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
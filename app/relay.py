@@ -0,0 +1,4 @@
+from app.utils.relay_utils import initialize_relay
+
+if __name__ == "__main__":
+    initialize_relay()
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import signal
+import aio_pika
+from app.config import config
+from app.utils.logger import print_logging
+from app.utils.email_utils import build_email_message, send_message_via_smtp_async
+from app.utils.worker_utils import decode_message, prepare_email
+from app.utils.smtp_pool import async_smtp_pool
+from app.utils.template_utils import render_cache
+from app.utils.retry_utils import retry_policy, get_attempt, is_permanent_smtp_error
+from app.utils.dead_letter_utils import (
+    failure_headers, declare_queue_topology_async,
+    DECODE_ERROR, INVALID_EMAIL_DATA, SMTP_PERMANENT, RETRIES_EXHAUSTED, PROCESSING_ERROR, STATUS_UPDATE_FAILED
+)
+from app.database.connect import open_pool, close_pool
+from app.database.transactions import update_email_status
+
+MAX_STARTUP_RETRY_DELAY_SECONDS = 60
+
+
+class AsyncEmailWorker:
+    """
+    Consumes the priority queues on one event loop with many emails in flight.
+    - Each queue has its own channel and prefetch, so the broker never hands out more than
+      prefetch[queue] unacknowledged messages of that queue
+    - At most concurrency messages are processed at once across all queues
+    - Rendering and file and database work run in threads; SMTP is sent with aiosmtplib over
+      pooled connections
+    - A message is acked only after its final status is stored or its retry is published;
+      failed attempts wait in the retry queues of retry_policy, not in the worker
+    - A sent email whose status cannot be stored is dead-lettered as status_update_failed
+      instead of acked, so the missing status can be found and repaired
+    - Messages that cannot be decoded, processed or sent are moved to the queue's dead letter
+      queue with the failure reason in their headers
+    - On shutdown consumers are cancelled first and in-flight messages finish before the
+      connection closes
+    """
+
+    def __init__(self, prefetch, concurrency, retry_policy):
+        self.prefetch = prefetch
+        self.concurrency = concurrency
+        self.retry_policy = retry_policy
+        self._semaphore = None
+        self._tasks = set()
+        self._stop_event = None
+        self._publish_channel = None
+        self._dead_letter_exchanges = {}
+
+    async def send(self, email):
+        message, sender_email, all_recipients = await asyncio.to_thread(
+            build_email_message,
+            email["subject"], email["body"], email["to_address"],
+            email["cc_addresses"], email["bcc_addresses"], email["attachments"]
+        )
+        return await send_message_via_smtp_async(message, sender_email, all_recipients)
+
+    async def schedule_retry(self, message, attempt):
+        """Republish a failed attempt to the retry queue that dead-letters it back after the delay."""
+        retry_queue, expiration_ms, headers = self.retry_policy.next_retry(message.routing_key, attempt, message.headers)
+        await self._publish_channel.default_exchange.publish(
+            aio_pika.Message(
+                body=message.body,
+                content_type=message.content_type,
+                content_encoding=message.content_encoding,
+                headers=headers,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                expiration=expiration_ms / 1000
+            ),
+            routing_key=retry_queue
+        )
+        return expiration_ms
+
+    async def dead_letter(self, message, reason, error, email_data=None):
+        """Move a message to its queue's dead letter queue with the failure reason in its headers."""
+        try:
+            await self._dead_letter_exchanges[message.routing_key].publish(
+                aio_pika.Message(
+                    body=message.body,
+                    content_type=message.content_type,
+                    content_encoding=message.content_encoding,
+                    headers=failure_headers(message.headers, message.routing_key, reason, error, email_data),
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=message.routing_key
+            )
+            await message.ack()
+        except Exception as e:
+            # the queue's dead letter policy still routes the rejected message to the dead letter queue
+            print_logging("error", f"Could not publish to the dead letter queue: {str(e)}")
+            await message.reject(requeue=False)
+
+    async def process_message(self, message):
+        async with self._semaphore:
+            try:
+                email_data = decode_message(message.body, message)
+                email_id = email_data["id"]
+            except Exception as e:
+                print_logging("error", f"Invalid message format: {str(e)}")
+                await self.dead_letter(message, DECODE_ERROR, e)
+                return
+
+            try:
+                attempt = get_attempt(message.headers)
+                max_retries = self.retry_policy.max_retries
+
+                try:
+                    email = await asyncio.to_thread(prepare_email, email_data)
+                except json.JSONDecodeError as e:
+                    print_logging("error", f"Invalid JSON for email {email_id}: {str(e)}")
+                    await self.dead_letter(message, INVALID_EMAIL_DATA, e, email_data)
+                    return
+
+                success, result = await self.send(email)
+                if success:
+                    print_logging("info", f"Email {email_id} sent successfully on attempt {attempt}/{max_retries}!")
+                    if not await asyncio.to_thread(update_email_status, 1, email_id):
+                        await self.dead_letter(message, STATUS_UPDATE_FAILED, f"Email {email_id} was sent but its status could not be stored", email_data)
+                        return
+                elif self.retry_policy.should_retry(attempt, result):
+                    expiration_ms = await self.schedule_retry(message, attempt)
+                    print_logging("warning", f"Attempt {attempt}/{max_retries} failed for email {email_id}: {result}; retrying in {expiration_ms / 1000:.1f}s")
+                else:
+                    print_logging("error", f"Failed to send email {email_id} on attempt {attempt}/{max_retries} due to: {result}")
+                    await asyncio.to_thread(update_email_status, 2, email_id)
+                    reason = SMTP_PERMANENT if is_permanent_smtp_error(result) else RETRIES_EXHAUSTED
+                    await self.dead_letter(message, reason, result, email_data)
+                    return
+
+                await message.ack()
+            except Exception as e:
+                print_logging("error", f"Error processing message: {str(e)}")
+                await self.dead_letter(message, PROCESSING_ERROR, e, email_data)
+
+    async def on_message(self, message):
+        # hand the message to its own task so the consumer keeps receiving up to the prefetch limit
+        task = asyncio.create_task(self.process_message(message))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stop(self):
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    async def connect(self):
+        return await aio_pika.connect_robust(
+            host=config.RABBITMQ_HOST,
+            port=config.RABBITMQ_PORT,
+            login=config.RABBITMQ_USER,
+            password=config.RABBITMQ_PASSWORD,
+            virtualhost=config.RABBITMQ_VHOST,
+            reconnect_interval=config.RABBITMQ_RECONNECT_INTERVAL_SECONDS
+        )
+
+    async def start(self, connection):
+        """Declare the queue topology and start one consumer per queue. Returns [(queue, consumer_tag)]."""
+        consumers = []
+        self._publish_channel = await connection.channel()
+        for queue_name, prefetch_count in self.prefetch.items():
+            self._dead_letter_exchanges[queue_name] = await declare_queue_topology_async(self._publish_channel, queue_name)
+            for retry_queue, arguments in self.retry_policy.retry_queues(queue_name):
+                await self._publish_channel.declare_queue(retry_queue, durable=True, arguments=arguments)
+
+            channel = await connection.channel()
+            await channel.set_qos(prefetch_count=prefetch_count)
+            queue = await channel.declare_queue(queue_name, durable=True)
+            consumers.append((queue, await queue.consume(self.on_message)))
+        return consumers
+
+    async def run(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._stop_event = asyncio.Event()
+
+        # the broker may still be booting; connect_robust only reconnects after a first success
+        delay = config.RABBITMQ_RECONNECT_INTERVAL_SECONDS
+        while True:
+            connection = None
+            try:
+                connection = await self.connect()
+                consumers = await self.start(connection)
+                break
+            except Exception as e:
+                print_logging("error", f"Async worker could not start: {str(e)}; retrying in {delay:.0f}s")
+                if connection is not None:
+                    try:
+                        await connection.close()
+                    except Exception:
+                        pass
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), timeout=delay)
+                    return
+                except asyncio.TimeoutError:
+                    delay = min(delay * 2, MAX_STARTUP_RETRY_DELAY_SECONDS)
+
+        try:
+            print_logging("info", f"Async worker started (concurrency={self.concurrency}, prefetch={self.prefetch})")
+            await self._stop_event.wait()
+        finally:
+            for queue, consumer_tag in consumers:
+                await queue.cancel(consumer_tag)
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            await connection.close()
+            print_logging("info", "Async worker stopped")
+
+
+async def run_stats_log(interval):
+    """Periodically log how well SMTP connections and rendered templates are reused."""
+    while True:
+        await asyncio.sleep(interval)
+        print_logging("info", f"SMTP pool stats: {async_smtp_pool.stats()}")
+        if render_cache is not None:
+            print_logging("info", f"Render cache stats: {render_cache.stats()}")
+
+
+async def run_async_worker():
+    worker = AsyncEmailWorker(
+        prefetch={
+            config.EMAIL_QUEUE_HIGH: config.WORKER_PREFETCH_HIGH,
+            config.EMAIL_QUEUE_NORMAL: config.WORKER_PREFETCH_NORMAL,
+            config.EMAIL_QUEUE_LOW: config.WORKER_PREFETCH_LOW
+        },
+        concurrency=config.WORKER_CONCURRENCY,
+        retry_policy=retry_policy
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    open_pool()
+    stats_log = asyncio.create_task(run_stats_log(config.SMTP_STATS_LOG_INTERVAL_SECONDS))
+    try:
+        await worker.run()
+    finally:
+        stats_log.cancel()
+        await async_smtp_pool.close()
+        close_pool()
+
+
+def initialize_async_worker():
+    asyncio.run(run_async_worker())
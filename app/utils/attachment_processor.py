@@ -1,11 +1,16 @@
 from pathlib import Path
 from app.config import config
 from app.utils.logger import print_logging
-from app.utils.file_utils import calculate_sha256
-from app.database.transactions import insert_email_attachments
-from typing import List
+from app.utils.blob_store import store_blob, discard_new_blobs
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from fastapi import UploadFile
+import asyncio
+import hashlib
 import magic
+import os
+import tempfile
 import re
 import unicodedata
 
@@ -32,86 +37,139 @@ def sanitize_filename(filename: str) -> str:
     return basename if basename else "unnamed"
 
 
-def save_attachment_to_disk(file_content: bytes, filename: str, email_queue_id: str) -> str:
+# shared by all requests, so hashing, MIME detection and file I/O for attachments
+# never take more than ATTACHMENT_PROCESSING_WORKERS threads per process
+attachment_executor = ThreadPoolExecutor(
+    max_workers=config.ATTACHMENT_PROCESSING_WORKERS,
+    thread_name_prefix="attachment"
+)
+
+
+def _run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(attachment_executor, partial(func, *args, **kwargs))
+
+
+def _write_chunk(file, hasher, chunk: bytes) -> None:
+    hasher.update(chunk)
+    file.write(chunk)
+
+
+def _discard_temp_file(file, temp_path: str) -> None:
+    file.close()
+    try:
+        os.unlink(temp_path)
+    except FileNotFoundError:
+        pass
+
+
+async def stream_attachment_to_temp_file(attachment: UploadFile) -> Optional[dict]:
     """
-    Save attachment to disk and return the file path
-    Organize files by email_queue_id to avoid conflicts
-    Handles duplicate filenames by appending counter (1.pdf, 2.pdf, etc.)
+    Stream an upload to a temp file in chunks, return its metadata or None if it was rejected
+    - Aborts as soon as MAX_FILE_SIZE is crossed instead of after reading the whole file
+    - Detects the MIME type from the first ATTACHMENT_MIME_SNIFF_BYTES only
+    - Hashes incrementally and writes off the event loop, so memory is bounded by the chunk size
     """
-    upload_dir = Path(config.UPLOAD_DIR)
-    
-    email_dir = upload_dir / str(email_queue_id)
-    email_dir.mkdir(parents=True, exist_ok=True)
-    
-    sanitized_name = sanitize_filename(filename)
-    file_path = email_dir / sanitized_name
-    counter = 1
-    
-    while file_path.exists():
-        name = sanitized_name.rsplit('.', 1)
-        if len(name) == 2:
-            base, ext = name
-            new_filename = f"{base} {counter}.{ext}"
-        else:
-            new_filename = f"{sanitized_name} {counter}"
-        
-        file_path = email_dir / new_filename
-        counter += 1
-    
-    with open(file_path, 'wb') as f:
-        f.write(file_content)
-    
-    return str(file_path)
+    if attachment.size is not None and attachment.size > config.MAX_FILE_SIZE:
+        print_logging("warning", f"Skipping attachment '{attachment.filename}' exceeding max size ({attachment.size} > {config.MAX_FILE_SIZE})")
+        return None
 
+    temp_dir = Path(config.UPLOAD_DIR) / ".tmp"
+    await _run_blocking(temp_dir.mkdir, parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+    temp_file = os.fdopen(fd, 'wb')
 
-async def process_attachments(attachments: List[UploadFile], email_queue_id: str) -> int:
-    """Process and save attachments, return count of successfully processed files"""
-    attachment_count = 0
-    
-    for attachment in attachments:
-        try:
-            if not attachment.filename:
-                print_logging("warning", f"Skipping attachment without filename for email {email_queue_id}")
-                continue
-            
-            file_content = await attachment.read()
-            file_size = len(file_content)
-            
+    hasher = hashlib.sha256()
+    file_size = 0
+    head = b""
+    detected_mime = None
+
+    try:
+        while True:
+            chunk = await attachment.read(config.ATTACHMENT_CHUNK_SIZE)
+            if not chunk:
+                break
+
+            file_size += len(chunk)
             if file_size > config.MAX_FILE_SIZE:
-                print_logging("warning", f"Skipping attachment '{attachment.filename}' exceeding max size ({file_size} > {config.MAX_FILE_SIZE})")
-                continue
-            
-            file_ext = Path(attachment.filename).suffix.lower()
-            if file_ext not in config.ALLOWED_EXTENSIONS:
-                print_logging("warning", f"Skipping attachment '{attachment.filename}' with disallowed extension '{file_ext}'")
-                continue
-            
-            detected_mime = magic.from_buffer(file_content, mime=True)
-            if detected_mime not in config.ALLOWED_MIME_TYPES:
-                print_logging("warning", f"Skipping attachment '{attachment.filename}' with detected MIME type '{detected_mime}'")
-                continue
-            
-            checksum = calculate_sha256(file_content)
-            
-            file_path = save_attachment_to_disk(
-                file_content, 
-                attachment.filename, 
-                email_queue_id
-            )
-            
-            insert_email_attachments(
-                email_queue_id=email_queue_id,
-                file_name=attachment.filename,
-                file_path=file_path,
-                mime_type=detected_mime,
-                file_size=file_size,
-                checksum=checksum
-            )
-            
-            attachment_count += 1
-            print_logging("info", f"Saved attachment: {attachment.filename} for email {email_queue_id}")
-            
-        except Exception as e:
-            print_logging("error", f"Error processing attachment {attachment.filename}: {str(e)}")
-    
-    return attachment_count
+                print_logging("warning", f"Skipping attachment '{attachment.filename}' exceeding max size (> {config.MAX_FILE_SIZE})")
+                await _run_blocking(_discard_temp_file, temp_file, temp_path)
+                return None
+
+            if detected_mime is None:
+                head += chunk
+                if len(head) >= config.ATTACHMENT_MIME_SNIFF_BYTES:
+                    detected_mime = await _run_blocking(magic.from_buffer, head[:config.ATTACHMENT_MIME_SNIFF_BYTES], True)
+                    head = b""
+                    if detected_mime not in config.ALLOWED_MIME_TYPES:
+                        break
+
+            await _run_blocking(_write_chunk, temp_file, hasher, chunk)
+
+        if detected_mime is None:
+            detected_mime = await _run_blocking(magic.from_buffer, head, True)
+
+        if detected_mime not in config.ALLOWED_MIME_TYPES:
+            print_logging("warning", f"Skipping attachment '{attachment.filename}' with detected MIME type '{detected_mime}'")
+            await _run_blocking(_discard_temp_file, temp_file, temp_path)
+            return None
+
+        await _run_blocking(temp_file.close)
+    except BaseException:
+        await _run_blocking(_discard_temp_file, temp_file, temp_path)
+        raise
+
+    return {
+        "temp_path": temp_path,
+        "file_size": file_size,
+        "mime_type": detected_mime,
+        "checksum": hasher.hexdigest()
+    }
+
+
+async def _prepare_attachment(attachment: UploadFile) -> Optional[dict]:
+    try:
+        if not attachment.filename:
+            print_logging("warning", "Skipping attachment without filename")
+            return None
+
+        file_ext = Path(attachment.filename).suffix.lower()
+        if file_ext not in config.ALLOWED_EXTENSIONS:
+            print_logging("warning", f"Skipping attachment '{attachment.filename}' with disallowed extension '{file_ext}'")
+            return None
+
+        received = await stream_attachment_to_temp_file(attachment)
+        if received is None:
+            return None
+
+        file_path, created_mtime_ns = await _run_blocking(store_blob, received["temp_path"], received["checksum"])
+
+        return {
+            "file_name": sanitize_filename(attachment.filename),
+            "file_path": file_path,
+            "mime_type": received["mime_type"],
+            "file_size": received["file_size"],
+            "checksum": received["checksum"],
+            "created_mtime_ns": created_mtime_ns
+        }
+
+    except Exception as e:
+        print_logging("error", f"Error processing attachment {attachment.filename}: {str(e)}")
+        return None
+
+
+async def prepare_attachments(attachments: List[UploadFile]) -> List[dict]:
+    """
+    Validate, hash and store all attachments of one email concurrently
+    - Returns the metadata of the accepted files, in upload order, for insert_email_queues
+      to reference in the same transaction as the queue row
+    - Rejected files are logged and skipped
+    """
+    results = await asyncio.gather(*(_prepare_attachment(attachment) for attachment in attachments))
+    return [result for result in results if result is not None]
+
+
+async def discard_attachments(prepared_attachments: List[dict]) -> None:
+    """Remove the blobs stored by prepare_attachments() when the queue row was not inserted."""
+    if prepared_attachments:
+        await _run_blocking(discard_new_blobs, prepared_attachments)
@@ -9,6 +9,22 @@ def get_file_attachments(email_queue_id):
     for attachment in attachments_metadata:
         file_path = attachment["file_path"]
         if os.path.exists(file_path):
-            file_list.append(file_path)
+            file_list.append((file_path, attachment["file_name"]))
     
     return file_list
+
+
+def get_message_attachments(email_data):
+    """
+    Attachments of a queue message as (file_path, file_name) pairs.
+    Messages carrying an attachment manifest are resolved without a database query or file
+    checks (send_email_via_smtp skips missing files); messages published before the manifest
+    existed fall back to get_file_attachments.
+    """
+    if "has_attachments" not in email_data:
+        return get_file_attachments(email_data["id"])
+
+    if not email_data["has_attachments"]:
+        return []
+
+    return [(attachment["file_path"], attachment["file_name"]) for attachment in email_data.get("attachments") or []]
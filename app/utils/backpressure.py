@@ -0,0 +1,125 @@
+import asyncio
+import math
+import time
+from app.config import config
+from app.database.transactions import count_email_outbox_backlog
+from app.utils.logger import print_logging
+from app.utils.rabbitmq_publisher import rabbitmq_publisher, get_queue_name
+
+
+class QueueBackpressure:
+    """
+    Admission control by queue depth, so a stalled worker fleet sheds low priority work first.
+    - Every poll_interval the broker depth and consumer count of each priority queue are sampled
+      with passive declares, together with the unpublished outbox backlog
+    - The backlog is the sum of both; a priority tier is shed once it passes the tier's threshold
+      (0 = never shed), so thresholds ordered low < normal < high protect priority_level=1 longest
+    - Shed requests get 429 with a Retry-After derived from the measured drain rate, or 503 with
+      the maximum Retry-After when the tier's queue has no consumers
+    - A missing or stale sample admits every request
+    """
+
+    def __init__(self, publisher, outbox_counter, thresholds, poll_interval, max_retry_after):
+        self.publisher = publisher
+        self.outbox_counter = outbox_counter
+        self.thresholds = thresholds
+        self.poll_interval = poll_interval
+        self.max_retry_after = max_retry_after
+        self._queues = {}
+        self._outbox = {}
+        self._backlog = None
+        self._drain_rate = 0.0
+        self._sampled_at = None
+        self._shed = 0
+        self._task = None
+
+    @staticmethod
+    def tier(priority_level):
+        return priority_level if priority_level in (1, 2) else 3
+
+    async def sample(self):
+        """Refresh the depth snapshot. Returns the total backlog, or None if sampling failed."""
+        try:
+            queues = await self.publisher.queue_depths([get_queue_name(tier) for tier in (1, 2, 3)])
+        except Exception as e:
+            print_logging("error", f"Error sampling RabbitMQ queue depths: {str(e)}")
+            return None
+
+        outbox = await asyncio.to_thread(self.outbox_counter)
+        if outbox is None:
+            return None
+
+        now = time.monotonic()
+        backlog = sum(messages for messages, _ in queues.values()) + sum(outbox.values())
+        if self._sampled_at is not None and now > self._sampled_at:
+            # net drain per second, smoothed; negative while the backlog is growing
+            rate = (self._backlog - backlog) / (now - self._sampled_at)
+            self._drain_rate = rate if self._drain_rate == 0.0 else 0.5 * self._drain_rate + 0.5 * rate
+
+        self._queues = queues
+        self._outbox = outbox
+        self._backlog = backlog
+        self._sampled_at = now
+        return backlog
+
+    def admit(self, priority_level):
+        """Returns (allowed, status_code, retry_after_seconds) for a request of this priority."""
+        tier = self.tier(priority_level)
+        threshold = self.thresholds.get(tier, 0)
+        if threshold <= 0 or self._sampled_at is None:
+            return True, None, 0
+
+        if time.monotonic() - self._sampled_at > self.poll_interval * 3 or self._backlog <= threshold:
+            return True, None, 0
+
+        self._shed += 1
+        _, consumers = self._queues.get(get_queue_name(tier), (0, 0))
+        if consumers == 0:
+            return False, 503, self.max_retry_after
+
+        if self._drain_rate <= 0:
+            return False, 429, self.max_retry_after
+
+        retry_after = math.ceil((self._backlog - threshold) / self._drain_rate)
+        return False, 429, min(self.max_retry_after, max(1, retry_after))
+
+    async def run(self):
+        while True:
+            await self.sample()
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "backlog": self._backlog,
+            "queues": {name: {"messages": messages, "consumers": consumers} for name, (messages, consumers) in self._queues.items()},
+            "outbox": self._outbox,
+            "drain_rate": round(self._drain_rate, 3),
+            "age_seconds": round(time.monotonic() - self._sampled_at, 3) if self._sampled_at is not None else None,
+            "shed": self._shed
+        }
+
+
+queue_backpressure = QueueBackpressure(
+    publisher=rabbitmq_publisher,
+    outbox_counter=count_email_outbox_backlog,
+    thresholds={
+        1: config.BACKPRESSURE_SHED_HIGH_DEPTH,
+        2: config.BACKPRESSURE_SHED_NORMAL_DEPTH,
+        3: config.BACKPRESSURE_SHED_LOW_DEPTH
+    },
+    poll_interval=config.BACKPRESSURE_POLL_SECONDS,
+    max_retry_after=config.BACKPRESSURE_MAX_RETRY_AFTER_SECONDS
+) if config.BACKPRESSURE_ENABLED else None
@@ -0,0 +1,93 @@
+import os
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+from app.config import config
+from app.utils.logger import print_logging
+from app.database.transactions import delete_unreferenced_attachment_blobs
+
+BLOB_DIR_NAME = "blobs"
+
+
+def get_blob_path(checksum: str) -> Path:
+    """
+    Return the content-addressed location of a blob
+    - Sharded by the first two byte pairs of the SHA-256 (blobs/ab/cd/<checksum>)
+      so no single directory grows past a few thousand entries
+    """
+    return Path(config.UPLOAD_DIR) / BLOB_DIR_NAME / checksum[:2] / checksum[2:4] / checksum
+
+
+def store_blob(temp_path: str, checksum: str) -> Tuple[str, Optional[int]]:
+    """
+    Move a received file into the blob store and return (blob_path, created_mtime_ns)
+    - If the same content is already stored, the temp file is discarded and the
+      existing blob's mtime is refreshed so cleanup treats it as recently used;
+      created_mtime_ns is None in that case
+    - created_mtime_ns lets discard_new_blobs() tell whether another upload reused the blob
+    """
+    blob_path = get_blob_path(checksum)
+    blob_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if blob_path.exists():
+        os.utime(blob_path)
+        os.unlink(temp_path)
+        return str(blob_path), None
+
+    os.replace(temp_path, blob_path)
+    return str(blob_path), os.stat(blob_path).st_mtime_ns
+
+
+def discard_new_blobs(attachments) -> int:
+    """
+    Delete the blobs created for attachments whose queue row was never inserted
+    - Such files have no attachment_blobs row, so remove_unreferenced_blobs() cannot find them
+    - Blobs that already existed, or whose mtime was refreshed by a concurrent upload of the
+      same content, are kept
+    Returns the number of files removed
+    """
+    removed = 0
+    for attachment in attachments:
+        created_mtime_ns = attachment.get("created_mtime_ns")
+        if created_mtime_ns is None:
+            continue
+        try:
+            if os.stat(attachment["file_path"]).st_mtime_ns != created_mtime_ns:
+                continue
+            os.unlink(attachment["file_path"])
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print_logging("error", f"Error removing attachment blob {attachment['file_path']}: {str(e)}")
+    return removed
+
+
+def remove_unreferenced_blobs(grace_seconds=None, limit=1000) -> int:
+    """
+    Delete blobs whose ref_count dropped to zero more than grace_seconds ago
+    - Each file is unlinked before its row is deleted; a file that cannot be removed keeps
+      its row, so the next run tries again
+    - Files touched within the grace period are kept with their row, since a concurrent
+      upload of the same content may be about to reference them again
+    Returns the number of blobs removed
+    """
+    grace_seconds = config.ATTACHMENT_BLOB_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    cutoff = time.time() - grace_seconds
+
+    def remove_file(file_path):
+        try:
+            if os.path.getmtime(file_path) > cutoff:
+                return False
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print_logging("error", f"Error removing attachment blob {file_path}: {str(e)}")
+            return False
+        return True
+
+    removed = len(delete_unreferenced_attachment_blobs(grace_seconds, limit, remove_file))
+    if removed:
+        print_logging("info", f"Removed {removed} unreferenced attachment blobs")
+    return removed
@@ -0,0 +1,222 @@
+import calendar
+import json
+import re
+import time
+import aio_pika
+import pika
+from app.utils.logger import print_logging
+from app.utils.retry_utils import ATTEMPT_HEADER
+
+# headers describing why a message was dead-lettered
+FAILURE_REASON_HEADER = "x-failure-reason"
+ERROR_HEADER = "x-error"
+FAILED_AT_HEADER = "x-failed-at"
+SOURCE_QUEUE_HEADER = "x-source-queue"
+EMAIL_ID_HEADER = "x-email-id"
+EMAIL_TYPE_HEADER = "x-email-type"
+FAILURE_HEADERS = (FAILURE_REASON_HEADER, ERROR_HEADER, FAILED_AT_HEADER, SOURCE_QUEUE_HEADER, EMAIL_ID_HEADER, EMAIL_TYPE_HEADER)
+
+# values of the x-failure-reason header
+DECODE_ERROR = "decode_error"
+INVALID_EMAIL_DATA = "invalid_email_data"
+SMTP_PERMANENT = "smtp_permanent"
+RETRIES_EXHAUSTED = "retries_exhausted"
+PROCESSING_ERROR = "processing_error"
+STATUS_UPDATE_FAILED = "status_update_failed"
+
+MAX_ERROR_LENGTH = 1000
+
+
+def dead_letter_exchange_name(queue_name):
+    return f"{queue_name}.dlx"
+
+
+def dead_letter_queue_name(queue_name):
+    return f"{queue_name}.dlq"
+
+
+def dead_letter_policy(queue_name):
+    """
+    rabbitmqctl set_policy arguments routing messages the broker rejects from queue_name to its
+    dead letter exchange. A policy, unlike x-dead-letter-* queue arguments, applies to the existing
+    durable queues without redeclaring them.
+    """
+    pattern = "^" + re.escape(queue_name) + "$"
+    definition = json.dumps({
+        "dead-letter-exchange": dead_letter_exchange_name(queue_name),
+        "dead-letter-routing-key": queue_name
+    })
+    return ["--apply-to", "queues", f"{queue_name}-dlx", pattern, definition]
+
+
+def failure_headers(headers, queue_name, reason, error, email_data=None):
+    """Headers of a dead-lettered message: the original headers plus the failure details."""
+    failure = {
+        **(headers or {}),
+        FAILURE_REASON_HEADER: reason,
+        ERROR_HEADER: str(error)[:MAX_ERROR_LENGTH],
+        FAILED_AT_HEADER: int(time.time()),
+        SOURCE_QUEUE_HEADER: queue_name
+    }
+    if isinstance(email_data, dict):
+        if email_data.get("id") is not None:
+            failure[EMAIL_ID_HEADER] = str(email_data["id"])
+        if email_data.get("email_type") is not None:
+            failure[EMAIL_TYPE_HEADER] = str(email_data["email_type"])
+    return failure
+
+
+def failed_at(headers):
+    """Unix time a message was dead-lettered, also for messages the broker dead-lettered itself."""
+    headers = headers or {}
+    if FAILED_AT_HEADER in headers:
+        return int(headers[FAILED_AT_HEADER])
+    deaths = headers.get("x-death") or []
+    if deaths and deaths[0].get("time") is not None:
+        # pika decodes AMQP timestamps as naive UTC datetimes
+        return calendar.timegm(deaths[0]["time"].utctimetuple())
+    return None
+
+
+def declare_queue_topology(channel, queue_name):
+    """Declare a priority queue with its dead letter exchange and queue on a pika channel."""
+    # the queue keeps its plain declaration; dead_letter_policy() attaches the exchange to it
+    channel.exchange_declare(exchange=dead_letter_exchange_name(queue_name), exchange_type="direct", durable=True)
+    channel.queue_declare(queue=dead_letter_queue_name(queue_name), durable=True)
+    channel.queue_bind(queue=dead_letter_queue_name(queue_name), exchange=dead_letter_exchange_name(queue_name), routing_key=queue_name)
+    channel.queue_declare(queue=queue_name, durable=True)
+
+
+async def declare_queue_topology_async(channel, queue_name):
+    """Declare a priority queue with its dead letter exchange and queue on an aio-pika channel. Returns the exchange."""
+    exchange = await channel.declare_exchange(dead_letter_exchange_name(queue_name), aio_pika.ExchangeType.DIRECT, durable=True)
+    dead_letter_queue = await channel.declare_queue(dead_letter_queue_name(queue_name), durable=True)
+    await dead_letter_queue.bind(exchange, routing_key=queue_name)
+    await channel.declare_queue(queue_name, durable=True)
+    return exchange
+
+
+def matches_filters(headers, email_type=None, reason=None, error=None, min_age=None, max_age=None, now=None, exclude_reasons=()):
+    """Filter dead letters by email type, failure reason, error text (case-insensitive substring) and age in seconds."""
+    headers = headers or {}
+    if email_type is not None and headers.get(EMAIL_TYPE_HEADER) != email_type:
+        return False
+    if reason is not None and headers.get(FAILURE_REASON_HEADER) != reason:
+        return False
+    if headers.get(FAILURE_REASON_HEADER) in exclude_reasons:
+        return False
+    if error is not None and error.lower() not in str(headers.get(ERROR_HEADER, "")).lower():
+        return False
+
+    if min_age is not None or max_age is not None:
+        failed = failed_at(headers)
+        if failed is None:
+            return False
+        age = (now if now is not None else time.time()) - failed
+        if min_age is not None and age < min_age:
+            return False
+        if max_age is not None and age > max_age:
+            return False
+    return True
+
+
+def replay_headers(headers):
+    """Headers for sending a dead letter again: failure details and the attempt count are dropped."""
+    return {
+        key: value for key, value in (headers or {}).items()
+        if key not in FAILURE_HEADERS and key not in (ATTEMPT_HEADER, "x-death")
+    }
+
+
+def scan_dead_letters(channel, queue_name, filters, limit=None, on_skip=None):
+    """
+    Yield (delivery_tag, properties, body) of matching messages in the dead letter queue of queue_name.
+    - Only the messages present when the scan starts are read, each once
+    - Non-matching messages are passed to on_skip(delivery_tag, properties, body) if given;
+      otherwise they stay unacknowledged, like matches the caller does not ack, until
+      release_dead_letters() returns them to the queue in their original order
+    """
+    message_count = channel.queue_declare(queue=dead_letter_queue_name(queue_name), passive=True).method.message_count
+    matched = 0
+    for _ in range(message_count):
+        if limit is not None and matched >= limit:
+            return
+        method, properties, body = channel.basic_get(queue=dead_letter_queue_name(queue_name), auto_ack=False)
+        if method is None:
+            return
+        if matches_filters(properties.headers, **filters):
+            matched += 1
+            yield method.delivery_tag, properties, body
+        elif on_skip is not None:
+            on_skip(method.delivery_tag, properties, body)
+
+
+def release_dead_letters(channel):
+    channel.basic_nack(delivery_tag=0, multiple=True, requeue=True)
+
+
+def describe_dead_letter(properties):
+    headers = properties.headers or {}
+    failed = failed_at(headers)
+    return {
+        "email_id": headers.get(EMAIL_ID_HEADER),
+        "email_type": headers.get(EMAIL_TYPE_HEADER),
+        "reason": headers.get(FAILURE_REASON_HEADER, "rejected"),
+        "error": headers.get(ERROR_HEADER),
+        "attempt": headers.get(ATTEMPT_HEADER, 1),
+        "failed_at": None if failed is None else time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(failed))
+    }
+
+
+def inspect_dead_letters(channel, queue_name, filters, limit=None):
+    """Describe matching dead letters of queue_name without removing them."""
+    try:
+        return [describe_dead_letter(properties) for _, properties, _ in scan_dead_letters(channel, queue_name, filters, limit)]
+    finally:
+        release_dead_letters(channel)
+
+
+def replay_dead_letters(channel, queue_name, filters, limit=None, batch_size=100, rate_per_second=50, include_sent=False):
+    """
+    Publish matching dead letters back to queue_name, acking each once the broker confirms it.
+    Batches of batch_size are spread so no more than rate_per_second messages are replayed per second.
+    Non-matching messages are moved to the back of the dead letter queue as they are read, so
+    no message stays unacknowledged long enough to hit the broker's consumer_timeout.
+    Emails that were already delivered (status_update_failed) are left in place unless
+    include_sent is set or the reason filter names them.
+    The channel must be in confirm mode. Returns the number of replayed messages.
+    """
+    if not include_sent and filters.get("reason") is None:
+        filters = {**filters, "exclude_reasons": (STATUS_UPDATE_FAILED,)}
+
+    def keep(delivery_tag, properties, body):
+        channel.basic_publish(exchange="", routing_key=dead_letter_queue_name(queue_name), body=body, properties=properties)
+        channel.basic_ack(delivery_tag=delivery_tag)
+
+    replayed = 0
+    batch_started = time.monotonic()
+    try:
+        for delivery_tag, properties, body in scan_dead_letters(channel, queue_name, filters, limit, on_skip=keep):
+            channel.basic_publish(
+                exchange="",
+                routing_key=queue_name,
+                body=body,
+                properties=pika.BasicProperties(
+                    delivery_mode=2,
+                    content_type=properties.content_type,
+                    content_encoding=properties.content_encoding,
+                    headers=replay_headers(properties.headers)
+                )
+            )
+            channel.basic_ack(delivery_tag=delivery_tag)
+            replayed += 1
+
+            if replayed % batch_size == 0:
+                print_logging("info", f"Replayed {replayed} dead letters to {queue_name}")
+                remaining = batch_size / rate_per_second - (time.monotonic() - batch_started)
+                if remaining > 0:
+                    time.sleep(remaining)
+                batch_started = time.monotonic()
+    finally:
+        release_dead_letters(channel)
+    return replayed
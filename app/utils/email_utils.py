@@ -1,22 +1,16 @@
 import os
-import smtplib
-import ssl
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 from app.config import config
-from app.utils.logger import print_logging
+from app.utils.smtp_pool import smtp_pool, async_smtp_pool
 
 
-def send_email_via_smtp(subject, body, to_address, cc_addresses=None, bcc_addresses=None, attachments=[]):
-    smtp_server = config.SMTP_HOST
-    port = config.SMTP_PORT
+def build_email_message(subject, body, to_address, cc_addresses=None, bcc_addresses=None, attachments=[]):
+    """Build the MIME message. Returns (message, sender, recipients)."""
     sender_email = config.SMTP_USER
-    password = config.SMTP_PASSWORD
-
     sender_email = None if sender_email is None else str(sender_email)
-    password = None if password is None else str(password)
 
     message = MIMEMultipart()
     message["From"] = sender_email
@@ -35,7 +29,9 @@ def send_email_via_smtp(subject, body, to_address, cc_addresses=None, bcc_addres
     message["Subject"] = str(subject)
     message.attach(MIMEText(body, "html"))
 
-    for file_path in attachments:
+    for attachment in attachments:
+        # stored blobs are named by checksum, so the original file name travels alongside the path
+        file_path, filename = attachment if isinstance(attachment, tuple) else (attachment, os.path.basename(attachment))
         if os.path.exists(file_path):
             with open(file_path, 'rb') as attachment_file:
                 part = MIMEBase('application', 'octet-stream')
@@ -43,10 +39,10 @@ def send_email_via_smtp(subject, body, to_address, cc_addresses=None, bcc_addres
             
             encoders.encode_base64(part)
             
-            filename = os.path.basename(file_path)
             part.add_header(
                 'Content-Disposition',
-                f'attachment; filename= {filename}'
+                'attachment',
+                filename=filename
             )
             
             message.attach(part)
@@ -61,12 +57,14 @@ def send_email_via_smtp(subject, body, to_address, cc_addresses=None, bcc_addres
 
     all_recipients = [str(a) for a in all_recipients if a is not None]
 
-    context = ssl.create_default_context()
-    try:
-        with smtplib.SMTP_SSL(smtp_server, port, context=context) as server:
-            server.login(sender_email, password)
-            server.sendmail(sender_email, all_recipients, message.as_string())
-        return True, "success"
-    except Exception as e:
-        print_logging("error", f"SMTP error: {str(e)}")
-        return False, e
+    return message, sender_email, all_recipients
+
+
+def send_email_via_smtp(subject, body, to_address, cc_addresses=None, bcc_addresses=None, attachments=[]):
+    message, sender_email, all_recipients = build_email_message(subject, body, to_address, cc_addresses, bcc_addresses, attachments)
+    return smtp_pool.send(message, sender_email, all_recipients)
+
+
+async def send_message_via_smtp_async(message, sender_email, all_recipients):
+    """Send a message built by build_email_message without blocking the event loop."""
+    return await async_smtp_pool.send(message, sender_email, all_recipients)
@@ -0,0 +1,113 @@
+import gzip
+import json
+import threading
+import msgpack
+import zstandard
+from app.config import config
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+SUPPORTED_ENCODINGS = ("zstd", "gzip")
+
+# version of the message envelope, sent in the x-envelope-version header
+# 1: JSON body with email_data as a JSON string; 2: email_data and recipients as native values
+ENVELOPE_VERSION = 2
+ENVELOPE_VERSION_HEADER = "x-envelope-version"
+
+
+class MessageCodec:
+    """
+    Serializes queue messages for the broker.
+    - Bodies are msgpack (or JSON with message_format="json"), with content_type and the
+      envelope version header describing them
+    - Bodies of at least threshold bytes are compressed with the configured algorithm
+      ("zstd", "gzip" or "none"), which is announced in the content_encoding property;
+      compression is skipped when it would not make the body smaller
+    - decode() accepts every supported format, encoding and envelope version regardless of
+      the local settings, so consumers keep working while publishers are rolled out
+    """
+
+    def __init__(self, message_format, compression, threshold, level):
+        if message_format not in ("msgpack", "json"):
+            raise ValueError(f"Unknown MESSAGE_FORMAT '{message_format}'")
+        if compression not in SUPPORTED_ENCODINGS + ("none",):
+            raise ValueError(f"Unknown MESSAGE_COMPRESSION '{compression}'")
+        self.message_format = message_format
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+        self._lock = threading.Lock()
+        self._messages = 0
+        self._compressed = 0
+        self._raw_bytes = 0
+        self._encoded_bytes = 0
+
+    def _compress(self, data):
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return gzip.compress(data, compresslevel=self.level)
+
+    def encode(self, email_data):
+        """Returns (body, properties); properties are content_type, content_encoding and headers."""
+        if self.message_format == "msgpack":
+            body, content_type = msgpack.packb(email_data, use_bin_type=True), MSGPACK_CONTENT_TYPE
+        else:
+            body, content_type = json.dumps(email_data).encode("utf-8"), JSON_CONTENT_TYPE
+
+        encoded, content_encoding = body, None
+        if self.compression != "none" and len(body) >= self.threshold:
+            compressed = self._compress(body)
+            if len(compressed) < len(body):
+                encoded, content_encoding = compressed, self.compression
+
+        with self._lock:
+            self._messages += 1
+            self._raw_bytes += len(body)
+            self._encoded_bytes += len(encoded)
+            if content_encoding is not None:
+                self._compressed += 1
+
+        return encoded, {
+            "content_type": content_type,
+            "content_encoding": content_encoding,
+            "headers": {ENVELOPE_VERSION_HEADER: ENVELOPE_VERSION}
+        }
+
+    @staticmethod
+    def decode(body, content_type=None, content_encoding=None, headers=None):
+        """Decode a message body; messages without a content_type are legacy JSON envelopes."""
+        version = (headers or {}).get(ENVELOPE_VERSION_HEADER, 1)
+        if version > ENVELOPE_VERSION:
+            raise ValueError(f"Unsupported message envelope version {version}")
+
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        if content_encoding == "zstd":
+            body = zstandard.ZstdDecompressor().decompress(body)
+        elif content_encoding == "gzip":
+            body = gzip.decompress(body)
+        elif content_encoding not in (None, "", "identity"):
+            raise ValueError(f"Unsupported message content encoding '{content_encoding}'")
+
+        if content_type == MSGPACK_CONTENT_TYPE:
+            return msgpack.unpackb(body, raw=False)
+        return json.loads(body)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "messages": self._messages,
+                "compressed": self._compressed,
+                "raw_bytes": self._raw_bytes,
+                "encoded_bytes": self._encoded_bytes,
+                "bytes_saved": self._raw_bytes - self._encoded_bytes,
+                "compression_ratio": round(self._raw_bytes / self._encoded_bytes, 3) if self._encoded_bytes else None
+            }
+
+
+message_codec = MessageCodec(
+    message_format=config.MESSAGE_FORMAT,
+    compression=config.MESSAGE_COMPRESSION,
+    threshold=config.MESSAGE_COMPRESSION_THRESHOLD_BYTES,
+    level=config.MESSAGE_COMPRESSION_LEVEL
+)
@@ -0,0 +1,122 @@
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+from app.config import config
+from app.database.email_type_cache import email_type_cache
+from app.utils.logger import print_logging
+from app.utils.rate_limiter import build_rate_limit_backend
+
+
+class QuotaAdmission:
+    """
+    Admission control by email type and client identity.
+    - email_types.quota_per_minute caps an email type across all clients (NULL = no cap)
+    - client_per_minute caps every client identity (0 = no cap)
+    - Weighted fair share: fair_share_per_minute is divided among the (client, email type)
+      flows seen in the last window_seconds in proportion to email_types.quota_weight, so a
+      flooding client is throttled to its share while other flows keep theirs; a flow
+      that is alone may use the whole capacity
+    - Buckets live in the rate limiter backend, so caps are shared across processes; the
+      set of active flows is tracked per process, ordered by last use so expired flows are
+      dropped from the front and the total weight is kept as a running sum
+    """
+
+    def __init__(self, backend, type_cache, client_per_minute, fair_share_per_minute, window_seconds):
+        self.backend = backend
+        self.type_cache = type_cache
+        self.client_per_minute = client_per_minute
+        self.fair_share_per_minute = fair_share_per_minute
+        self.window_seconds = window_seconds
+        self._active_flows = OrderedDict()
+        self._total_weight = 0
+        self._lock = threading.Lock()
+
+    def _active_weight(self, flow, weight, now):
+        """Record the flow as active and return the total weight of all active flows."""
+        with self._lock:
+            previous = self._active_flows.pop(flow, None)
+            if previous is not None:
+                self._total_weight -= previous[0]
+            self._active_flows[flow] = (weight, now)
+            self._total_weight += weight
+
+            cutoff = now - self.window_seconds
+            while self._active_flows:
+                oldest_flow, (oldest_weight, last_seen) = next(iter(self._active_flows.items()))
+                if last_seen >= cutoff:
+                    break
+                del self._active_flows[oldest_flow]
+                self._total_weight -= oldest_weight
+            return self._total_weight
+
+    def admit(self, client_id, email_type):
+        """Consume one request for the client and email type. Returns (allowed, retry_after_seconds)."""
+        row = self.type_cache.get(email_type) or {}
+        type_per_minute = row.get("quota_per_minute")
+        weight = max(1, row.get("quota_weight") or 1)
+        now = time.time()
+
+        limits = []
+        if type_per_minute:
+            limits.append((f"quota:type:{email_type}", 60 / type_per_minute, 60))
+        if self.client_per_minute > 0:
+            limits.append((f"quota:client:{client_id}", 60 / self.client_per_minute, 60))
+        if self.fair_share_per_minute > 0:
+            flow = (client_id, email_type)
+            share = max(1.0, self.fair_share_per_minute * weight / self._active_weight(flow, weight, now))
+            limits.append((f"quota:flow:{client_id}:{email_type}", 60 / share, 60))
+
+        if not limits:
+            return True, 0.0
+
+        try:
+            return self.backend.acquire(limits, now)
+        except Exception as e:
+            print_logging("error", f"Quota backend error, admitting request: {str(e)}")
+            return True, 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active_flows": len(self._active_flows),
+                "active_weight": self._total_weight
+            }
+
+
+def parse_trusted_proxies(value):
+    """Comma-separated addresses or CIDR networks allowed to set the client id header."""
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in (value or "").split(",") if item.strip()]
+
+
+trusted_proxies = parse_trusted_proxies(config.CLIENT_ID_TRUSTED_PROXIES)
+
+
+def get_client_id(request, proxies=None):
+    """
+    Client identity for quotas: the remote address, or the CLIENT_ID_HEADER value when the
+    request comes from a trusted proxy. Untrusted callers cannot pick their own identity.
+    """
+    remote_address = request.client.host if request.client else None
+    if remote_address is None:
+        return "unknown"
+
+    proxies = trusted_proxies if proxies is None else proxies
+    client_id = request.headers.get(config.CLIENT_ID_HEADER)
+    if client_id and proxies:
+        try:
+            address = ipaddress.ip_address(remote_address)
+        except ValueError:
+            return remote_address
+        if any(address in network for network in proxies):
+            return client_id
+    return remote_address
+
+
+quota_admission = QuotaAdmission(
+    backend=build_rate_limit_backend(config.RATE_LIMIT_BACKEND),
+    type_cache=email_type_cache,
+    client_per_minute=config.CLIENT_QUOTA_PER_MINUTE,
+    fair_share_per_minute=config.FAIR_SHARE_PER_MINUTE,
+    window_seconds=config.FAIR_SHARE_WINDOW_SECONDS
+) if config.QUOTA_ENABLED else None
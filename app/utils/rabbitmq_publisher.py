@@ -1,37 +1,174 @@
-import json
-import pika
+import asyncio
+import aio_pika
+from aio_pika.pool import Pool
 from app.config import config
 from app.utils.logger import print_logging
+from app.utils.message_codec import message_codec
 
 
-def publish_to_rabbitmq(email_data, priority_level):
-    try:
-        connection = pika.BlockingConnection(pika.ConnectionParameters(
-            host=config.RABBITMQ_HOST,
-            port=config.RABBITMQ_PORT,
-            virtual_host=config.RABBITMQ_VHOST,
-            credentials=pika.PlainCredentials(config.RABBITMQ_USER, config.RABBITMQ_PASSWORD)
-        ))
-        channel = connection.channel()
-        
-        if priority_level == 1:
-            queue_name = config.EMAIL_QUEUE_HIGH
-        elif priority_level == 2:
-            queue_name = config.EMAIL_QUEUE_NORMAL
-        else:
-            queue_name = config.EMAIL_QUEUE_LOW
-            
-        channel.queue_declare(queue=queue_name, durable=True)
-        channel.basic_publish(
-            exchange='',
-            routing_key=queue_name,
-            body=json.dumps(email_data),
-            properties=pika.BasicProperties(
-                delivery_mode=2
+def get_queue_name(priority_level):
+    if priority_level == 1:
+        return config.EMAIL_QUEUE_HIGH
+    elif priority_level == 2:
+        return config.EMAIL_QUEUE_NORMAL
+    else:
+        return config.EMAIL_QUEUE_LOW
+
+
+class AsyncRabbitMQPublisher:
+    """
+    Long-lived publisher running on the event loop.
+    - One robust connection that reconnects automatically after broker restarts
+    - A pool of channels opened with publisher confirms
+    - Queue declarations cached after the first publish to each queue
+    """
+
+    def __init__(self, channel_pool_size, confirm_timeout, reconnect_interval):
+        self.channel_pool_size = channel_pool_size
+        self.confirm_timeout = confirm_timeout
+        self.reconnect_interval = reconnect_interval
+        self._connection = None
+        self._channel_pool = None
+        self._declared_queues = set()
+        self._start_lock = None
+
+    @property
+    def is_started(self):
+        return self._connection is not None and not self._connection.is_closed
+
+    async def start(self):
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+
+        async with self._start_lock:
+            if self.is_started:
+                return
+            self._connection = await aio_pika.connect_robust(
+                host=config.RABBITMQ_HOST,
+                port=config.RABBITMQ_PORT,
+                login=config.RABBITMQ_USER,
+                password=config.RABBITMQ_PASSWORD,
+                virtualhost=config.RABBITMQ_VHOST,
+                reconnect_interval=self.reconnect_interval
             )
+            self._channel_pool = Pool(self._open_channel, max_size=self.channel_pool_size)
+            print_logging("info", f"RabbitMQ publisher connected (channels={self.channel_pool_size})")
+
+    async def stop(self):
+        if self._channel_pool is not None:
+            await self._channel_pool.close()
+            self._channel_pool = None
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+        self._declared_queues.clear()
+        print_logging("info", "RabbitMQ publisher closed")
+
+    async def _open_channel(self):
+        return await self._connection.channel(publisher_confirms=True)
+
+    async def _ensure_queue(self, channel, queue_name):
+        if queue_name in self._declared_queues:
+            return
+        await channel.declare_queue(queue_name, durable=True)
+        self._declared_queues.add(queue_name)
+
+    def _build_message(self, email_data):
+        body, properties = message_codec.encode(email_data)
+        return aio_pika.Message(
+            body=body,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            **properties
         )
-        connection.close()
-        return True
-    except Exception as e:
-        print_logging("error", f"Error publishing to RabbitMQ: {str(e)}")
-        return False
+
+    async def queue_depths(self, queue_names):
+        """
+        Return {queue_name: (message_count, consumer_count)} using passive declares.
+        A queue that does not exist yet is reported as (0, 0).
+        """
+        if not self.is_started:
+            await self.start()
+
+        depths = {}
+        channel = await self._connection.channel()
+        try:
+            for queue_name in queue_names:
+                try:
+                    queue = await channel.declare_queue(queue_name, passive=True)
+                    result = queue.declaration_result
+                    depths[queue_name] = (result.message_count, result.consumer_count)
+                except aio_pika.exceptions.ChannelNotFoundEntity:
+                    # the broker closes the channel when a passive declare fails
+                    depths[queue_name] = (0, 0)
+                    await channel.close()
+                    channel = await self._connection.channel()
+        finally:
+            await channel.close()
+        return depths
+
+    async def publish(self, email_data, priority_level):
+        """Publish one message and wait for the broker confirm. Returns True on ack."""
+        try:
+            if not self.is_started:
+                await self.start()
+
+            queue_name = get_queue_name(priority_level)
+
+            async with self._channel_pool.acquire() as channel:
+                await self._ensure_queue(channel, queue_name)
+                await channel.default_exchange.publish(
+                    self._build_message(email_data),
+                    routing_key=queue_name,
+                    timeout=self.confirm_timeout
+                )
+            return True
+        except asyncio.TimeoutError:
+            print_logging("error", f"Timed out after {self.confirm_timeout}s waiting for RabbitMQ publisher confirm")
+            return False
+        except Exception as e:
+            print_logging("error", f"Error publishing to RabbitMQ: {str(e)}")
+            return False
+
+    async def publish_batch(self, items):
+        """
+        Publish a group of (email_data, priority_level) pairs on one channel and wait for
+        all confirms together. Returns a list of booleans in the same order as the items.
+        """
+        if not items:
+            return []
+
+        try:
+            if not self.is_started:
+                await self.start()
+
+            async with self._channel_pool.acquire() as channel:
+                for queue_name in {get_queue_name(priority_level) for _, priority_level in items}:
+                    await self._ensure_queue(channel, queue_name)
+
+                results = await asyncio.gather(*[
+                    channel.default_exchange.publish(
+                        self._build_message(email_data),
+                        routing_key=get_queue_name(priority_level),
+                        timeout=self.confirm_timeout
+                    )
+                    for email_data, priority_level in items
+                ], return_exceptions=True)
+        except Exception as e:
+            print_logging("error", f"Error publishing batch of {len(items)} to RabbitMQ: {str(e)}")
+            return [False] * len(items)
+
+        published = []
+        for (email_data, _), result in zip(items, results):
+            if isinstance(result, BaseException):
+                print_logging("error", f"Error publishing email {email_data.get('id')} to RabbitMQ: {str(result) or type(result).__name__}")
+                published.append(False)
+            else:
+                published.append(True)
+        return published
+
+
+rabbitmq_publisher = AsyncRabbitMQPublisher(
+    channel_pool_size=config.RABBITMQ_CHANNEL_POOL_SIZE,
+    confirm_timeout=config.RABBITMQ_CONFIRM_TIMEOUT_SECONDS,
+    reconnect_interval=config.RABBITMQ_RECONNECT_INTERVAL_SECONDS
+)
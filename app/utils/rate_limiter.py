@@ -0,0 +1,268 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from app.config import config
+from app.utils.logger import print_logging
+
+
+def gcra(tat, now, emission_interval, period):
+    """
+    Generic cell rate algorithm for a limit of period / emission_interval requests per period
+    - tat is the key's theoretical arrival time, or None for a new key
+    Returns (allowed, retry_after_seconds, new_tat)
+    """
+    tat = now if tat is None or tat < now else tat
+    new_tat = tat + emission_interval
+    allow_at = new_tat - period
+    if allow_at > now:
+        return False, allow_at - now, tat
+    return True, 0.0, new_tat
+
+
+class MemoryRateLimitBackend:
+    """Process-local state; each process enforces its own counters."""
+
+    def __init__(self):
+        self._tats = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, limits, now):
+        """
+        Check all (key, emission_interval, period) limits and consume one request from each
+        only if every limit allows it. Returns (allowed, retry_after_seconds, backlogs), where
+        backlogs holds each key's TAT minus now after the call.
+        """
+        with self._lock:
+            new_tats = []
+            retry_after = 0.0
+            for key, emission_interval, period in limits:
+                allowed, wait, new_tat = gcra(self._tats.get(key), now, emission_interval, period)
+                retry_after = max(retry_after, wait)
+                new_tats.append((key, new_tat))
+
+            if retry_after > 0:
+                return False, retry_after, [max(self._tats.get(key, now), now) - now for key, _, _ in limits]
+
+            for key, new_tat in new_tats:
+                self._tats[key] = new_tat
+            return True, 0.0, [new_tat - now for _, new_tat in new_tats]
+
+
+class SharedMemoryRateLimitBackend:
+    """
+    State shared by every process on the host through a memory-mapped file.
+    - Fixed table of slots, each holding a 64-bit key hash and the key's TAT (16 bytes)
+    - A key lives in one of probe_length slots after its hash; expired slots are reused
+      and, if all are live, the one closest to expiring is evicted
+    - Updates are serialized with flock across processes and a lock across threads
+    """
+
+    SLOT = struct.Struct("<Qd")
+
+    def __init__(self, path, slots, probe_length=8):
+        self.path = path
+        self.slots = slots
+        self.probe_length = probe_length
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _open(self):
+        # reopen after fork so every worker process owns its file descriptor and lock
+        if self._pid == os.getpid():
+            return
+        size = self.slots * self.SLOT.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+        self._pid = os.getpid()
+
+    @staticmethod
+    def _hash(key):
+        value = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+        return value or 1
+
+    def _find_slot(self, key_hash, now, taken):
+        start = key_hash % self.slots
+        free = None
+        oldest = None
+        oldest_tat = None
+        for probe in range(self.probe_length):
+            slot = (start + probe) % self.slots
+            stored_hash, tat = self.SLOT.unpack_from(self._map, slot * self.SLOT.size)
+            if stored_hash == key_hash:
+                return slot, tat
+            if slot in taken:
+                continue
+            if free is None and (stored_hash == 0 or tat <= now):
+                free = slot
+            if oldest_tat is None or tat < oldest_tat:
+                oldest, oldest_tat = slot, tat
+        return (free if free is not None else oldest), None
+
+    def acquire(self, limits, now):
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                updates = []
+                taken = set()
+                retry_after = 0.0
+                for key, emission_interval, period in limits:
+                    key_hash = self._hash(key)
+                    slot, tat = self._find_slot(key_hash, now, taken)
+                    taken.add(slot)
+                    allowed, wait, new_tat = gcra(tat, now, emission_interval, period)
+                    retry_after = max(retry_after, wait)
+                    updates.append((slot, key_hash, tat, new_tat))
+
+                if retry_after > 0:
+                    return False, retry_after, [max(tat or now, now) - now for _, _, tat, _ in updates]
+
+                for slot, key_hash, _, new_tat in updates:
+                    self.SLOT.pack_into(self._map, slot * self.SLOT.size, key_hash, new_tat)
+                return True, 0.0, [new_tat - now for _, _, _, new_tat in updates]
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class RedisRateLimitBackend:
+    """State kept in Redis (or a Redis-compatible server), shared by every host."""
+
+    SCRIPT = """
+        local now_parts = redis.call('TIME')
+        local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+        local tats = {}
+        local new_tats = {}
+        local retry_after = 0
+        for i = 1, #KEYS do
+            local emission_interval = tonumber(ARGV[2 * i - 1])
+            local period = tonumber(ARGV[2 * i])
+            local tat = tonumber(redis.call('GET', KEYS[i])) or now
+            if tat < now then tat = now end
+            local new_tat = tat + emission_interval
+            local allow_at = new_tat - period
+            if allow_at > now and allow_at - now > retry_after then
+                retry_after = allow_at - now
+            end
+            tats[i] = tat
+            new_tats[i] = new_tat
+        end
+        local result = {retry_after > 0 and 0 or 1, tostring(retry_after)}
+        for i = 1, #KEYS do
+            local tat = retry_after > 0 and tats[i] or new_tats[i]
+            result[#result + 1] = tostring(tat - now)
+        end
+        if retry_after > 0 then
+            return result
+        end
+        for i = 1, #KEYS do
+            local ttl = math.ceil((new_tats[i] - now) * 1000) + 1
+            redis.call('SET', KEYS[i], tostring(new_tats[i]), 'PX', ttl)
+        end
+        return result
+    """
+
+    def __init__(self, url, key_prefix="rate_limit:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the redis package (pip install redis)") from e
+
+        self.key_prefix = key_prefix
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def acquire(self, limits, now):
+        # the script uses the server clock, so every host agrees on the time
+        keys = [f"{self.key_prefix}{key}" for key, _, _ in limits]
+        args = []
+        for _, emission_interval, period in limits:
+            args.extend([emission_interval, period])
+        allowed, retry_after, *backlogs = self._script(keys=keys, args=args)
+        return bool(allowed), float(retry_after), [float(backlog) for backlog in backlogs]
+
+
+class RateLimiter:
+    """
+    Per-client and global request limits checked together with one backend call.
+    - Each (limit, period) pair is a GCRA bucket: it allows a burst of limit requests,
+      then one request every period / limit seconds; a limit of 0 disables the rule
+    - The X-RateLimit-* headers describe the limit with the fewest requests left
+    - If the backend fails, requests are allowed and the error is logged
+    """
+
+    def __init__(self, backend, client_rules, global_rules):
+        self.backend = backend
+        self.client_rules = [(name, limit, period) for name, limit, period in client_rules if limit > 0]
+        self.global_rules = [(name, limit, period) for name, limit, period in global_rules if limit > 0]
+
+    @staticmethod
+    def _headers(limits, backlogs, now):
+        tightest = None
+        for (_, emission_interval, period), backlog in zip(limits, backlogs):
+            # a full bucket has a backlog of period seconds; each request adds emission_interval
+            remaining = max(0, math.floor((period - backlog) / emission_interval + 1e-9))
+            if tightest is None or remaining < tightest[1]:
+                tightest = (round(period / emission_interval), remaining, backlog)
+        limit, remaining, backlog = tightest
+        return {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(math.ceil(now + backlog))
+        }
+
+    def check(self, client_key):
+        """
+        Consume one request for client_key.
+        Returns (allowed, retry_after_seconds, headers); headers is empty if no limit applies.
+        """
+        limits = [
+            (f"client:{client_key}:{name}", period / limit, period)
+            for name, limit, period in self.client_rules
+        ] + [
+            (f"global:{name}", period / limit, period)
+            for name, limit, period in self.global_rules
+        ]
+        if not limits:
+            return True, 0.0, {}
+
+        now = time.time()
+        try:
+            allowed, retry_after, backlogs = self.backend.acquire(limits, now)
+        except Exception as e:
+            print_logging("error", f"Rate limiter backend error, allowing request: {str(e)}")
+            return True, 0.0, {}
+        return allowed, retry_after, self._headers(limits, backlogs, now)
+
+
+def build_rate_limit_backend(backend_name):
+    if backend_name == "memory":
+        return MemoryRateLimitBackend()
+    if backend_name == "shared_memory":
+        return SharedMemoryRateLimitBackend(config.RATE_LIMIT_SHARED_PATH, config.RATE_LIMIT_SHARED_SLOTS)
+    if backend_name == "redis":
+        return RedisRateLimitBackend(config.RATE_LIMIT_REDIS_URL)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND '{backend_name}'")
+
+
+def build_rate_limiter():
+    return RateLimiter(
+        backend=build_rate_limit_backend(config.RATE_LIMIT_BACKEND),
+        client_rules=[
+            ("minute", config.RATE_LIMIT_PER_MINUTE, 60),
+            ("hour", config.RATE_LIMIT_PER_HOUR, 3600)
+        ],
+        global_rules=[
+            ("minute", config.RATE_LIMIT_GLOBAL_PER_MINUTE, 60),
+            ("hour", config.RATE_LIMIT_GLOBAL_PER_HOUR, 3600)
+        ]
+    )
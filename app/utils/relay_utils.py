@@ -0,0 +1,158 @@
+import asyncio
+import signal
+from app.config import config
+from app.utils.logger import print_logging
+from app.utils.rabbitmq_publisher import rabbitmq_publisher
+from app.database.connect import open_pool, close_pool
+from app.database.listener import notification_listener
+from app.database.transactions import claim_email_outbox, complete_email_outbox
+from app.utils.blob_store import remove_unreferenced_blobs
+from app.utils.message_codec import message_codec
+
+EMAIL_OUTBOX_CHANNEL = "email_outbox"
+
+
+class OutboxRelay:
+    """
+    Drains email_outbox to the priority queues in batches.
+    - Each batch is published as a group and waits for publisher confirms
+    - Confirmed rows are deleted; nacked or timed-out rows are retried with backoff
+    - Wakes up on NOTIFY email_outbox, and polls every poll_interval as a fallback
+    """
+
+    def __init__(self, publisher, batch_size, poll_interval, lease_seconds,
+                 retry_delay_seconds, max_retry_delay_seconds):
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retry_delay_seconds = retry_delay_seconds
+        self.max_retry_delay_seconds = max_retry_delay_seconds
+        self._wake_event = None
+        self._stopping = False
+
+    def wake(self, payload=None):
+        if self._wake_event is not None:
+            self._wake_event.set()
+
+    def stop(self):
+        self._stopping = True
+        self.wake()
+
+    async def relay_batch(self):
+        """Publish one batch of due outbox messages. Returns the number of messages claimed."""
+        messages = await asyncio.to_thread(
+            claim_email_outbox,
+            self.batch_size,
+            self.lease_seconds
+        )
+        if not messages:
+            return 0
+
+        results = await self.publisher.publish_batch([
+            (message["payload"], message["priority_level"]) for message in messages
+        ])
+
+        published_ids = [message["id"] for message, published in zip(messages, results) if published]
+        failed = [
+            (message["id"], "Publish was not confirmed by RabbitMQ")
+            for message, published in zip(messages, results) if not published
+        ]
+
+        await asyncio.to_thread(
+            complete_email_outbox,
+            published_ids,
+            failed,
+            self.retry_delay_seconds,
+            self.max_retry_delay_seconds
+        )
+
+        if failed:
+            print_logging("warning", f"Relayed {len(published_ids)} outbox messages, {len(failed)} will be retried")
+        else:
+            print_logging("debug", f"Relayed {len(published_ids)} outbox messages")
+        return len(messages)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._wake_event = asyncio.Event()
+        notification_listener.subscribe(
+            EMAIL_OUTBOX_CHANNEL,
+            lambda payload: loop.call_soon_threadsafe(self.wake),
+            on_reconnect=lambda: loop.call_soon_threadsafe(self.wake)
+        )
+        notification_listener.start()
+
+        print_logging("info", "Outbox relay started")
+        try:
+            while not self._stopping:
+                self._wake_event.clear()
+                try:
+                    claimed = await self.relay_batch()
+                except Exception as e:
+                    print_logging("error", f"Outbox relay error: {str(e)}")
+                    claimed = 0
+
+                # a full batch means there is probably more waiting, so keep draining
+                if claimed >= self.batch_size:
+                    continue
+
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            notification_listener.stop()
+            print_logging("info", "Outbox relay stopped")
+
+
+async def run_blob_cleanup(interval):
+    """Periodically remove attachment blobs that no email references anymore."""
+    while True:
+        try:
+            await asyncio.to_thread(remove_unreferenced_blobs)
+        except Exception as e:
+            print_logging("error", f"Attachment blob cleanup error: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+async def run_message_stats_log(interval):
+    """Periodically log how much message compression saves on the broker."""
+    while True:
+        await asyncio.sleep(interval)
+        stats = message_codec.stats()
+        print_logging(
+            "info",
+            f"Message compression: {stats['compressed']} of {stats['messages']} messages compressed, "
+            f"ratio {stats['compression_ratio']}, {stats['bytes_saved']} bytes saved"
+        )
+
+
+async def run_relay():
+    relay = OutboxRelay(
+        publisher=rabbitmq_publisher,
+        batch_size=config.OUTBOX_BATCH_SIZE,
+        poll_interval=config.OUTBOX_POLL_INTERVAL_SECONDS,
+        lease_seconds=config.OUTBOX_LEASE_SECONDS,
+        retry_delay_seconds=config.OUTBOX_RETRY_DELAY_SECONDS,
+        max_retry_delay_seconds=config.OUTBOX_MAX_RETRY_DELAY_SECONDS
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, relay.stop)
+
+    open_pool()
+    blob_cleanup = asyncio.create_task(run_blob_cleanup(config.ATTACHMENT_BLOB_CLEANUP_INTERVAL_SECONDS))
+    message_stats_log = asyncio.create_task(run_message_stats_log(config.MESSAGE_STATS_LOG_INTERVAL_SECONDS))
+    try:
+        await relay.run()
+    finally:
+        blob_cleanup.cancel()
+        message_stats_log.cancel()
+        await rabbitmq_publisher.stop()
+        close_pool()
+
+
+def initialize_relay():
+    asyncio.run(run_relay())
@@ -0,0 +1,75 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import orjson
+
+
+class RenderCache:
+    """
+    LRU cache of rendered templates for repeated (template, data) pairs, e.g. broadcast sends.
+    - Keyed by template name plus a stable hash of the data (sorted-key JSON)
+    - Entries remember the compiled template object, so a reloaded template never serves stale HTML
+    - Bounded by number of entries and by total size of the rendered HTML
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(template, data):
+        """Return the cache key, or None if the data cannot be hashed stably."""
+        try:
+            encoded = orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            return None
+        return template.name, hashlib.blake2b(encoded, digest_size=16).digest()
+
+    def get(self, key, template):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not template:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, key, template, rendered):
+        size = len(rendered.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+
+            self._entries[key] = (template, rendered, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions
+            }
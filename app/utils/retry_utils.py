@@ -0,0 +1,105 @@
+import random
+import smtplib
+import aiosmtplib
+from app.config import config
+
+# delivery attempt of a queue message, starting at 1; missing on first deliveries
+ATTEMPT_HEADER = "x-attempt"
+
+
+def get_attempt(headers):
+    return int((headers or {}).get(ATTEMPT_HEADER, 1))
+
+
+def _response_code(error):
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return error.code
+    return None
+
+
+def is_permanent_smtp_error(error):
+    """
+    True when resending cannot succeed: 5xx replies to the sender or to every recipient.
+    Authentication failures are not permanent, since they are fixed in the configuration
+    rather than in the email.
+    """
+    if isinstance(error, (smtplib.SMTPAuthenticationError, aiosmtplib.SMTPAuthenticationError)):
+        return False
+
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+    elif isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        codes = [recipient.code for recipient in error.recipients]
+    else:
+        code = _response_code(error)
+        codes = [] if code is None else [code]
+
+    return bool(codes) and all(500 <= code < 600 for code in codes)
+
+
+class RetryPolicy:
+    """
+    Delayed retries through broker TTL queues instead of sleeping in the consumer.
+    - A failed attempt is republished to <queue>.retry.<delay>s, whose x-message-ttl and
+      dead-letter routing move it back to <queue> once the delay has passed
+    - Delays grow exponentially from base_delay, capped at max_delay; each message expires
+      up to jitter (a fraction) earlier so retries of a burst of failures spread out
+    - The attempt number travels in the x-attempt header; attempt max_retries is the last
+    """
+
+    def __init__(self, max_retries, base_delay, max_delay, jitter):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay_for(self, attempt):
+        """Seconds to wait after the given failed attempt."""
+        return min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+
+    def delays(self):
+        return sorted({self.delay_for(attempt) for attempt in range(1, self.max_retries)})
+
+    def expiration_ms(self, attempt):
+        delay_ms = self.delay_for(attempt) * 1000
+        return int(delay_ms * (1 - random.uniform(0, self.jitter)))
+
+    @staticmethod
+    def retry_queue_name(queue_name, delay):
+        return f"{queue_name}.retry.{delay}s"
+
+    @staticmethod
+    def retry_queue_arguments(queue_name, delay):
+        return {
+            "x-message-ttl": delay * 1000,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": queue_name
+        }
+
+    def retry_queues(self, queue_name):
+        """(retry_queue_name, arguments) pairs to declare for a source queue."""
+        return [
+            (self.retry_queue_name(queue_name, delay), self.retry_queue_arguments(queue_name, delay))
+            for delay in self.delays()
+        ]
+
+    def should_retry(self, attempt, error):
+        return attempt < self.max_retries and not is_permanent_smtp_error(error)
+
+    def next_retry(self, queue_name, attempt, headers):
+        """Returns (retry_queue_name, expiration_ms, headers) for republishing a failed attempt."""
+        return (
+            self.retry_queue_name(queue_name, self.delay_for(attempt)),
+            self.expiration_ms(attempt),
+            {**(headers or {}), ATTEMPT_HEADER: attempt + 1}
+        )
+
+
+retry_policy = RetryPolicy(
+    max_retries=config.MAX_RETRIES,
+    base_delay=config.RETRY_DELAY_SECONDS,
+    max_delay=config.RETRY_MAX_DELAY_SECONDS,
+    jitter=config.RETRY_JITTER
+)
@@ -0,0 +1,176 @@
+import os
+import signal
+import socket
+import time
+import uvicorn
+from app.utils.logger import print_logging
+
+
+def create_listen_socket(host, port, reuse_port, backlog):
+    """Bind a listening TCP socket; with reuse_port every worker can bind its own socket to the same port."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    """
+    Runs the API in several worker processes forked from one preloaded master.
+    - The master imports the app (and anything warmed before run()) once; workers share
+      those pages copy-on-write. Pools, connections and threads are opened by the app's
+      lifespan, so each worker creates its own after the fork
+    - With reuse_port each worker binds its own SO_REUSEPORT socket and the kernel
+      balances connections between them; otherwise the master binds one socket that
+      every worker inherits and accepts on
+    - SIGTERM/SIGINT stop the workers gracefully, killing any still running after
+      graceful_timeout; SIGHUP starts a new set of workers, then retires the old ones;
+      workers that exit unexpectedly are replaced
+    """
+
+    def __init__(self, app, host, port, workers, reuse_port, backlog, graceful_timeout):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.backlog = backlog
+        self.graceful_timeout = graceful_timeout
+        self._socket = None
+        self._children = {}
+        self._retiring = {}
+        self._stopping = False
+        self._reload_requested = False
+
+    def _serve(self):
+        sock = self._socket
+        if sock is None:
+            sock = create_listen_socket(self.host, self.port, True, self.backlog)
+        server = uvicorn.Server(uvicorn.Config(
+            self.app,
+            timeout_graceful_shutdown=self.graceful_timeout
+        ))
+        server.run(sockets=[sock])
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                    signal.signal(sig, signal.SIG_DFL)
+                self._serve()
+            except Exception as e:
+                print_logging("error", f"API worker {os.getpid()} failed: {str(e)}")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+
+        self._children[pid] = time.monotonic()
+        return pid
+
+    def reap_workers(self):
+        """Collect exited workers and replace the ones that were not asked to stop."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            if self._retiring.pop(pid, None) is not None:
+                continue
+
+            started_at = self._children.pop(pid, None)
+            if started_at is None or self._stopping:
+                continue
+
+            print_logging("warning", f"API worker {pid} exited with status {status}, starting a replacement")
+            # avoid a fork loop when workers die during startup
+            if time.monotonic() - started_at < 1:
+                time.sleep(1)
+            self.spawn_worker()
+
+    def reload(self):
+        """Start a new set of workers, then gracefully stop the previous ones."""
+        previous = self._children
+        self._children = {}
+        for _ in range(self.workers):
+            self.spawn_worker()
+
+        for pid in previous:
+            self._retiring[pid] = time.monotonic()
+            self._signal(pid, signal.SIGTERM)
+        print_logging("info", f"Restarted {self.workers} API workers")
+
+    def shutdown(self):
+        pids = {**self._children, **self._retiring}
+        for pid in pids:
+            self._signal(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while pids and time.monotonic() < deadline:
+            for pid in list(pids):
+                try:
+                    finished, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    finished = pid
+                if finished:
+                    del pids[pid]
+            time.sleep(0.1)
+
+        for pid in pids:
+            print_logging("warning", f"API worker {pid} did not stop within {self.graceful_timeout}s, killing it")
+            self._signal(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+        self._children.clear()
+        self._retiring.clear()
+
+    @staticmethod
+    def _signal(pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def _request_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def run(self):
+        if not self.reuse_port:
+            self._socket = create_listen_socket(self.host, self.port, False, self.backlog)
+
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGHUP, self._request_reload)
+
+        mode = "SO_REUSEPORT" if self.reuse_port else "shared socket"
+        print_logging("info", f"Starting {self.workers} API workers on {self.host}:{self.port} ({mode})")
+        for _ in range(self.workers):
+            self.spawn_worker()
+
+        try:
+            while not self._stopping:
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+                self.reap_workers()
+                time.sleep(0.5)
+        finally:
+            self.shutdown()
+            if self._socket is not None:
+                self._socket.close()
+            print_logging("info", "API workers stopped")
@@ -0,0 +1,261 @@
+import asyncio
+import smtplib
+import ssl
+import threading
+import time
+import aiosmtplib
+from app.config import config
+from app.utils.logger import print_logging
+
+# one TLS context for every SMTP connection, so certificates are loaded once
+ssl_context = ssl.create_default_context()
+
+
+class _SmtpPoolBase:
+    """
+    Connection reuse rules shared by the sync and async pools.
+    - At most max_size connections exist at once; senders wait for a free one
+    - A connection is closed after max_messages emails or idle_timeout seconds without use
+    - A connection idle for more than noop_after seconds is checked with NOOP before reuse
+    - If a reused connection turns out to be dead (disconnect or 421), the email is sent
+      again once on a new connection
+    """
+
+    def __init__(self, host, port, username, password, max_size, max_messages, idle_timeout, noop_after, timeout):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_size = max_size
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.noop_after = noop_after
+        self.timeout = timeout
+        self._idle = []
+        self._in_use = 0
+        self._created = 0
+        self._reused = 0
+        self._closed = 0
+        self._noop_failures = 0
+        self._reconnects = 0
+
+    def _new_entry(self, client):
+        self._created += 1
+        return {"client": client, "last_used": time.monotonic(), "messages": 0, "reused": False}
+
+    def _reusable(self, entry):
+        return entry["messages"] < self.max_messages
+
+    def stats(self):
+        return {
+            "max_size": self.max_size,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "created": self._created,
+            "reused": self._reused,
+            "closed": self._closed,
+            "noop_failures": self._noop_failures,
+            "reconnects": self._reconnects
+        }
+
+
+class SmtpConnectionPool(_SmtpPoolBase):
+    """Pool of authenticated smtplib connections, safe to share between threads."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+
+    @staticmethod
+    def _is_dead_connection_error(error):
+        if isinstance(error, smtplib.SMTPResponseException):
+            return error.smtp_code == 421
+        return isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError))
+
+    def _connect(self):
+        client = smtplib.SMTP_SSL(self.host, self.port, context=ssl_context, timeout=self.timeout)
+        client.login(self.username, self.password)
+        return self._new_entry(client)
+
+    def _close(self, entry):
+        try:
+            entry["client"].quit()
+        except Exception:
+            entry["client"].close()
+        self._closed += 1
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                return self._connect()
+
+            idle_for = time.monotonic() - entry["last_used"]
+            if idle_for > self.idle_timeout:
+                self._close(entry)
+                continue
+            if idle_for > self.noop_after:
+                try:
+                    alive = entry["client"].noop()[0] == 250
+                except Exception:
+                    alive = False
+                if not alive:
+                    self._noop_failures += 1
+                    self._close(entry)
+                    continue
+
+            self._reused += 1
+            entry["reused"] = True
+            return entry
+
+    def _checkin(self, entry):
+        if not self._reusable(entry):
+            self._close(entry)
+            return
+        entry["last_used"] = time.monotonic()
+        with self._lock:
+            self._idle.append(entry)
+
+    def send(self, message, sender_email, all_recipients):
+        """Send a message built by build_email_message. Returns (True, "success") or (False, error)."""
+        with self._slots:
+            self._in_use += 1
+            try:
+                while True:
+                    entry = None
+                    try:
+                        entry = self._checkout()
+                        entry["client"].sendmail(sender_email, all_recipients, message.as_string())
+                        entry["messages"] += 1
+                        self._checkin(entry)
+                        return True, "success"
+                    except Exception as e:
+                        if entry is not None:
+                            self._close(entry)
+                        if entry is not None and entry["reused"] and self._is_dead_connection_error(e):
+                            self._reconnects += 1
+                            continue
+                        print_logging("error", f"SMTP error: {str(e)}")
+                        return False, e
+            finally:
+                self._in_use -= 1
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._close(entry)
+
+
+class AsyncSmtpConnectionPool(_SmtpPoolBase):
+    """Pool of authenticated aiosmtplib connections for one event loop."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = None
+
+    @staticmethod
+    def _is_dead_connection_error(error):
+        if isinstance(error, aiosmtplib.SMTPResponseException):
+            return error.code == 421
+        return isinstance(error, (aiosmtplib.SMTPServerDisconnected, ConnectionError))
+
+    async def _connect(self):
+        client = aiosmtplib.SMTP(
+            hostname=self.host,
+            port=self.port,
+            use_tls=True,
+            tls_context=ssl_context,
+            timeout=self.timeout
+        )
+        await client.connect()
+        await client.login(self.username, self.password)
+        return self._new_entry(client)
+
+    async def _close(self, entry):
+        try:
+            await entry["client"].quit()
+        except Exception:
+            entry["client"].close()
+        self._closed += 1
+
+    async def _checkout(self):
+        while self._idle:
+            entry = self._idle.pop()
+            idle_for = time.monotonic() - entry["last_used"]
+            if idle_for > self.idle_timeout or not entry["client"].is_connected:
+                await self._close(entry)
+                continue
+            if idle_for > self.noop_after:
+                try:
+                    alive = (await entry["client"].noop()).code == 250
+                except Exception:
+                    alive = False
+                if not alive:
+                    self._noop_failures += 1
+                    await self._close(entry)
+                    continue
+
+            self._reused += 1
+            entry["reused"] = True
+            return entry
+        return await self._connect()
+
+    async def _checkin(self, entry):
+        if not self._reusable(entry):
+            await self._close(entry)
+            return
+        entry["last_used"] = time.monotonic()
+        self._idle.append(entry)
+
+    async def send(self, message, sender_email, all_recipients):
+        """Send a message built by build_email_message. Returns (True, "success") or (False, error)."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_size)
+
+        async with self._slots:
+            self._in_use += 1
+            try:
+                while True:
+                    entry = None
+                    try:
+                        entry = await self._checkout()
+                        await entry["client"].send_message(message, sender=sender_email, recipients=all_recipients)
+                        entry["messages"] += 1
+                        await self._checkin(entry)
+                        return True, "success"
+                    except Exception as e:
+                        if entry is not None:
+                            await self._close(entry)
+                        if entry is not None and entry["reused"] and self._is_dead_connection_error(e):
+                            self._reconnects += 1
+                            continue
+                        print_logging("error", f"SMTP error: {str(e)}")
+                        return False, e
+            finally:
+                self._in_use -= 1
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for entry in idle:
+            await self._close(entry)
+
+
+def _pool_settings():
+    return {
+        "host": config.SMTP_HOST,
+        "port": config.SMTP_PORT,
+        "username": None if config.SMTP_USER is None else str(config.SMTP_USER),
+        "password": None if config.SMTP_PASSWORD is None else str(config.SMTP_PASSWORD),
+        "max_size": config.SMTP_POOL_SIZE,
+        "max_messages": config.SMTP_MAX_MESSAGES_PER_CONNECTION,
+        "idle_timeout": config.SMTP_IDLE_TIMEOUT_SECONDS,
+        "noop_after": config.SMTP_NOOP_AFTER_SECONDS,
+        "timeout": config.SMTP_TIMEOUT_SECONDS
+    }
+
+
+smtp_pool = SmtpConnectionPool(**_pool_settings())
+async_smtp_pool = AsyncSmtpConnectionPool(**_pool_settings())
@@ -0,0 +1,83 @@
+import threading
+import orjson
+from app.utils.logger import print_logging
+
+EMAIL_STATUS_CHANNEL = "email_status"
+
+STATUS_LABELS = {0: "pending", 1: "sent", 2: "failed"}
+FINAL_STATUSES = {1, 2}
+
+# delivered to every waiter after the listener reconnects, since notifications may have been missed
+RESYNC = {"resync": True}
+
+
+def describe_status(row):
+    """Public representation of an email status row or notification."""
+    return {
+        "id": row["id"],
+        "status": row["status"],
+        "state": STATUS_LABELS.get(row["status"], "unknown"),
+        "created_at": row.get("created_at"),
+        "sent_at": row.get("sent_at")
+    }
+
+
+class EmailStatusHub:
+    """
+    In-process fan-out of email status changes to waiting long-poll and SSE requests.
+    - Requests subscribe an asyncio.Queue to the email ids they wait for
+    - publish() receives email_status NOTIFY payloads on the listener thread and hands them
+      to the subscribed queues on their event loops
+    """
+
+    def __init__(self):
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self._delivered = 0
+
+    def subscribe(self, email_ids, queue, loop):
+        with self._lock:
+            for email_id in email_ids:
+                self._waiters.setdefault(email_id, set()).add((queue, loop))
+
+    def unsubscribe(self, email_ids, queue, loop):
+        with self._lock:
+            for email_id in email_ids:
+                waiters = self._waiters.get(email_id)
+                if waiters is None:
+                    continue
+                waiters.discard((queue, loop))
+                if not waiters:
+                    del self._waiters[email_id]
+
+    def publish(self, payload):
+        try:
+            update = orjson.loads(payload)
+        except orjson.JSONDecodeError as e:
+            print_logging("error", f"Invalid email status notification payload: {str(e)}")
+            return
+
+        with self._lock:
+            waiters = list(self._waiters.get(update.get("id"), ()))
+            self._delivered += len(waiters)
+
+        for queue, loop in waiters:
+            loop.call_soon_threadsafe(queue.put_nowait, update)
+
+    def resync(self):
+        with self._lock:
+            waiters = {waiter for waiter_set in self._waiters.values() for waiter in waiter_set}
+
+        for queue, loop in waiters:
+            loop.call_soon_threadsafe(queue.put_nowait, RESYNC)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "watched_emails": len(self._waiters),
+                "waiters": sum(len(waiters) for waiters in self._waiters.values()),
+                "delivered": self._delivered
+            }
+
+
+email_status_hub = EmailStatusHub()
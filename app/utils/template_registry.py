@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from app.config import config, jinja_env
+from app.utils.logger import print_logging
+
+
+class TemplateRegistry:
+    """
+    Set of template names available to jinja_env, used to validate requests without filesystem I/O.
+    - Built once at startup with the loader's list_templates()
+    - Refreshed by reload(), or by a polling watcher that compares the template
+      directories' modification times (adding, removing or renaming a file changes them)
+    """
+
+    def __init__(self, env, poll_interval):
+        self.env = env
+        self.poll_interval = poll_interval
+        self._names = frozenset()
+        self._loaded_at = None
+        self._signature = None
+        self._reloads = 0
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def _search_paths(self):
+        paths = []
+        loaders = getattr(self.env.loader, "loaders", [self.env.loader])
+        for loader in loaders:
+            paths.extend(getattr(loader, "searchpath", []))
+        return paths
+
+    def _directory_signature(self):
+        signature = []
+        for search_path in self._search_paths():
+            for dir_path, _, _ in os.walk(search_path):
+                try:
+                    signature.append((dir_path, os.stat(dir_path).st_mtime_ns))
+                except OSError:
+                    continue
+        return tuple(signature)
+
+    def load(self):
+        """Rebuild the index from the template folders. Returns the number of templates found."""
+        signature = self._directory_signature()
+        try:
+            names = frozenset(self.env.list_templates())
+        except Exception as e:
+            print_logging("error", f"Error indexing email templates: {str(e)}")
+            return len(self._names)
+
+        self._names = names
+        self._signature = signature
+        self._loaded_at = time.monotonic()
+        self._reloads += 1
+        return len(names)
+
+    def reload(self):
+        count = self.load()
+        print_logging("info", f"Template registry reloaded with {count} templates")
+        return count
+
+    def exists(self, template_name):
+        if self._loaded_at is None:
+            self.load()
+        return template_name in self._names
+
+    def start(self):
+        """Start the watcher thread, unless polling is disabled with a poll interval of 0."""
+        if self.poll_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch, name="template-registry-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval * 2)
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                if self._directory_signature() != self._signature:
+                    self.reload()
+            except Exception as e:
+                print_logging("error", f"Template registry watcher error: {str(e)}")
+
+    def stats(self):
+        return {
+            "size": len(self._names),
+            "reloads": self._reloads,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 3) if self._loaded_at is not None else None
+        }
+
+
+template_registry = TemplateRegistry(jinja_env, poll_interval=config.TEMPLATE_REGISTRY_POLL_SECONDS)
@@ -1,6 +1,40 @@
-from app.config import jinja_env
+from app.config import config, jinja_env
+from app.utils.logger import print_logging
+from app.utils.render_cache import RenderCache
+
+render_cache = RenderCache(
+    max_entries=config.RENDER_CACHE_MAX_ENTRIES,
+    max_bytes=config.RENDER_CACHE_MAX_BYTES
+) if config.RENDER_CACHE_ENABLED else None
 
 
 def render_email_template(template_name, data):
     template = jinja_env.get_template(f"{template_name}.html")
-    return template.render(**data)
+    if render_cache is None:
+        return template.render(**data)
+
+    key = render_cache.make_key(template, data)
+    if key is None:
+        return template.render(**data)
+
+    rendered = render_cache.get(key, template)
+    if rendered is None:
+        rendered = template.render(**data)
+        render_cache.put(key, template, rendered)
+    return rendered
+
+
+def precompile_templates():
+    """
+    Compile every template once so the first message after a deploy does not pay the compile cost
+    - With the bytecode cache enabled this also writes the cache for the next restart
+    Returns the number of templates compiled
+    """
+    compiled = 0
+    for template_name in jinja_env.list_templates(extensions=["html"]):
+        try:
+            jinja_env.get_template(template_name)
+            compiled += 1
+        except Exception as e:
+            print_logging("error", f"Error precompiling template {template_name}: {str(e)}")
+    return compiled
@@ -4,65 +4,150 @@ import time
 from app.config import config
 from app.utils.logger import print_logging
 from app.utils.email_utils import send_email_via_smtp
-from app.utils.template_utils import render_email_template
-from app.utils.attachment_utils import get_file_attachments
+from app.utils.template_utils import render_email_template, render_cache
+from app.utils.attachment_utils import get_message_attachments
 from app.utils.email_parser import parse_address_value
+from app.utils.message_codec import message_codec
+from app.utils.smtp_pool import smtp_pool
+from app.utils.retry_utils import retry_policy, get_attempt, is_permanent_smtp_error
+from app.utils.dead_letter_utils import (
+    dead_letter_exchange_name, failure_headers, declare_queue_topology,
+    DECODE_ERROR, INVALID_EMAIL_DATA, SMTP_PERMANENT, RETRIES_EXHAUSTED, PROCESSING_ERROR, STATUS_UPDATE_FAILED
+)
+from app.database.connect import open_pool, close_pool, get_pool_stats
 from app.database.transactions import update_email_status
 
 
+def decode_message(body, properties):
+    return message_codec.decode(
+        body,
+        getattr(properties, "content_type", None),
+        getattr(properties, "content_encoding", None),
+        getattr(properties, "headers", None)
+    )
+
+
+def prepare_email(email_data):
+    """
+    Render the template and resolve recipients and attachments of a decoded queue message.
+    Raises json.JSONDecodeError if a version 1 message carries invalid email_data.
+    """
+    email_content = email_data["email_data"]
+    # version 1 envelopes carry email_data as a JSON string
+    if isinstance(email_content, str):
+        email_content = json.loads(email_content)
+
+    return {
+        "id": email_data["id"],
+        "subject": str(email_data["subject"]),
+        "body": render_email_template(email_data["email_template"], email_content),
+        "to_address": parse_address_value(email_data["to_address"]),
+        "cc_addresses": parse_address_value(email_data["cc_addresses"]),
+        "bcc_addresses": parse_address_value(email_data["bcc_addresses"]),
+        "attachments": get_message_attachments(email_data)
+    }
+
+
+def schedule_retry(ch, queue_name, body, properties, attempt):
+    """Republish a failed attempt to the retry queue that dead-letters it back after the delay."""
+    retry_queue, expiration_ms, headers = retry_policy.next_retry(queue_name, attempt, properties.headers)
+    ch.basic_publish(
+        exchange='',
+        routing_key=retry_queue,
+        body=body,
+        properties=pika.BasicProperties(
+            delivery_mode=2,
+            content_type=properties.content_type,
+            content_encoding=properties.content_encoding,
+            headers=headers,
+            expiration=str(expiration_ms)
+        )
+    )
+    return expiration_ms
+
+
+def dead_letter(ch, method, properties, body, reason, error, email_data=None):
+    """Move a message to its queue's dead letter queue with the failure reason in its headers."""
+    try:
+        ch.basic_publish(
+            exchange=dead_letter_exchange_name(method.routing_key),
+            routing_key=method.routing_key,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2,
+                content_type=properties.content_type,
+                content_encoding=properties.content_encoding,
+                headers=failure_headers(properties.headers, method.routing_key, reason, error, email_data)
+            )
+        )
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+    except Exception as e:
+        # the queue's dead letter policy still routes the rejected message to the dead letter queue
+        print_logging("error", f"Could not publish to the dead letter queue: {str(e)}")
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+
+
 def callback(ch, method, properties, body):
     try:
-        body_str = body.decode('utf-8') if isinstance(body, bytes) else body
-        email_data = json.loads(body_str)
+        email_data = decode_message(body, properties)
         email_id = email_data["id"]
-        template_name = email_data["email_template"]
-        subject = str(email_data["subject"])
-        to_address = parse_address_value(email_data["to_address"])
-        cc_addresses = parse_address_value(email_data["cc_addresses"])
-        bcc_addresses = parse_address_value(email_data["bcc_addresses"])
-        email_content = email_data["email_data"]
-        
-        MAX_RETRIES = config.MAX_RETRIES
-        RETRY_SLEEP = config.RETRY_DELAY_SECONDS
-        CURRENT_TRY = 0
-        
-        if isinstance(email_content, str):
-            try:
-                email_content = json.loads(email_content)
-            except json.JSONDecodeError as e:
-                print_logging("error", f"Invalid JSON for email {email_id}: {str(e)}")
-                ch.basic_ack(delivery_tag=method.delivery_tag)
+    except Exception as e:
+        print_logging("error", f"Invalid message format: {str(e)}")
+        dead_letter(ch, method, properties, body, DECODE_ERROR, e)
+        return
+
+    try:
+        attempt = get_attempt(properties.headers)
+        max_retries = retry_policy.max_retries
+
+        try:
+            email = prepare_email(email_data)
+        except json.JSONDecodeError as e:
+            print_logging("error", f"Invalid JSON for email {email_id}: {str(e)}")
+            dead_letter(ch, method, properties, body, INVALID_EMAIL_DATA, e, email_data)
+            return
+
+        success, message = send_email_via_smtp(
+            email["subject"], email["body"], email["to_address"],
+            email["cc_addresses"], email["bcc_addresses"], email["attachments"]
+        )
+
+        if success:
+            print_logging("info", f"Email {email_id} sent successfully on attempt {attempt}/{max_retries}!")
+            if not update_email_status(1, email_id):
+                # the email went out, so keep the message where the missing status can be found
+                dead_letter(ch, method, properties, body, STATUS_UPDATE_FAILED, f"Email {email_id} was sent but its status could not be stored", email_data)
                 return
-            
-        attachments = get_file_attachments(email_id)
-        body_content = render_email_template(template_name, email_content)
-        
-        success = False
-        message = ""
-        
-        while CURRENT_TRY < MAX_RETRIES and not success:
-            CURRENT_TRY += 1
-            success, message = send_email_via_smtp(subject, body_content, to_address, cc_addresses, bcc_addresses, attachments)
-            
-            if success:
-                print_logging("info", f"Email {email_id} sent successfully on attempt {CURRENT_TRY}/{MAX_RETRIES}!")
-                update_email_status(1, email_id)
-            else:
-                print_logging("warning", f"Attempt {CURRENT_TRY}/{MAX_RETRIES} failed for email {email_id}: {message}")
-                if CURRENT_TRY < MAX_RETRIES:
-                    time.sleep(RETRY_SLEEP)
-        
-        if not success:
-            print_logging("error", f"Failed to send email {email_id} after {MAX_RETRIES} attempts due to: {message}")
+        elif retry_policy.should_retry(attempt, message):
+            expiration_ms = schedule_retry(ch, method.routing_key, body, properties, attempt)
+            print_logging("warning", f"Attempt {attempt}/{max_retries} failed for email {email_id}: {message}; retrying in {expiration_ms / 1000:.1f}s")
+        else:
+            print_logging("error", f"Failed to send email {email_id} on attempt {attempt}/{max_retries} due to: {message}")
             update_email_status(2, email_id)
-        
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-    except json.JSONDecodeError as e:
-        print_logging("error", f"Invalid JSON message format: {str(e)}")
+            reason = SMTP_PERMANENT if is_permanent_smtp_error(message) else RETRIES_EXHAUSTED
+            dead_letter(ch, method, properties, body, reason, message, email_data)
+            return
+
         ch.basic_ack(delivery_tag=method.delivery_tag)
     except Exception as e:
         print_logging("error", f"Error processing message: {str(e)}")
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        dead_letter(ch, method, properties, body, PROCESSING_ERROR, e, email_data)
+
+
+def log_worker_stats():
+    print_logging("info", f"SMTP pool stats: {smtp_pool.stats()}")
+    if render_cache is not None:
+        print_logging("info", f"Render cache stats: {render_cache.stats()}")
+
+
+def schedule_stats_log(connection, interval):
+    """Log how well SMTP connections and rendered templates are reused every interval seconds while consuming."""
+    def log_and_reschedule():
+        log_worker_stats()
+        connection.call_later(interval, log_and_reschedule)
+
+    # call_later callbacks run on the consuming thread between deliveries
+    connection.call_later(interval, log_and_reschedule)
 
 
 def initialize_worker():
@@ -74,10 +159,15 @@ def initialize_worker():
             credentials=pika.PlainCredentials(config.RABBITMQ_USER, config.RABBITMQ_PASSWORD)
         ))
         channel = connection.channel()
+        # retries and dead letters are republished before the ack, so wait for the broker to confirm them
+        channel.confirm_delivery()
+
+        open_pool()
         
-        channel.queue_declare(queue=config.EMAIL_QUEUE_HIGH, durable=True)
-        channel.queue_declare(queue=config.EMAIL_QUEUE_NORMAL, durable=True)
-        channel.queue_declare(queue=config.EMAIL_QUEUE_LOW, durable=True)
+        for queue_name in (config.EMAIL_QUEUE_HIGH, config.EMAIL_QUEUE_NORMAL, config.EMAIL_QUEUE_LOW):
+            declare_queue_topology(channel, queue_name)
+            for retry_queue, arguments in retry_policy.retry_queues(queue_name):
+                channel.queue_declare(queue=retry_queue, durable=True, arguments=arguments)
         
         channel.basic_qos(prefetch_count=1)
         
@@ -86,9 +176,14 @@ def initialize_worker():
         channel.basic_consume(queue=config.EMAIL_QUEUE_HIGH, on_message_callback=callback)
         channel.basic_consume(queue=config.EMAIL_QUEUE_NORMAL, on_message_callback=callback)
         channel.basic_consume(queue=config.EMAIL_QUEUE_LOW, on_message_callback=callback)
+        schedule_stats_log(connection, config.SMTP_STATS_LOG_INTERVAL_SECONDS)
         
         channel.start_consuming()
     except Exception as e:
         print_logging("critical", f"Worker error: {str(e)}")
+        print_logging("info", f"Database pool stats: {get_pool_stats()}")
+        log_worker_stats()
+        smtp_pool.close()
+        close_pool()
         time.sleep(5)
         initialize_worker()
@@ -1,4 +1,12 @@
+from app.config import config
+from app.utils.logger import print_logging
+from app.utils.template_utils import precompile_templates
 from app.utils.worker_utils import initialize_worker
+from app.utils.async_worker import initialize_async_worker
 
 if __name__ == "__main__":
-    initialize_worker()
+    print_logging("info", f"Precompiled {precompile_templates()} email templates")
+    if config.WORKER_MODE == "sync":
+        initialize_worker()
+    else:
+        initialize_async_worker()
@@ -1,5 +1,49 @@
 import pytest
 import sys
 import os
+from unittest.mock import Mock, MagicMock
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture
+def make_email():
+    """Build an enqueue request body for the API endpoints"""
+    def make(**overrides):
+        email = {
+            "email_type": "welcome",
+            "subject": "Test Subject",
+            "email_template": "default_template",
+            "email_data": {"name": "John"},
+            "priority_level": 1
+        }
+        email.update(overrides)
+        return email
+    return make
+
+
+@pytest.fixture
+def make_payload():
+    """Build a validated email payload as passed to the insert transactions"""
+    def make(email_type='welcome', to_addresses=None, cc_addresses=None, bcc_addresses=None):
+        payload = Mock()
+        payload.email_type = email_type
+        payload.subject = 'Test Subject'
+        payload.email_template = 'welcome_email'
+        payload.email_data = {'name': 'John'}
+        payload.priority_level = 1
+        payload.to_addresses = to_addresses
+        payload.cc_addresses = cc_addresses
+        payload.bcc_addresses = bcc_addresses
+        return payload
+    return make
+
+
+@pytest.fixture
+def make_delivery():
+    """Build the (method, properties, body) triple of a blocking RabbitMQ delivery"""
+    def make(headers=None, delivery_tag=7):
+        method = MagicMock(delivery_tag=delivery_tag, routing_key='email.high')
+        properties = MagicMock(headers=headers or {}, content_type='application/msgpack', content_encoding=None)
+        return method, properties, b'body-%d' % delivery_tag
+    return make
@@ -1,27 +1,12 @@
 import pytest
-from unittest.mock import patch, MagicMock, AsyncMock
+from unittest.mock import patch, AsyncMock
 from fastapi.testclient import TestClient
-from fastapi import UploadFile
 import io
+import time
 
 
-def identity_decorator(rate_str):
-    def decorator(f):
-        return f
-    return decorator
-
-
-mock_limiter_instance = MagicMock()
-mock_limiter_instance.limit = identity_decorator
-mock_limiter_instance.get_window_stats = MagicMock(return_value=(0, 999999))
-mock_limiter_instance._inject_headers = MagicMock()
-mock_limiter_instance.request_filter = MagicMock(return_value=False)
-
-with patch('slowapi.Limiter', return_value=mock_limiter_instance):
-    from app import api_server
-    import importlib
-    importlib.reload(api_server)
-    from app.api_server import app
+from app.api_server import app
+from app.utils.rate_limiter import RateLimiter, MemoryRateLimitBackend
 
 
 @pytest.fixture(scope="module")
@@ -29,17 +14,29 @@ def client():
     return TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def admit_all_quotas():
+    with patch('app.api_server.quota_admission') as mock_quota_admission:
+        mock_quota_admission.admit.return_value = (True, 0.0)
+        yield mock_quota_admission
+
+
+@pytest.fixture(autouse=True)
+def admit_all_backpressure():
+    with patch('app.api_server.queue_backpressure') as mock_backpressure:
+        mock_backpressure.admit.return_value = (True, None, 0)
+        yield mock_backpressure
+
+
 class TestQueueEmailEndpoint:
     """Test the /api/v1/emails/queue endpoint"""
 
-    @patch('app.api_server.check_email_type_registration')
+    @patch('app.api_server.email_type_cache.is_registered')
     @patch('app.api_server.insert_email_queues')
-    @patch('app.api_server.publish_to_rabbitmq')
-    def test_queue_email_success(self, mock_publish, mock_insert, mock_check, client):
+    def test_queue_email_success(self, mock_insert, mock_check, client):
         """Test successful email queuing"""
         mock_check.return_value = True
         mock_insert.return_value = {"id": "test-email-id-123"}
-        mock_publish.return_value = True
 
         response = client.post(
             "/api/v1/emails/queue",
@@ -55,13 +52,12 @@ class TestQueueEmailEndpoint:
         assert response.status_code == 201
         data = response.json()
         assert data["success"] is True
-        assert "received and published successfully" in data["message"]
+        assert "received and queued successfully" in data["message"]
         assert data["email_id"] == "test-email-id-123"
         mock_check.assert_called_once_with("welcome")
         mock_insert.assert_called_once()
-        mock_publish.assert_called_once()
 
-    @patch('app.api_server.check_email_type_registration')
+    @patch('app.api_server.email_type_cache.is_registered')
     def test_queue_email_unregistered_type(self, mock_check, client):
         """Test that unregistered email type returns 422"""
         mock_check.return_value = False
@@ -83,6 +79,27 @@ class TestQueueEmailEndpoint:
         assert data["message"] == "Email type is not registered"
         mock_check.assert_called_once_with("unregistered_type")
 
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    def test_queue_email_type_removed_before_insert(self, mock_insert, mock_check, client):
+        """Test that an insert rejecting the email type maps to 422"""
+        mock_check.return_value = True
+        mock_insert.return_value = None
+
+        response = client.post(
+            "/api/v1/emails/queue",
+            data={
+                "email_type": "welcome",
+                "subject": "Test Subject",
+                "email_template": "default_template",
+                "email_data": '{"name": "John"}',
+                "priority_level": 1
+            }
+        )
+
+        assert response.status_code == 422
+        assert response.json()["message"] == "Email type is not registered"
+
     def test_queue_email_invalid_json(self, client):
         """Test that invalid JSON in email_data returns 400"""
         response = client.post(
@@ -101,14 +118,12 @@ class TestQueueEmailEndpoint:
         assert data["success"] is False
         assert "Invalid JSON format" in data["message"]
 
-    @patch('app.api_server.check_email_type_registration')
+    @patch('app.api_server.email_type_cache.is_registered')
     @patch('app.api_server.insert_email_queues')
-    @patch('app.api_server.publish_to_rabbitmq')
-    def test_queue_email_with_nested_email_data(self, mock_publish, mock_insert, mock_check, client):
+    def test_queue_email_with_nested_email_data(self, mock_insert, mock_check, client):
         """Test queuing with nested email_data structure"""
         mock_check.return_value = True
         mock_insert.return_value = {"id": "test-email-id-456"}
-        mock_publish.return_value = True
 
         response = client.post(
             "/api/v1/emails/queue",
@@ -125,14 +140,12 @@ class TestQueueEmailEndpoint:
         data = response.json()
         assert data["success"] is True
 
-    @patch('app.api_server.check_email_type_registration')
+    @patch('app.api_server.email_type_cache.is_registered')
     @patch('app.api_server.insert_email_queues')
-    @patch('app.api_server.publish_to_rabbitmq')
-    def test_queue_email_with_custom_addresses(self, mock_publish, mock_insert, mock_check, client):
+    def test_queue_email_with_custom_addresses(self, mock_insert, mock_check, client):
         """Test queuing with custom to, cc, and bcc addresses"""
         mock_check.return_value = True
         mock_insert.return_value = {"id": "test-email-id-789"}
-        mock_publish.return_value = True
 
         response = client.post(
             "/api/v1/emails/queue",
@@ -152,10 +165,9 @@ class TestQueueEmailEndpoint:
         data = response.json()
         assert data["success"] is True
 
-    @patch('app.api_server.check_email_type_registration')
+    @patch('app.api_server.email_type_cache.is_registered')
     @patch('app.api_server.insert_email_queues')
-    @patch('app.api_server.publish_to_rabbitmq')
-    def test_queue_email_database_insert_fails(self, mock_publish, mock_insert, mock_check, client):
+    def test_queue_email_database_insert_fails(self, mock_insert, mock_check, client):
         """Test handling of database insertion failure"""
         mock_check.return_value = True
         mock_insert.return_value = False
@@ -176,40 +188,12 @@ class TestQueueEmailEndpoint:
         assert data["success"] is False
         assert "Failed to register the request into email queue" in data["message"]
 
-    @patch('app.api_server.check_email_type_registration')
-    @patch('app.api_server.insert_email_queues')
-    @patch('app.api_server.publish_to_rabbitmq')
-    def test_queue_email_publish_fails(self, mock_publish, mock_insert, mock_check, client):
-        """Test handling of RabbitMQ publish failure"""
-        mock_check.return_value = True
-        mock_insert.return_value = {"id": "test-email-id-fail"}
-        mock_publish.return_value = False
-
-        response = client.post(
-            "/api/v1/emails/queue",
-            data={
-                "email_type": "welcome",
-                "subject": "Test Subject",
-                "email_template": "default_template",
-                "email_data": '{"name": "John"}',
-                "priority_level": 1
-            }
-        )
-
-        assert response.status_code == 500
-        data = response.json()
-        assert data["success"] is False
-        assert "failed to publish to queue" in data["message"]
-        assert data["email_id"] == "test-email-id-fail"
-
-    @patch('app.api_server.check_email_type_registration')
+    @patch('app.api_server.email_type_cache.is_registered')
     @patch('app.api_server.insert_email_queues')
-    @patch('app.api_server.publish_to_rabbitmq')
-    def test_queue_email_different_priority_levels(self, mock_publish, mock_insert, mock_check, client):
+    def test_queue_email_different_priority_levels(self, mock_insert, mock_check, client):
         """Test queuing with different priority levels"""
         mock_check.return_value = True
         mock_insert.return_value = {"id": "test-priority-123"}
-        mock_publish.return_value = True
 
         for priority in [1, 2, 3]:
             response = client.post(
@@ -236,14 +220,12 @@ class TestQueueEmailEndpoint:
 
         assert response.status_code == 422
 
-    @patch('app.api_server.check_email_type_registration')
+    @patch('app.api_server.email_type_cache.is_registered')
     @patch('app.api_server.insert_email_queues')
-    @patch('app.api_server.publish_to_rabbitmq')
-    def test_queue_email_empty_email_data(self, mock_publish, mock_insert, mock_check, client):
+    def test_queue_email_empty_email_data(self, mock_insert, mock_check, client):
         """Test queuing with empty email_data object"""
         mock_check.return_value = True
         mock_insert.return_value = {"id": "test-empty-123"}
-        mock_publish.return_value = True
 
         response = client.post(
             "/api/v1/emails/queue",
@@ -258,4 +240,553 @@ class TestQueueEmailEndpoint:
 
         assert response.status_code == 201
         data = response.json()
-        assert data["success"] is True
\ No newline at end of file
+        assert data["success"] is True
+
+class TestQueueEmailOutbox:
+    """Test how the enqueue endpoint hands messages to the outbox relay"""
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    @patch('app.api_server.prepare_attachments', new_callable=AsyncMock)
+    def test_queue_email_without_attachments_skips_attachment_processing(self, mock_prepare, mock_insert, mock_check, client):
+        """Test that emails without attachments are inserted without touching the attachment pipeline"""
+        mock_check.return_value = True
+        mock_insert.return_value = {"id": "outbox-email-id"}
+
+        response = client.post(
+            "/api/v1/emails/queue",
+            data={
+                "email_type": "welcome",
+                "subject": "Test Subject",
+                "email_template": "default_template",
+                "email_data": '{"name": "John"}',
+                "priority_level": 1
+            }
+        )
+
+        assert response.status_code == 201
+        assert mock_insert.call_args[1]["attachments"] == []
+        mock_prepare.assert_not_called()
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    @patch('app.api_server.prepare_attachments', new_callable=AsyncMock)
+    def test_queue_email_with_attachments_inserts_them_with_the_queue_row(self, mock_prepare, mock_insert, mock_check, client):
+        """Test that stored attachments are passed to the same insert as the queue row"""
+        mock_check.return_value = True
+        mock_insert.return_value = {"id": "outbox-email-id"}
+        prepared = [{"file_name": "report.txt", "file_path": "uploads/blobs/ab/cd/abcd", "mime_type": "text/plain", "file_size": 5, "checksum": "abcd"}]
+        mock_prepare.return_value = prepared
+
+        response = client.post(
+            "/api/v1/emails/queue",
+            data={
+                "email_type": "welcome",
+                "subject": "Test Subject",
+                "email_template": "default_template",
+                "email_data": '{"name": "John"}',
+                "priority_level": 1
+            },
+            files=[("attachments", ("report.txt", io.BytesIO(b"hello"), "text/plain"))]
+        )
+
+        assert response.status_code == 201
+        assert response.json()["attachments_processed"] == 1
+        assert mock_insert.call_args[1]["attachments"] == prepared
+        mock_prepare.assert_awaited_once()
+
+    @pytest.mark.parametrize("insert_result, status_code", [(None, 422), (False, 500)])
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    @patch('app.api_server.discard_attachments', new_callable=AsyncMock)
+    @patch('app.api_server.prepare_attachments', new_callable=AsyncMock)
+    def test_stored_attachments_are_discarded_when_insert_fails(self, mock_prepare, mock_discard, mock_insert, mock_check, insert_result, status_code, client):
+        """Test that blobs written before a failed insert are removed, since no row references them"""
+        mock_check.return_value = True
+        mock_insert.return_value = insert_result
+        prepared = [{"file_name": "report.txt", "file_path": "uploads/blobs/ab/cd/abcd", "mime_type": "text/plain", "file_size": 5, "checksum": "abcd", "created_mtime_ns": 1}]
+        mock_prepare.return_value = prepared
+
+        response = client.post(
+            "/api/v1/emails/queue",
+            data={
+                "email_type": "welcome",
+                "subject": "Test Subject",
+                "email_template": "default_template",
+                "email_data": '{"name": "John"}',
+                "priority_level": 1
+            },
+            files=[("attachments", ("report.txt", io.BytesIO(b"hello"), "text/plain"))]
+        )
+
+        assert response.status_code == status_code
+        mock_discard.assert_awaited_once_with(prepared)
+
+
+class TestQueueEmailBatchEndpoint:
+    """Test the /api/v1/emails/queue/batch endpoint"""
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues_batch')
+    def test_queue_email_batch_success(self, mock_insert_batch, mock_registered, client, make_email):
+        """Test that a valid batch is inserted with one call"""
+        mock_registered.side_effect = lambda email_type: email_type == "welcome"
+        mock_insert_batch.return_value = [{"id": "id-1"}, {"id": "id-2"}]
+
+        response = client.post(
+            "/api/v1/emails/queue/batch",
+            json=[make_email(), make_email(priority_level=3)]
+        )
+
+        assert response.status_code == 201
+        data = response.json()
+        assert data["success"] is True
+        assert data["queued"] == 2
+        assert [r["email_id"] for r in data["results"]] == ["id-1", "id-2"]
+        mock_registered.assert_called_once_with("welcome")
+        mock_insert_batch.assert_called_once()
+        assert len(mock_insert_batch.call_args[0][0]) == 2
+        assert [payload.priority_level for payload in mock_insert_batch.call_args[0][0]] == [1, 3]
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues_batch')
+    def test_queue_email_batch_partial_failure(self, mock_insert_batch, mock_registered, client, make_email):
+        """Test per-item errors for invalid items and unregistered types"""
+        mock_registered.side_effect = lambda email_type: email_type == "welcome"
+        mock_insert_batch.return_value = [{"id": "id-1"}, {"id": "id-2"}]
+
+        response = client.post(
+            "/api/v1/emails/queue/batch",
+            json=[
+                make_email(),
+                make_email(email_template="missing_template"),
+                make_email(email_type="unregistered_type"),
+                make_email()
+            ]
+        )
+
+        assert response.status_code == 207
+        data = response.json()
+        assert data["queued"] == 2
+        assert data["failed"] == 2
+        results = data["results"]
+        assert results[0]["email_id"] == "id-1"
+        assert "Payload validation failed" in results[1]["error"]
+        assert results[2]["error"] == "Email type is not registered"
+        assert results[3]["email_id"] == "id-2"
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues_batch')
+    def test_queue_email_batch_database_failure(self, mock_insert_batch, mock_registered, client, make_email):
+        """Test that a failed multi-row insert marks every accepted item as failed"""
+        mock_registered.side_effect = lambda email_type: email_type == "welcome"
+        mock_insert_batch.return_value = False
+
+        response = client.post(
+            "/api/v1/emails/queue/batch",
+            json=[make_email(), make_email()]
+        )
+
+        assert response.status_code == 500
+        data = response.json()
+        assert data["queued"] == 0
+        assert all("Failed to register" in r["error"] for r in data["results"])
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    @patch('app.api_server.insert_email_queues_batch')
+    def test_queue_email_batch_constraint_failure_keeps_valid_items(self, mock_insert_batch, mock_insert, mock_registered, client, make_email):
+        """Test that a constraint violation falls back to per-item inserts instead of failing the batch"""
+        mock_registered.return_value = True
+        mock_insert_batch.return_value = None
+        mock_insert.side_effect = [{"id": "id-1"}, None, False]
+
+        response = client.post(
+            "/api/v1/emails/queue/batch",
+            json=[make_email(), make_email(), make_email()]
+        )
+
+        assert response.status_code == 207
+        results = response.json()["results"]
+        assert results[0]["email_id"] == "id-1"
+        assert results[1]["error"] == "Email type is not registered"
+        assert "Failed to register" in results[2]["error"]
+        assert mock_insert.call_count == 3
+
+    def test_queue_email_batch_empty(self, client):
+        """Test that an empty batch is rejected"""
+        response = client.post("/api/v1/emails/queue/batch", json=[])
+
+        assert response.status_code == 400
+        assert response.json()["success"] is False
+
+    def test_queue_email_batch_too_large(self, client, make_email):
+        """Test that batches above BATCH_MAX_SIZE are rejected"""
+        with patch('app.api_server.config.BATCH_MAX_SIZE', 1):
+            response = client.post(
+                "/api/v1/emails/queue/batch",
+                json=[make_email(), make_email()]
+            )
+
+        assert response.status_code == 400
+
+
+class TestQueueEmailJsonEndpoint:
+    """Test the /api/v1/emails/queue/json endpoint and slim responses"""
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    def test_queue_email_json_success(self, mock_insert, mock_check, client, make_email):
+        """Test successful queuing with a JSON body"""
+        mock_check.return_value = True
+        mock_insert.return_value = {"id": "json-email-id"}
+
+        response = client.post("/api/v1/emails/queue/json", json=make_email(email_data={"name": "John", "rows": [1, 2, 3]}))
+
+        assert response.status_code == 201
+        data = response.json()
+        assert data["success"] is True
+        assert data["email_id"] == "json-email-id"
+        assert data["data"]["email_data"] == {"name": "John", "rows": [1, 2, 3]}
+        payload = mock_insert.call_args[0][0]
+        assert payload.email_data == {"name": "John", "rows": [1, 2, 3]}
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    def test_queue_email_json_slim_response(self, mock_insert, mock_check, client, make_email):
+        """Test that slim responses carry only the id and status"""
+        mock_check.return_value = True
+        mock_insert.return_value = {"id": "json-email-id"}
+
+        response = client.post("/api/v1/emails/queue/json?slim=true", json=make_email())
+
+        assert response.status_code == 201
+        assert response.json() == {"success": True, "email_id": "json-email-id", "status": "queued"}
+
+    def test_queue_email_json_invalid_body(self, client):
+        """Test that a malformed JSON body returns 400"""
+        response = client.post(
+            "/api/v1/emails/queue/json",
+            content=b"invalid json {{{",
+            headers={"Content-Type": "application/json"}
+        )
+
+        assert response.status_code == 400
+        assert "Invalid JSON format" in response.json()["message"]
+
+    def test_queue_email_json_validation_failure(self, client, make_email):
+        """Test that a missing template fails validation with 400"""
+        response = client.post(
+            "/api/v1/emails/queue/json",
+            json=make_email(email_template="missing_template")
+        )
+
+        assert response.status_code == 400
+        assert "Payload validation failed" in response.json()["message"]
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    def test_queue_email_json_unregistered_type(self, mock_check, client, make_email):
+        """Test that unregistered email type returns 422"""
+        mock_check.return_value = False
+
+        response = client.post("/api/v1/emails/queue/json", json=make_email())
+
+        assert response.status_code == 422
+        assert response.json()["message"] == "Email type is not registered"
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    def test_queue_email_multipart_slim_response(self, mock_insert, mock_check, client):
+        """Test that the multipart endpoint also supports slim responses"""
+        mock_check.return_value = True
+        mock_insert.return_value = {"id": "multipart-email-id"}
+
+        response = client.post(
+            "/api/v1/emails/queue?slim=true",
+            data={
+                "email_type": "welcome",
+                "subject": "Test Subject",
+                "email_template": "default_template",
+                "email_data": '{"name": "John"}',
+                "priority_level": 1
+            }
+        )
+
+        assert response.status_code == 201
+        assert response.json() == {"success": True, "email_id": "multipart-email-id", "status": "queued"}
+
+
+class TestReloadTemplatesEndpoint:
+    """Test the /api/v1/templates/reload endpoint"""
+
+    @patch('app.api_server.template_registry.reload')
+    def test_reload_templates(self, mock_reload, client):
+        """Test that the registry is rebuilt and the template count returned"""
+        mock_reload.return_value = 3
+
+        response = client.post("/api/v1/templates/reload")
+
+        assert response.status_code == 200
+        assert response.json() == {"success": True, "templates": 3}
+        mock_reload.assert_called_once()
+
+
+class TestRateLimiting:
+    """Test the rate_limited decorator on the enqueue endpoints"""
+
+    def make_limiter(self, per_minute=2, global_per_minute=100):
+        return RateLimiter(
+            backend=MemoryRateLimitBackend(),
+            client_rules=[("minute", per_minute, 60)],
+            global_rules=[("minute", global_per_minute, 60)]
+        )
+
+    def post_email(self, client):
+        return client.post("/api/v1/emails/queue/json", json={
+            "email_type": "welcome",
+            "subject": "Test Subject",
+            "email_template": "default_template",
+            "email_data": {"name": "John"},
+            "priority_level": 1
+        })
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    @patch('app.api_server.app_start_time', 0)
+    def test_requests_over_the_limit_get_429_with_retry_after(self, mock_insert, mock_check, client):
+        """Test that the per-IP limit rejects requests once the burst is used"""
+        mock_check.return_value = True
+        mock_insert.return_value = {"id": "email-id"}
+
+        with patch('app.api_server.rate_limiter', self.make_limiter(per_minute=2)):
+            responses = [self.post_email(client) for _ in range(3)]
+
+        assert [response.status_code for response in responses] == [201, 201, 429]
+        assert [response.headers["X-RateLimit-Remaining"] for response in responses] == ["1", "0", "0"]
+        assert responses[2].headers["X-RateLimit-Limit"] == "2"
+        assert int(responses[2].headers["X-RateLimit-Reset"]) > time.time()
+        assert int(responses[2].headers["Retry-After"]) >= 1
+        assert mock_insert.call_count == 2
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    @patch('app.api_server.app_start_time', 0)
+    def test_global_limit_is_enforced(self, mock_insert, mock_check, client):
+        """Test that the global limit applies even when the per-IP limit allows the request"""
+        mock_check.return_value = True
+        mock_insert.return_value = {"id": "email-id"}
+
+        with patch('app.api_server.rate_limiter', self.make_limiter(per_minute=100, global_per_minute=1)):
+            responses = [self.post_email(client) for _ in range(2)]
+
+        assert [response.status_code for response in responses] == [201, 429]
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    def test_requests_are_exempt_during_grace_period(self, mock_insert, mock_check, client):
+        """Test that no limit applies during the startup grace period"""
+        mock_check.return_value = True
+        mock_insert.return_value = {"id": "email-id"}
+
+        with patch('app.api_server.app_start_time', time.time()), \
+                patch('app.api_server.rate_limiter', self.make_limiter(per_minute=1)):
+            responses = [self.post_email(client) for _ in range(3)]
+
+        assert all(response.status_code == 201 for response in responses)
+
+
+class TestQuotaAdmission:
+    """Test how quota rejections are reported by the enqueue endpoints"""
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    def test_throttled_email_gets_429_with_retry_after(self, mock_insert, mock_check, client, admit_all_quotas, make_email):
+        """Test that a quota rejection returns 429 without inserting"""
+        mock_check.return_value = True
+        admit_all_quotas.admit.return_value = (False, 2.5)
+
+        response = client.post("/api/v1/emails/queue/json", json=make_email(), headers={"X-Client-Id": "billing"})
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "3"
+        mock_insert.assert_not_called()
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    def test_client_header_from_untrusted_address_is_ignored(self, mock_insert, mock_check, client, admit_all_quotas, make_email):
+        """Test that callers outside CLIENT_ID_TRUSTED_PROXIES cannot choose their quota identity"""
+        mock_check.return_value = True
+        mock_insert.return_value = {"id": "email-id"}
+
+        response = client.post("/api/v1/emails/queue/json", json=make_email(), headers={"X-Client-Id": "billing"})
+
+        assert response.status_code == 201
+        admit_all_quotas.admit.assert_called_once_with("testclient", "welcome")
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    def test_client_id_falls_back_to_remote_address(self, mock_insert, mock_check, client, admit_all_quotas, make_email):
+        """Test that requests without the client header are keyed by IP"""
+        mock_check.return_value = True
+        mock_insert.return_value = {"id": "email-id"}
+
+        response = client.post("/api/v1/emails/queue/json", json=make_email())
+
+        assert response.status_code == 201
+        admit_all_quotas.admit.assert_called_once_with("testclient", "welcome")
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues_batch')
+    def test_batch_reports_throttled_items(self, mock_insert_batch, mock_check, client, admit_all_quotas, make_email):
+        """Test that throttled batch items fail individually and the rest are queued"""
+        mock_check.return_value = True
+        admit_all_quotas.admit.side_effect = [(True, 0.0), (False, 4.0)]
+        mock_insert_batch.return_value = [{"id": "id-1"}]
+
+        response = client.post("/api/v1/emails/queue/batch", json=[make_email(), make_email(email_type="welcome")])
+
+        assert response.status_code == 207
+        assert response.headers["Retry-After"] == "4"
+        assert response.json()["results"][1]["error"] == "Quota exceeded"
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues_batch')
+    def test_batch_fully_throttled_returns_429(self, mock_insert_batch, mock_check, client, admit_all_quotas, make_email):
+        """Test that a batch rejected only by quotas returns 429"""
+        mock_check.return_value = True
+        admit_all_quotas.admit.return_value = (False, 1.0)
+
+        response = client.post("/api/v1/emails/queue/batch", json=[make_email()])
+
+        assert response.status_code == 429
+        mock_insert_batch.assert_not_called()
+
+
+class TestBackpressure:
+    """Test how queue-depth load shedding is reported by the enqueue endpoints"""
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    def test_shed_email_gets_status_and_retry_after(self, mock_insert, mock_check, client, admit_all_backpressure, admit_all_quotas, make_email):
+        """Test that a shed request returns the shedding status without consuming quota or inserting"""
+        mock_check.return_value = True
+        admit_all_backpressure.admit.return_value = (False, 429, 40)
+
+        response = client.post("/api/v1/emails/queue/json", json=make_email(priority_level=3))
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "40"
+        admit_all_backpressure.admit.assert_called_once_with(3)
+        admit_all_quotas.admit.assert_not_called()
+        mock_insert.assert_not_called()
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues')
+    def test_slim_response_reports_unavailable(self, mock_insert, mock_check, client, admit_all_backpressure, make_email):
+        """Test that shedding with no consumers is reported as 503"""
+        mock_check.return_value = True
+        admit_all_backpressure.admit.return_value = (False, 503, 300)
+
+        response = client.post("/api/v1/emails/queue/json?slim=true", json=make_email(priority_level=3))
+
+        assert response.status_code == 503
+        assert response.json() == {"success": False, "status": "unavailable"}
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues_batch')
+    def test_batch_sheds_low_priority_items_only(self, mock_insert_batch, mock_check, client, admit_all_backpressure, make_email):
+        """Test that shed batch items fail individually while high priority items are queued"""
+        mock_check.return_value = True
+        admit_all_backpressure.admit.side_effect = lambda priority_level: (True, None, 0) if priority_level == 1 else (False, 429, 30)
+        mock_insert_batch.return_value = [{"id": "email-1"}]
+
+        response = client.post("/api/v1/emails/queue/batch", json=[make_email(priority_level=1), make_email(priority_level=3)])
+
+        assert response.status_code == 207
+        assert response.headers["Retry-After"] == "30"
+        assert [result["success"] for result in response.json()["results"]] == [True, False]
+        assert response.json()["results"][1]["error"] == "Queue backlog too large"
+
+    @patch('app.api_server.email_type_cache.is_registered')
+    @patch('app.api_server.insert_email_queues_batch')
+    def test_fully_shed_batch_uses_shedding_status(self, mock_insert_batch, mock_check, client, admit_all_backpressure, make_email):
+        """Test that a batch shed entirely returns the shedding status"""
+        mock_check.return_value = True
+        admit_all_backpressure.admit.return_value = (False, 503, 300)
+
+        response = client.post("/api/v1/emails/queue/batch", json=[make_email(priority_level=3)])
+
+        assert response.status_code == 503
+        mock_insert_batch.assert_not_called()
+
+
+class TestEmailStatusEndpoints:
+    """Test the status lookup, long-poll and server-sent event endpoints"""
+
+    email_id = "550e8400-e29b-41d4-a716-446655440000"
+    other_id = "6ba7b810-9dad-11d1-80b4-00c04fd430c8"
+
+    @patch('app.api_server.get_email_statuses')
+    def test_get_status(self, mock_get_statuses, client):
+        """Test that a single email's status is returned with its label"""
+        mock_get_statuses.return_value = {self.email_id: {"id": self.email_id, "status": 1, "created_at": None, "sent_at": None}}
+
+        response = client.get(f"/api/v1/emails/{self.email_id}")
+
+        assert response.status_code == 200
+        assert response.json()["state"] == "sent"
+
+    @patch('app.api_server.get_email_statuses')
+    def test_get_status_unknown_email(self, mock_get_statuses, client):
+        """Test that an unknown email returns 404 and an invalid id 400"""
+        mock_get_statuses.return_value = {}
+
+        assert client.get(f"/api/v1/emails/{self.email_id}").status_code == 404
+        assert client.get("/api/v1/emails/not-a-uuid").status_code == 400
+
+    @patch('app.api_server.get_email_statuses')
+    def test_long_poll_returns_on_status_change(self, mock_get_statuses, client):
+        """Test that a pending email is held open until its status notification arrives"""
+        import threading
+        from app.utils.status_hub import email_status_hub
+        mock_get_statuses.return_value = {self.email_id: {"id": self.email_id, "status": 0, "created_at": None, "sent_at": None}}
+        notify = threading.Timer(0.2, email_status_hub.publish, args=(f'{{"id": "{self.email_id}", "status": 2, "sent_at": null}}',))
+        notify.start()
+
+        started = time.monotonic()
+        response = client.get(f"/api/v1/emails/{self.email_id}?wait=5")
+
+        assert response.json()["state"] == "failed"
+        assert time.monotonic() - started < 5
+        assert email_status_hub.stats()["waiters"] == 0
+
+    @patch('app.api_server.get_email_statuses')
+    def test_bulk_status_lookup(self, mock_get_statuses, client):
+        """Test that the bulk lookup reports found and missing emails"""
+        mock_get_statuses.return_value = {self.email_id: {"id": self.email_id, "status": 0, "created_at": None, "sent_at": None}}
+
+        response = client.post("/api/v1/emails/status", json=[self.email_id, self.other_id, self.email_id])
+
+        assert response.status_code == 200
+        assert [result["id"] for result in response.json()["results"]] == [self.email_id]
+        assert response.json()["missing"] == [self.other_id]
+        mock_get_statuses.assert_called_once_with([self.email_id, self.other_id])
+
+    @patch('app.api_server.get_email_statuses')
+    def test_bulk_status_lookup_database_error(self, mock_get_statuses, client):
+        """Test that a failed lookup returns 500"""
+        mock_get_statuses.return_value = False
+
+        assert client.post("/api/v1/emails/status", json=[self.email_id]).status_code == 500
+
+    @patch('app.api_server.get_email_statuses')
+    def test_event_stream_ends_when_all_emails_are_final(self, mock_get_statuses, client):
+        """Test that the stream sends current statuses and ends once nothing is pending"""
+        mock_get_statuses.return_value = {self.email_id: {"id": self.email_id, "status": 1, "created_at": None, "sent_at": None}}
+
+        response = client.get(f"/api/v1/emails/events?ids={self.email_id}&ids={self.other_id}")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [block.split("\n")[0] for block in response.text.strip().split("\n\n")]
+        assert events == ["event: status", "event: missing", "event: end"]
@@ -0,0 +1,262 @@
+import asyncio
+import smtplib
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.utils.async_worker import AsyncEmailWorker, run_stats_log
+from app.utils.retry_utils import RetryPolicy
+
+
+def make_worker(concurrency=4, max_retries=3):
+    policy = RetryPolicy(max_retries=max_retries, base_delay=30, max_delay=900, jitter=0)
+    worker = AsyncEmailWorker(prefetch={'email.high': 2}, concurrency=concurrency, retry_policy=policy)
+    worker._semaphore = asyncio.Semaphore(concurrency)
+    worker._publish_channel = MagicMock()
+    worker._publish_channel.default_exchange.publish = AsyncMock()
+    worker._dead_letter_exchanges = {'email.high': MagicMock(publish=AsyncMock())}
+    return worker
+
+
+def make_message(headers=None):
+    message = MagicMock()
+    message.ack = AsyncMock()
+    message.reject = AsyncMock()
+    message.routing_key = 'email.high'
+    message.headers = headers or {}
+    message.body = b'body'
+    message.content_type = 'application/msgpack'
+    message.content_encoding = None
+    return message
+
+
+EMAIL = {'id': 'email-1', 'subject': 'Hi', 'body': '<p>Hi</p>', 'to_address': ['a@example.com'], 'cc_addresses': None, 'bcc_addresses': None, 'attachments': []}
+
+
+@pytest.fixture
+def pipeline():
+    with patch('app.utils.async_worker.decode_message') as mock_decode, \
+         patch('app.utils.async_worker.prepare_email') as mock_prepare, \
+         patch('app.utils.async_worker.build_email_message') as mock_build, \
+         patch('app.utils.async_worker.send_message_via_smtp_async', new_callable=AsyncMock) as mock_send, \
+         patch('app.utils.async_worker.update_email_status') as mock_update, \
+         patch('app.utils.async_worker.print_logging'):
+        mock_decode.return_value = {'id': 'email-1', 'email_type': 'welcome'}
+        mock_prepare.return_value = EMAIL
+        mock_build.return_value = (MagicMock(), 'sender@example.com', ['a@example.com'])
+        yield {'send': mock_send, 'update': mock_update, 'prepare': mock_prepare, 'decode': mock_decode}
+
+
+def dead_lettered_headers(worker):
+    publish = worker._dead_letter_exchanges['email.high'].publish
+    assert publish.await_args.kwargs['routing_key'] == 'email.high'
+    return publish.await_args.args[0].headers
+
+
+class TestAsyncEmailWorker:
+    @pytest.mark.asyncio
+    async def test_sent_email_is_acked_after_status_update(self, pipeline):
+        worker = make_worker()
+        message = make_message()
+        order = []
+        pipeline['send'].return_value = (True, 'success')
+        pipeline['update'].side_effect = lambda status, email_id: order.append(('status', status)) or True
+        message.ack.side_effect = lambda: order.append(('ack',))
+
+        await worker.process_message(message)
+
+        assert order == [('status', 1), ('ack',)]
+
+    @pytest.mark.asyncio
+    async def test_sent_email_is_dead_lettered_when_status_update_fails(self, pipeline):
+        worker = make_worker()
+        message = make_message()
+        pipeline['send'].return_value = (True, 'success')
+        pipeline['update'].return_value = False
+
+        await worker.process_message(message)
+
+        headers = dead_lettered_headers(worker)
+        assert headers['x-failure-reason'] == 'status_update_failed'
+        assert headers['x-email-id'] == 'email-1'
+        message.ack.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_failed_attempt_is_republished_to_retry_queue(self, pipeline):
+        worker = make_worker(max_retries=3)
+        message = make_message({'x-envelope-version': 2})
+        pipeline['send'].return_value = (False, ConnectionRefusedError('Connection refused'))
+
+        await worker.process_message(message)
+
+        publish = worker._publish_channel.default_exchange.publish
+        retry_message = publish.await_args.args[0]
+        assert publish.await_args.kwargs['routing_key'] == 'email.high.retry.30s'
+        assert retry_message.body == b'body'
+        assert retry_message.headers == {'x-envelope-version': 2, 'x-attempt': 2}
+        assert retry_message.expiration == 30
+        assert pipeline['send'].await_count == 1
+        pipeline['update'].assert_not_called()
+        message.ack.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_last_attempt_marks_email_failed(self, pipeline):
+        worker = make_worker(max_retries=3)
+        message = make_message({'x-attempt': 3})
+        pipeline['send'].return_value = (False, ConnectionRefusedError('Connection refused'))
+
+        await worker.process_message(message)
+
+        worker._publish_channel.default_exchange.publish.assert_not_called()
+        pipeline['update'].assert_called_once_with(2, 'email-1')
+        headers = dead_lettered_headers(worker)
+        assert headers['x-failure-reason'] == 'retries_exhausted'
+        assert headers['x-error'] == 'Connection refused'
+        assert headers['x-email-id'] == 'email-1'
+        assert headers['x-email-type'] == 'welcome'
+        assert headers['x-attempt'] == 3
+        message.ack.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_permanent_smtp_error_is_not_retried(self, pipeline):
+        worker = make_worker(max_retries=3)
+        message = make_message()
+        pipeline['send'].return_value = (False, smtplib.SMTPResponseException(550, b'mailbox unavailable'))
+
+        await worker.process_message(message)
+
+        worker._publish_channel.default_exchange.publish.assert_not_called()
+        pipeline['update'].assert_called_once_with(2, 'email-1')
+        assert dead_lettered_headers(worker)['x-failure-reason'] == 'smtp_permanent'
+
+    @pytest.mark.asyncio
+    async def test_processing_error_is_dead_lettered(self, pipeline):
+        worker = make_worker()
+        message = make_message()
+        pipeline['prepare'].side_effect = Exception('Template not found')
+
+        await worker.process_message(message)
+
+        pipeline['send'].assert_not_called()
+        headers = dead_lettered_headers(worker)
+        assert headers['x-failure-reason'] == 'processing_error'
+        assert headers['x-source-queue'] == 'email.high'
+        message.ack.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_undecodable_message_is_dead_lettered(self, pipeline):
+        worker = make_worker()
+        message = make_message()
+        pipeline['decode'].side_effect = ValueError('Unsupported message envelope version 3')
+
+        await worker.process_message(message)
+
+        headers = dead_lettered_headers(worker)
+        assert headers['x-failure-reason'] == 'decode_error'
+        assert 'x-email-id' not in headers
+        message.ack.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_message_is_rejected_when_dead_letter_publish_fails(self, pipeline):
+        worker = make_worker()
+        message = make_message()
+        pipeline['decode'].side_effect = ValueError('bad body')
+        worker._dead_letter_exchanges['email.high'].publish.side_effect = Exception('channel closed')
+
+        await worker.process_message(message)
+
+        message.reject.assert_awaited_once_with(requeue=False)
+        message.ack.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limits_messages_in_flight(self, pipeline):
+        worker = make_worker(concurrency=2)
+        in_flight = 0
+        peak = 0
+
+        async def slow_send(*args):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return True, 'success'
+
+        pipeline['send'].side_effect = slow_send
+
+        for _ in range(6):
+            await worker.on_message(make_message())
+        await asyncio.gather(*worker._tasks)
+
+        assert peak == 2
+        assert pipeline['send'].await_count == 6
+
+
+class TestRunStatsLog:
+    @pytest.mark.asyncio
+    @patch('app.utils.async_worker.print_logging')
+    @patch('app.utils.async_worker.asyncio.sleep', new_callable=AsyncMock)
+    async def test_logs_smtp_pool_and_render_cache_stats(self, mock_sleep, mock_logging):
+        mock_sleep.side_effect = [None, asyncio.CancelledError()]
+        render_cache = MagicMock()
+        render_cache.stats.return_value = {'hits': 3}
+
+        with patch('app.utils.async_worker.render_cache', render_cache), pytest.raises(asyncio.CancelledError):
+            await run_stats_log(300)
+
+        messages = [c.args[1] for c in mock_logging.call_args_list]
+        assert messages[0].startswith('SMTP pool stats: ')
+        assert messages[1] == "Render cache stats: {'hits': 3}"
+        mock_sleep.assert_awaited_with(300)
+
+    @pytest.mark.asyncio
+    @patch('app.utils.async_worker.print_logging')
+    @patch('app.utils.async_worker.asyncio.sleep', new_callable=AsyncMock)
+    async def test_skips_render_cache_when_disabled(self, mock_sleep, mock_logging):
+        mock_sleep.side_effect = [None, asyncio.CancelledError()]
+
+        with patch('app.utils.async_worker.render_cache', None), pytest.raises(asyncio.CancelledError):
+            await run_stats_log(300)
+
+        assert mock_logging.call_count == 1
+
+
+class TestRun:
+    @pytest.mark.asyncio
+    @patch('app.utils.async_worker.print_logging')
+    @patch('app.utils.async_worker.config')
+    async def test_failed_first_connect_is_retried(self, mock_config, mock_logging):
+        mock_config.RABBITMQ_RECONNECT_INTERVAL_SECONDS = 0
+        worker = make_worker()
+        connection = MagicMock(close=AsyncMock())
+
+        async def start(started_connection):
+            worker.stop()
+            return []
+
+        with patch.object(worker, 'connect', AsyncMock(side_effect=[ConnectionError('Connection refused'), connection])) as mock_connect, \
+             patch.object(worker, 'start', AsyncMock(side_effect=start)) as mock_start:
+            await worker.run()
+
+        assert mock_connect.await_count == 2
+        mock_start.assert_awaited_once_with(connection)
+        connection.close.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    @patch('app.utils.async_worker.print_logging')
+    @patch('app.utils.async_worker.config')
+    async def test_failed_topology_declaration_closes_connection_and_retries(self, mock_config, mock_logging):
+        mock_config.RABBITMQ_RECONNECT_INTERVAL_SECONDS = 0
+        worker = make_worker()
+        failed, connection = MagicMock(close=AsyncMock()), MagicMock(close=AsyncMock())
+
+        async def start(started_connection):
+            if started_connection is failed:
+                raise RuntimeError('PRECONDITION_FAILED')
+            worker.stop()
+            return []
+
+        with patch.object(worker, 'connect', AsyncMock(side_effect=[failed, connection])), \
+             patch.object(worker, 'start', AsyncMock(side_effect=start)):
+            await worker.run()
+
+        failed.close.assert_awaited_once()
+        connection.close.assert_awaited_once()
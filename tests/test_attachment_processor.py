@@ -0,0 +1,144 @@
+import hashlib
+import os
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.utils.attachment_processor import stream_attachment_to_temp_file, prepare_attachments
+
+PDF_CONTENT = b"%PDF-1.4\n" + b"0" * 5000
+
+
+def make_upload(content, filename="report.pdf", size=None, chunk_reads=None):
+    upload = MagicMock()
+    upload.filename = filename
+    upload.size = size
+    chunks = chunk_reads if chunk_reads is not None else [content[i:i + 1024] for i in range(0, len(content), 1024)]
+    upload.read = AsyncMock(side_effect=chunks + [b""])
+    return upload
+
+
+def make_config(mock_config, upload_dir, max_file_size=10485760):
+    mock_config.UPLOAD_DIR = str(upload_dir)
+    mock_config.MAX_FILE_SIZE = max_file_size
+    mock_config.ATTACHMENT_CHUNK_SIZE = 1024
+    mock_config.ATTACHMENT_MIME_SNIFF_BYTES = 2048
+    mock_config.ALLOWED_MIME_TYPES = {'application/pdf'}
+    mock_config.ALLOWED_EXTENSIONS = {'.pdf'}
+
+
+class TestStreamAttachmentToTempFile:
+    @pytest.mark.asyncio
+    @patch('app.utils.attachment_processor.config')
+    @patch('app.utils.attachment_processor.print_logging')
+    async def test_stream_attachment_hashes_and_writes_chunks(self, mock_print_logging, mock_config, tmp_path):
+        make_config(mock_config, tmp_path)
+        upload = make_upload(PDF_CONTENT)
+
+        result = await stream_attachment_to_temp_file(upload)
+
+        assert result["file_size"] == len(PDF_CONTENT)
+        assert result["mime_type"] == 'application/pdf'
+        assert result["checksum"] == hashlib.sha256(PDF_CONTENT).hexdigest()
+        with open(result["temp_path"], 'rb') as f:
+            assert f.read() == PDF_CONTENT
+
+    @pytest.mark.asyncio
+    @patch('app.utils.attachment_processor.config')
+    @patch('app.utils.attachment_processor.print_logging')
+    async def test_stream_attachment_skips_declared_oversize_without_reading(self, mock_print_logging, mock_config, tmp_path):
+        make_config(mock_config, tmp_path, max_file_size=100)
+        upload = make_upload(PDF_CONTENT, size=len(PDF_CONTENT))
+
+        result = await stream_attachment_to_temp_file(upload)
+
+        assert result is None
+        upload.read.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch('app.utils.attachment_processor.config')
+    @patch('app.utils.attachment_processor.print_logging')
+    async def test_stream_attachment_aborts_once_limit_crossed(self, mock_print_logging, mock_config, tmp_path):
+        make_config(mock_config, tmp_path, max_file_size=3000)
+        upload = make_upload(PDF_CONTENT)
+
+        result = await stream_attachment_to_temp_file(upload)
+
+        assert result is None
+        # 3 chunks of 1024 cross the 3000 byte limit; the rest of the upload is never read
+        assert upload.read.await_count == 3
+        assert os.listdir(tmp_path / ".tmp") == []
+
+    @pytest.mark.asyncio
+    @patch('app.utils.attachment_processor.config')
+    @patch('app.utils.attachment_processor.print_logging')
+    async def test_stream_attachment_rejects_disallowed_mime(self, mock_print_logging, mock_config, tmp_path):
+        make_config(mock_config, tmp_path)
+        upload = make_upload(b"plain text " * 500)
+
+        result = await stream_attachment_to_temp_file(upload)
+
+        assert result is None
+        assert os.listdir(tmp_path / ".tmp") == []
+
+    @pytest.mark.asyncio
+    @patch('app.utils.attachment_processor.config')
+    @patch('app.utils.attachment_processor.print_logging')
+    async def test_stream_attachment_sniffs_small_file_at_end(self, mock_print_logging, mock_config, tmp_path):
+        make_config(mock_config, tmp_path)
+        content = b"%PDF-1.4\n%%EOF"
+        upload = make_upload(content)
+
+        result = await stream_attachment_to_temp_file(upload)
+
+        assert result["mime_type"] == 'application/pdf'
+        assert result["file_size"] == len(content)
+
+
+class TestPrepareAttachments:
+    @pytest.mark.asyncio
+    @patch('app.utils.attachment_processor.config')
+    @patch('app.utils.attachment_processor.print_logging')
+    @patch('app.utils.blob_store.config')
+    async def test_prepare_attachments_stores_identical_content_once(self, mock_blob_config, mock_print_logging, mock_config, tmp_path):
+        make_config(mock_config, tmp_path)
+        mock_blob_config.UPLOAD_DIR = str(tmp_path)
+        checksum = hashlib.sha256(PDF_CONTENT).hexdigest()
+
+        result = await prepare_attachments([make_upload(PDF_CONTENT), make_upload(PDF_CONTENT, filename="copy.pdf")])
+
+        blob_path = str(tmp_path / "blobs" / checksum[:2] / checksum[2:4] / checksum)
+        assert [item["file_path"] for item in result] == [blob_path, blob_path]
+        assert [item["file_name"] for item in result] == ["report.pdf", "copy.pdf"]
+        assert all(item["checksum"] == checksum for item in result)
+        assert os.path.exists(blob_path)
+        assert os.listdir(tmp_path / ".tmp") == []
+
+    @pytest.mark.asyncio
+    @patch('app.utils.attachment_processor.config')
+    @patch('app.utils.attachment_processor.print_logging')
+    @patch('app.utils.blob_store.config')
+    async def test_prepare_attachments_keeps_order_and_skips_rejected(self, mock_blob_config, mock_print_logging, mock_config, tmp_path):
+        make_config(mock_config, tmp_path)
+        mock_blob_config.UPLOAD_DIR = str(tmp_path)
+        other_pdf = b"%PDF-1.4\n" + b"1" * 3000
+
+        result = await prepare_attachments([
+            make_upload(PDF_CONTENT, filename="a.pdf"),
+            make_upload(PDF_CONTENT, filename="script.exe"),
+            make_upload(b"plain text " * 500, filename="fake.pdf"),
+            make_upload(other_pdf, filename="b.pdf")
+        ])
+
+        assert [item["file_name"] for item in result] == ["a.pdf", "b.pdf"]
+        assert result[1]["file_size"] == len(other_pdf)
+
+    @pytest.mark.asyncio
+    @patch('app.utils.attachment_processor.config')
+    @patch('app.utils.attachment_processor.print_logging')
+    async def test_prepare_attachments_skips_disallowed_extension(self, mock_print_logging, mock_config, tmp_path):
+        make_config(mock_config, tmp_path)
+        upload = make_upload(PDF_CONTENT, filename="script.exe")
+
+        result = await prepare_attachments([upload])
+
+        assert result == []
+        upload.read.assert_not_called()
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import patch
-from app.utils.attachment_utils import get_file_attachments
+from app.utils.attachment_utils import get_file_attachments, get_message_attachments
 
 
 class TestGetFileAttachments:
@@ -16,8 +16,8 @@ class TestGetFileAttachments:
         result = get_file_attachments(123)
 
         assert len(result) == 2
-        assert '/uploads/test.pdf' in result
-        assert '/uploads/doc.pdf' in result
+        assert ('/uploads/test.pdf', 'test.pdf') in result
+        assert ('/uploads/doc.pdf', 'doc.pdf') in result
 
     @patch('app.utils.attachment_utils.is_has_file_attachments')
     @patch('os.path.exists')
@@ -31,8 +31,8 @@ class TestGetFileAttachments:
         result = get_file_attachments(123)
 
         assert len(result) == 1
-        assert '/uploads/test.pdf' in result
-        assert '/uploads/missing.pdf' not in result
+        assert ('/uploads/test.pdf', 'test.pdf') in result
+        assert ('/uploads/missing.pdf', 'missing.pdf') not in result
 
     @patch('app.utils.attachment_utils.is_has_file_attachments')
     @patch('os.path.exists')
@@ -80,4 +80,35 @@ class TestGetFileAttachments:
         result = get_file_attachments(123)
 
         assert len(result) == 1
-        assert 'C:\\uploads\\test.pdf' in result
+        assert ('C:\\uploads\\test.pdf', 'test.pdf') in result
+
+
+class TestGetMessageAttachments:
+    @patch('app.utils.attachment_utils.is_has_file_attachments')
+    def test_manifest_is_used_without_database_lookup(self, mock_is_has_file_attachments):
+        email_data = {
+            'id': 123,
+            'has_attachments': True,
+            'attachments': [{'file_name': 'a.pdf', 'file_path': '/uploads/blobs/ab/cd/abcd', 'mime_type': 'application/pdf', 'file_size': 10, 'checksum': 'abcd'}]
+        }
+
+        result = get_message_attachments(email_data)
+
+        assert result == [('/uploads/blobs/ab/cd/abcd', 'a.pdf')]
+        mock_is_has_file_attachments.assert_not_called()
+
+    @patch('app.utils.attachment_utils.is_has_file_attachments')
+    def test_message_without_attachments_skips_lookup(self, mock_is_has_file_attachments):
+        assert get_message_attachments({'id': 123, 'has_attachments': False, 'attachments': []}) == []
+        mock_is_has_file_attachments.assert_not_called()
+
+    @patch('app.utils.attachment_utils.is_has_file_attachments')
+    @patch('os.path.exists')
+    def test_legacy_message_falls_back_to_database(self, mock_exists, mock_is_has_file_attachments):
+        mock_is_has_file_attachments.return_value = [{'file_name': 'test.pdf', 'file_path': '/uploads/test.pdf'}]
+        mock_exists.return_value = True
+
+        result = get_message_attachments({'id': 123})
+
+        assert result == [('/uploads/test.pdf', 'test.pdf')]
+        mock_is_has_file_attachments.assert_called_once_with(123)
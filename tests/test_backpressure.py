@@ -0,0 +1,110 @@
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.utils.backpressure import QueueBackpressure
+
+
+def make_backpressure(queues, outbox, thresholds=None, poll_interval=5, max_retry_after=300):
+    publisher = MagicMock()
+    publisher.queue_depths = AsyncMock(return_value=queues)
+    return QueueBackpressure(
+        publisher=publisher,
+        outbox_counter=MagicMock(return_value=outbox),
+        thresholds=thresholds or {1: 0, 2: 2000, 3: 1000},
+        poll_interval=poll_interval,
+        max_retry_after=max_retry_after
+    )
+
+
+def depths(high=(0, 1), normal=(0, 1), low=(0, 1)):
+    return {'email.high': high, 'email.normal': normal, 'email.low': low}
+
+
+@pytest.fixture(autouse=True)
+def queue_names():
+    with patch('app.utils.backpressure.get_queue_name') as mock_get_queue_name:
+        mock_get_queue_name.side_effect = lambda priority_level: {1: 'email.high', 2: 'email.normal'}.get(priority_level, 'email.low')
+        yield mock_get_queue_name
+
+
+class TestQueueBackpressure:
+    @pytest.mark.asyncio
+    @patch('app.utils.backpressure.time.monotonic')
+    async def test_sample_adds_broker_depth_and_outbox_backlog(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        backpressure = make_backpressure(depths(low=(900, 2)), {3: 50})
+
+        assert await backpressure.sample() == 950
+        assert backpressure.stats()['queues']['email.low'] == {'messages': 900, 'consumers': 2}
+
+    @pytest.mark.asyncio
+    @patch('app.utils.backpressure.time.monotonic')
+    async def test_low_priority_is_shed_before_normal_and_high(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        backpressure = make_backpressure(depths(low=(1500, 2)), {})
+        await backpressure.sample()
+
+        assert backpressure.admit(3)[0] is False
+        assert backpressure.admit(2)[0] is True
+        assert backpressure.admit(1)[0] is True
+
+    @pytest.mark.asyncio
+    @patch('app.utils.backpressure.time.monotonic')
+    async def test_retry_after_uses_drain_rate(self, mock_monotonic):
+        backpressure = make_backpressure(depths(low=(1600, 2)), {})
+        mock_monotonic.return_value = 100.0
+        await backpressure.sample()
+
+        backpressure.publisher.queue_depths.return_value = depths(low=(1500, 2))
+        mock_monotonic.return_value = 105.0
+        await backpressure.sample()
+
+        # 500 messages over the threshold, draining 20 per second
+        assert backpressure.admit(3) == (False, 429, 25)
+
+    @pytest.mark.asyncio
+    @patch('app.utils.backpressure.time.monotonic')
+    async def test_growing_backlog_gets_max_retry_after(self, mock_monotonic):
+        backpressure = make_backpressure(depths(low=(1200, 2)), {})
+        mock_monotonic.return_value = 100.0
+        await backpressure.sample()
+
+        backpressure.publisher.queue_depths.return_value = depths(low=(1500, 2))
+        mock_monotonic.return_value = 105.0
+        await backpressure.sample()
+
+        assert backpressure.admit(3) == (False, 429, 300)
+
+    @pytest.mark.asyncio
+    @patch('app.utils.backpressure.time.monotonic')
+    async def test_queue_without_consumers_returns_503(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        backpressure = make_backpressure(depths(low=(1500, 0)), {})
+        await backpressure.sample()
+
+        assert backpressure.admit(3) == (False, 503, 300)
+
+    @pytest.mark.asyncio
+    @patch('app.utils.backpressure.time.monotonic')
+    async def test_stale_sample_admits(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        backpressure = make_backpressure(depths(low=(1500, 2)), {})
+        await backpressure.sample()
+
+        mock_monotonic.return_value = 116.0
+
+        assert backpressure.admit(3)[0] is True
+
+    def test_admits_before_first_sample(self):
+        backpressure = make_backpressure(depths(), {})
+
+        assert backpressure.admit(3) == (True, None, 0)
+
+    @pytest.mark.asyncio
+    @patch('app.utils.backpressure.print_logging')
+    async def test_broker_error_keeps_previous_sample(self, mock_print_logging):
+        backpressure = make_backpressure(depths(), {})
+        backpressure.publisher.queue_depths.side_effect = Exception("connection refused")
+
+        assert await backpressure.sample() is None
+        assert backpressure.stats()['backlog'] is None
+        mock_print_logging.assert_called_once()
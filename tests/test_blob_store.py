@@ -0,0 +1,88 @@
+import os
+import time
+from unittest.mock import patch
+from app.utils.blob_store import get_blob_path, store_blob, discard_new_blobs, remove_unreferenced_blobs
+
+CHECKSUM = "abcdef0123456789" * 4
+
+
+class TestBlobStore:
+    @patch('app.utils.blob_store.config')
+    def test_get_blob_path_is_sharded_by_hash_prefix(self, mock_config):
+        mock_config.UPLOAD_DIR = 'uploads'
+
+        result = get_blob_path(CHECKSUM)
+
+        assert str(result) == os.path.join('uploads', 'blobs', 'ab', 'cd', CHECKSUM)
+
+    @patch('app.utils.blob_store.config')
+    def test_store_blob_moves_new_content_into_place(self, mock_config, tmp_path):
+        mock_config.UPLOAD_DIR = str(tmp_path)
+        temp_file = tmp_path / "upload.tmp"
+        temp_file.write_bytes(b"content")
+
+        result, created_mtime_ns = store_blob(str(temp_file), CHECKSUM)
+
+        assert result == str(tmp_path / 'blobs' / 'ab' / 'cd' / CHECKSUM)
+        assert open(result, 'rb').read() == b"content"
+        assert created_mtime_ns == os.stat(result).st_mtime_ns
+        assert not temp_file.exists()
+
+    @patch('app.utils.blob_store.config')
+    def test_store_blob_discards_duplicate_and_refreshes_mtime(self, mock_config, tmp_path):
+        mock_config.UPLOAD_DIR = str(tmp_path)
+        blob_path = get_blob_path(CHECKSUM)
+        blob_path.parent.mkdir(parents=True)
+        blob_path.write_bytes(b"content")
+        os.utime(blob_path, (0, 0))
+        temp_file = tmp_path / "upload.tmp"
+        temp_file.write_bytes(b"content")
+
+        assert store_blob(str(temp_file), CHECKSUM) == (str(blob_path), None)
+
+        assert not temp_file.exists()
+        assert os.path.getmtime(blob_path) > 0
+
+    @patch('app.utils.blob_store.config')
+    def test_discard_new_blobs_removes_only_untouched_new_blobs(self, mock_config, tmp_path):
+        mock_config.UPLOAD_DIR = str(tmp_path)
+        new_blob, reused_blob, existing_blob = tmp_path / "new", tmp_path / "reused", tmp_path / "existing"
+        for blob in (new_blob, reused_blob, existing_blob):
+            blob.write_bytes(b"content")
+        created_mtime_ns = os.stat(reused_blob).st_mtime_ns
+        os.utime(reused_blob, ns=(created_mtime_ns + 10**9, created_mtime_ns + 10**9))
+
+        removed = discard_new_blobs([
+            {"file_path": str(new_blob), "created_mtime_ns": os.stat(new_blob).st_mtime_ns},
+            {"file_path": str(reused_blob), "created_mtime_ns": created_mtime_ns},
+            {"file_path": str(existing_blob), "created_mtime_ns": None}
+        ])
+
+        assert removed == 1
+        assert not new_blob.exists()
+        assert reused_blob.exists()
+        assert existing_blob.exists()
+
+
+class TestRemoveUnreferencedBlobs:
+    @patch('app.utils.blob_store.delete_unreferenced_attachment_blobs')
+    @patch('app.utils.blob_store.print_logging')
+    def test_remove_unreferenced_blobs_skips_recently_touched_files(self, mock_print_logging, mock_delete, tmp_path):
+        old_blob = tmp_path / "old"
+        old_blob.write_bytes(b"old")
+        os.utime(old_blob, (time.time() - 7200, time.time() - 7200))
+        fresh_blob = tmp_path / "fresh"
+        fresh_blob.write_bytes(b"fresh")
+        kept = []
+        mock_delete.side_effect = lambda grace_seconds, limit, remove_file: [
+            path for path in (str(old_blob), str(fresh_blob), str(tmp_path / "missing"))
+            if remove_file(path) or kept.append(path)
+        ]
+
+        removed = remove_unreferenced_blobs(grace_seconds=3600, limit=10)
+
+        assert removed == 2
+        assert not old_blob.exists()
+        assert fresh_blob.exists()
+        assert kept == [str(fresh_blob)]
+        assert mock_delete.call_args[0][:2] == (3600, 10)
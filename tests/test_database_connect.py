@@ -57,3 +57,100 @@ class TestDatabaseConnect:
 
         mock_print_logging.assert_called_once()
         assert result is None
+
+
+class TestDatabasePool:
+    def make_pool(self, mock_pool_cls, max_size=2, timeout=0.01):
+        from app.database.connect import DatabasePool
+        mock_pool = MagicMock()
+        mock_pool._pool = []
+        mock_pool_cls.return_value = mock_pool
+        return DatabasePool(min_size=1, max_size=max_size, timeout=timeout, health_check_interval=30), mock_pool
+
+    @patch('app.database.connect.ThreadedConnectionPool')
+    def test_acquire_and_release(self, mock_pool_cls):
+        db_pool, mock_pool = self.make_pool(mock_pool_cls)
+        mock_conn = MagicMock()
+        mock_conn.closed = 0
+        mock_conn.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        mock_pool.getconn.return_value = mock_conn
+
+        conn = db_pool.acquire()
+
+        assert conn == mock_conn
+        assert db_pool.stats()["in_use"] == 1
+
+        db_pool.release(conn)
+
+        mock_pool.putconn.assert_called_once_with(mock_conn, close=False)
+        mock_conn.rollback.assert_called_once()
+        assert db_pool.stats()["in_use"] == 0
+        assert db_pool.stats()["total_checkouts"] == 1
+
+    @patch('app.database.connect.ThreadedConnectionPool')
+    def test_release_rolls_back_open_transaction(self, mock_pool_cls):
+        db_pool, mock_pool = self.make_pool(mock_pool_cls)
+        mock_conn = MagicMock()
+        mock_conn.closed = 0
+        mock_conn.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_INERROR
+        mock_pool.getconn.return_value = mock_conn
+
+        conn = db_pool.acquire()
+        mock_conn.rollback.reset_mock()
+        db_pool.release(conn)
+
+        mock_conn.rollback.assert_called_once()
+
+    @patch('app.database.connect.ThreadedConnectionPool')
+    def test_unhealthy_connection_is_replaced(self, mock_pool_cls):
+        db_pool, mock_pool = self.make_pool(mock_pool_cls)
+        dead_conn = MagicMock()
+        dead_conn.closed = 1
+        fresh_conn = MagicMock()
+        fresh_conn.closed = 0
+        mock_pool.getconn.side_effect = [dead_conn, fresh_conn]
+
+        conn = db_pool.acquire()
+
+        assert conn == fresh_conn
+        mock_pool.putconn.assert_called_once_with(dead_conn, close=True)
+        assert db_pool.stats()["total_health_check_failures"] == 1
+
+    @patch('app.database.connect.print_logging')
+    @patch('app.database.connect.ThreadedConnectionPool')
+    def test_acquire_times_out_when_saturated(self, mock_pool_cls, mock_print_logging):
+        db_pool, mock_pool = self.make_pool(mock_pool_cls, max_size=1)
+        mock_conn = MagicMock()
+        mock_conn.closed = 0
+        mock_pool.getconn.return_value = mock_conn
+
+        first = db_pool.acquire()
+        second = db_pool.acquire()
+
+        assert first == mock_conn
+        assert second is None
+        stats = db_pool.stats()
+        assert stats["saturation"] == 1
+        assert stats["total_waits"] == 1
+        assert stats["total_timeouts"] == 1
+
+    @patch('app.database.connect.db_pool')
+    def test_get_connection_context_manager(self, mock_db_pool):
+        from app.database.connect import get_connection
+        mock_conn = MagicMock()
+        mock_db_pool.acquire.return_value = mock_conn
+
+        with get_connection() as conn:
+            assert conn == mock_conn
+
+        mock_db_pool.release.assert_called_once_with(mock_conn)
+
+    @patch('app.database.connect.db_pool')
+    def test_get_connection_yields_none_when_unavailable(self, mock_db_pool):
+        from app.database.connect import get_connection
+        mock_db_pool.acquire.return_value = None
+
+        with get_connection() as conn:
+            assert conn is None
+
+        mock_db_pool.release.assert_not_called()
@@ -1,56 +1,57 @@
+import psycopg2
 import pytest
 from unittest.mock import patch, MagicMock, Mock
-from app.database.transactions import insert_email_queues, update_email_status, insert_email_attachments, is_has_file_attachments, check_email_type_registration
+from app.database.transactions import insert_email_queues, update_email_status, is_has_file_attachments, insert_email_queues_batch, claim_email_outbox, complete_email_outbox, delete_unreferenced_attachment_blobs, count_email_outbox_backlog, get_email_statuses
+
+
+@pytest.fixture(autouse=True)
+def mock_email_type_cache():
+    with patch('app.database.transactions.email_type_cache') as mock_cache:
+        mock_cache.get.return_value = None
+        yield mock_cache
 
 
 class TestInsertEmailQueues:
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_insert_email_queues_success(self, mock_print_logging, mock_connect):
+    def test_insert_email_queues_success(self, mock_print_logging, mock_get_connection, make_payload):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
-        mock_cursor.fetchone.side_effect = [[123], ('test@example.com', 'cc@example.com', 'bcc@example.com')]
+        mock_cursor.fetchone.return_value = (123, 'test@example.com', 'cc@example.com', 'bcc@example.com')
 
-        payload = Mock()
-        payload.email_type = 'welcome'
-        payload.subject = 'Test Subject'
-        payload.email_template = 'welcome_email'
-        payload.email_data = {'name': 'John'}
-        payload.priority_level = 1
-        payload.to_address = None
-        payload.cc_addresses = None
-        payload.bcc_addresses = None
-
-        result = insert_email_queues(payload)
+        result = insert_email_queues(make_payload())
 
         assert result is not False
         assert result['id'] == 123
         assert result['email_type'] == 'welcome'
         assert result['to_address'] == 'test@example.com'
+        mock_cursor.execute.assert_called_once()
+        params = mock_cursor.execute.call_args[0][1]
+        assert params['to_address'] is None
+        assert params['cc_addresses'] is None
         mock_conn.commit.assert_called_once()
 
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_insert_email_queues_with_custom_addresses(self, mock_print_logging, mock_connect):
+    def test_insert_email_queues_with_custom_addresses(self, mock_print_logging, mock_get_connection, make_payload):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
-        mock_cursor.fetchone.side_effect = [[123], ('test@example.com', 'cc@example.com', 'bcc@example.com')]
-
-        payload = Mock()
-        payload.email_type = 'welcome'
-        payload.subject = 'Test Subject'
-        payload.email_template = 'welcome_email'
-        payload.email_data = {'name': 'John'}
-        payload.priority_level = 1
-        payload.to_address = ['custom@example.com']
-        payload.cc_addresses = ['customcc@example.com', 'customcc2@example.com']
-        payload.bcc_addresses = ['custombcc@example.com']
+        mock_cursor.fetchone.return_value = (
+            123,
+            ['custom@example.com'],
+            ['customcc@example.com', 'customcc2@example.com'],
+            ['custombcc@example.com']
+        )
 
-        result = insert_email_queues(payload)
+        result = insert_email_queues(make_payload(
+            to_addresses=['custom@example.com'],
+            cc_addresses=['customcc@example.com', 'customcc2@example.com'],
+            bcc_addresses=['custombcc@example.com']
+        ))
 
         assert result is not False
         assert result['id'] == 123
@@ -58,166 +59,241 @@ class TestInsertEmailQueues:
         assert result['to_address'] == ['custom@example.com']
         assert result['cc_addresses'] == ['customcc@example.com', 'customcc2@example.com']
         assert result['bcc_addresses'] == ['custombcc@example.com']
+        params = mock_cursor.execute.call_args[0][1]
+        assert params['to_address'] == ['custom@example.com']
+        assert params['bcc_addresses'] == ['custombcc@example.com']
         mock_conn.commit.assert_called_once()
 
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_insert_email_queues_connection_failure(self, mock_print_logging, mock_connect):
-        mock_connect.return_value = None
+    def test_insert_email_queues_unregistered_type(self, mock_print_logging, mock_get_connection, make_payload):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.fetchone.return_value = None
 
-        payload = Mock()
-        payload.email_type = 'welcome'
-        payload.subject = 'Test'
-        payload.email_template = 'test'
-        payload.email_data = {}
-        payload.priority_level = 1
-        payload.to_address = None
-        payload.cc_addresses = None
-        payload.bcc_addresses = None
+        result = insert_email_queues(make_payload())
+
+        assert result is None
+        mock_cursor.execute.assert_called_once()
+
+    @patch('app.database.transactions.get_connection')
+    @patch('app.database.transactions.print_logging')
+    def test_insert_email_queues_connection_failure(self, mock_print_logging, mock_get_connection, make_payload):
+        mock_get_connection.return_value.__enter__.return_value = None
 
-        result = insert_email_queues(payload)
+        result = insert_email_queues(make_payload())
 
         assert result is False
         mock_print_logging.assert_called_once()
 
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_insert_email_queues_exception(self, mock_print_logging, mock_connect):
+    def test_insert_email_queues_exception(self, mock_print_logging, mock_get_connection, make_payload):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         mock_cursor.execute.side_effect = Exception('Database error')
 
-        payload = Mock()
-        payload.email_type = 'welcome'
-        payload.subject = 'Test'
-        payload.email_template = 'test'
-        payload.email_data = {}
-        payload.priority_level = 1
-        payload.to_address = None
-        payload.cc_addresses = None
-        payload.bcc_addresses = None
-
-        result = insert_email_queues(payload)
+        result = insert_email_queues(make_payload())
 
         assert result is False
         mock_print_logging.assert_called()
         mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
+        mock_get_connection.return_value.__exit__.assert_called_once()
+
+
+    @patch('app.database.transactions.execute_values')
+    @patch('app.database.transactions.get_connection')
+    @patch('app.database.transactions.print_logging')
+    def test_insert_email_queues_references_attachments_in_same_transaction(self, mock_print_logging, mock_get_connection, mock_execute_values, make_payload):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.fetchone.return_value = ("email-1", ["to@example.com"], None, None)
+        attachment = {"file_name": "a.pdf", "file_path": "uploads/blobs/ab/cd/abcd", "mime_type": "application/pdf", "file_size": 10, "checksum": "abcd"}
+        copy = dict(attachment, file_name="copy.pdf")
+
+        result = insert_email_queues(make_payload(), attachments=[attachment, copy])
+
+        assert result["id"] == "email-1"
+        assert mock_execute_values.call_count == 2
+        blob_query, blob_rows = mock_execute_values.call_args_list[0][0][1:3]
+        assert "EXCLUDED.ref_count" in blob_query
+        assert blob_rows == [("abcd", "uploads/blobs/ab/cd/abcd", "application/pdf", 10, 2)]
+        attachment_rows = mock_execute_values.call_args_list[1][0][2]
+        assert [row[1] for row in attachment_rows] == ["a.pdf", "copy.pdf"]
+        assert all(row[0] == "email-1" for row in attachment_rows)
+        mock_conn.commit.assert_called_once()
+
+    @patch('app.database.transactions.execute_values')
+    @patch('app.database.transactions.get_connection')
+    @patch('app.database.transactions.print_logging')
+    def test_insert_email_queues_publishes_attachment_manifest(self, mock_print_logging, mock_get_connection, mock_execute_values, make_payload):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.fetchone.return_value = ("email-1", ["to@example.com"], None, None)
+        attachment = {"file_name": "a.pdf", "file_path": "uploads/blobs/ab/cd/abcd", "mime_type": "application/pdf", "file_size": 10, "checksum": "abcd", "temp_path": "ignored"}
+
+        result = insert_email_queues(make_payload(), attachments=[attachment])
 
+        params = mock_cursor.execute.call_args[0][1]
+        expected = [{"file_name": "a.pdf", "file_path": "uploads/blobs/ab/cd/abcd", "mime_type": "application/pdf", "file_size": 10, "checksum": "abcd"}]
+        assert params["has_attachments"] is True
+        assert params["attachments"].adapted == expected
+        assert result["attachments"] == expected
+        assert result["has_attachments"] is True
+
+    @patch('app.database.transactions.get_connection')
+    @patch('app.database.transactions.print_logging')
+    def test_insert_email_queues_without_attachments_has_empty_manifest(self, mock_print_logging, mock_get_connection, make_payload):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.fetchone.return_value = ("email-1", ["to@example.com"], None, None)
+
+        result = insert_email_queues(make_payload())
+
+        assert mock_cursor.execute.call_args[0][1]["has_attachments"] is False
+        assert result["attachments"] == []
+
+    @patch('app.database.transactions.execute_values')
+    @patch('app.database.transactions.get_connection')
+    @patch('app.database.transactions.print_logging')
+    def test_insert_email_queues_attachment_failure_does_not_commit(self, mock_print_logging, mock_get_connection, mock_execute_values, make_payload):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.fetchone.return_value = ("email-1", ["to@example.com"], None, None)
+        mock_execute_values.side_effect = Exception("Insert failed")
+        attachment = {"file_name": "a.pdf", "file_path": "uploads/blobs/ab/cd/abcd", "mime_type": "application/pdf", "file_size": 10, "checksum": "abcd"}
+
+        result = insert_email_queues(make_payload(), attachments=[attachment])
+
+        assert result is False
+        mock_conn.commit.assert_not_called()
 
 class TestUpdateEmailStatus:
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_update_email_status_success(self, mock_print_logging, mock_connect):
+    def test_update_email_status_success(self, mock_print_logging, mock_get_connection):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
 
-        update_email_status(1, 123)
+        assert update_email_status(1, 123) is True
 
         mock_cursor.execute.assert_called_once()
+        assert "pg_notify('email_status'" in mock_cursor.execute.call_args[0][0]
         mock_conn.commit.assert_called_once()
         mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
+        mock_get_connection.return_value.__exit__.assert_called_once()
 
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_update_email_status_connection_failure(self, mock_print_logging, mock_connect):
-        mock_connect.return_value = None
+    def test_update_email_status_connection_failure(self, mock_print_logging, mock_get_connection):
+        mock_get_connection.return_value.__enter__.return_value = None
 
-        update_email_status(1, 123)
+        assert update_email_status(1, 123) is False
 
         mock_print_logging.assert_called_once()
 
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_update_email_status_exception(self, mock_print_logging, mock_connect):
+    def test_update_email_status_exception(self, mock_print_logging, mock_get_connection):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         mock_cursor.execute.side_effect = Exception('Update failed')
 
-        update_email_status(1, 123)
+        assert update_email_status(1, 123) is False
 
         mock_print_logging.assert_called_once()
         mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
+        mock_get_connection.return_value.__exit__.assert_called_once()
 
 
-class TestInsertEmailAttachments:
-    @patch('app.database.transactions.connect')
+class TestGetEmailStatuses:
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_insert_email_attachments_success(self, mock_print_logging, mock_connect):
+    def test_get_email_statuses(self, mock_print_logging, mock_get_connection):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
-        mock_cursor.fetchone.return_value = [456]
-
-        insert_email_attachments(
-            email_queue_id=123,
-            file_name='test.pdf',
-            file_path='/uploads/test.pdf',
-            mime_type='application/pdf',
-            file_size=1024,
-            checksum='abc123'
-        )
+        mock_cursor.fetchall.return_value = [('email-1', 1, 'created', 'sent')]
 
-        mock_cursor.execute.assert_called_once()
-        mock_conn.commit.assert_called_once()
-        mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
+        result = get_email_statuses(['email-1', 'email-2'])
+
+        assert result == {'email-1': {'id': 'email-1', 'status': 1, 'created_at': 'created', 'sent_at': 'sent'}}
+        assert mock_cursor.execute.call_args[0][1] == (['email-1', 'email-2'],)
 
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_insert_email_attachments_connection_failure(self, mock_print_logging, mock_connect):
-        mock_connect.return_value = None
-
-        insert_email_attachments(
-            email_queue_id=123,
-            file_name='test.pdf',
-            file_path='/uploads/test.pdf',
-            mime_type='application/pdf',
-            file_size=1024,
-            checksum='abc123'
-        )
+    def test_get_email_statuses_connection_failure(self, mock_print_logging, mock_get_connection):
+        mock_get_connection.return_value.__enter__.return_value = None
 
+        assert get_email_statuses(['email-1']) is False
         mock_print_logging.assert_called_once()
 
-    @patch('app.database.transactions.connect')
+
+class TestDeleteUnreferencedAttachmentBlobs:
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_insert_email_attachments_exception(self, mock_print_logging, mock_connect):
+    def test_delete_unreferenced_attachment_blobs_returns_paths(self, mock_print_logging, mock_get_connection):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
-        mock_cursor.execute.side_effect = Exception('Insert failed')
-
-        insert_email_attachments(
-            email_queue_id=123,
-            file_name='test.pdf',
-            file_path='/uploads/test.pdf',
-            mime_type='application/pdf',
-            file_size=1024,
-            checksum='abc123'
-        )
+        mock_cursor.fetchall.return_value = [('abcd1', 'uploads/blobs/ab/cd/abcd1'), ('ef012', 'uploads/blobs/ef/01/ef012')]
+        order = []
 
-        mock_print_logging.assert_called_once()
-        mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
+        def remove_file(file_path):
+            order.append(('unlink', file_path))
+            return file_path.endswith('abcd1')
+
+        mock_cursor.execute.side_effect = lambda query, params: order.append(('execute', query.split()[0]))
 
+        result = delete_unreferenced_attachment_blobs(3600, 100, remove_file)
+
+        assert result == ['uploads/blobs/ab/cd/abcd1']
+        assert order == [
+            ('execute', 'SELECT'),
+            ('unlink', 'uploads/blobs/ab/cd/abcd1'),
+            ('unlink', 'uploads/blobs/ef/01/ef012'),
+            ('execute', 'DELETE')
+        ]
+        select_query, select_params = mock_cursor.execute.call_args_list[0][0]
+        assert 'ref_count <= 0' in select_query
+        assert 'FOR UPDATE SKIP LOCKED' in select_query
+        assert select_params == (3600, 100)
+        assert mock_cursor.execute.call_args_list[1][0][1] == (['abcd1'],)
+        mock_conn.commit.assert_called_once()
+
+    @patch('app.database.transactions.get_connection')
+    @patch('app.database.transactions.print_logging')
+    def test_delete_unreferenced_attachment_blobs_connection_failure(self, mock_print_logging, mock_get_connection):
+        mock_get_connection.return_value.__enter__.return_value = None
+
+        assert delete_unreferenced_attachment_blobs(3600, 100, MagicMock()) == []
+        mock_print_logging.assert_called_once()
 
 class TestIsHasFileAttachments:
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_is_has_file_attachments_success(self, mock_print_logging, mock_connect):
+    def test_is_has_file_attachments_success(self, mock_print_logging, mock_get_connection):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         mock_cursor.fetchall.return_value = [
             ('test.pdf', '/uploads/test.pdf'),
@@ -230,14 +306,14 @@ class TestIsHasFileAttachments:
         assert result[0]['file_name'] == 'test.pdf'
         assert result[1]['file_path'] == '/uploads/doc.pdf'
         mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
+        mock_get_connection.return_value.__exit__.assert_called_once()
 
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_is_has_file_attachments_no_attachments(self, mock_print_logging, mock_connect):
+    def test_is_has_file_attachments_no_attachments(self, mock_print_logging, mock_get_connection):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         mock_cursor.fetchall.return_value = []
 
@@ -245,24 +321,24 @@ class TestIsHasFileAttachments:
 
         assert result == []
         mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
+        mock_get_connection.return_value.__exit__.assert_called_once()
 
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_is_has_file_attachments_connection_failure(self, mock_print_logging, mock_connect):
-        mock_connect.return_value = None
+    def test_is_has_file_attachments_connection_failure(self, mock_print_logging, mock_get_connection):
+        mock_get_connection.return_value.__enter__.return_value = None
 
         result = is_has_file_attachments(123)
 
         assert result == []
         mock_print_logging.assert_called_once()
 
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_is_has_file_attachments_exception(self, mock_print_logging, mock_connect):
+    def test_is_has_file_attachments_exception(self, mock_print_logging, mock_get_connection):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         mock_cursor.execute.side_effect = Exception('Query failed')
 
@@ -271,65 +347,156 @@ class TestIsHasFileAttachments:
         assert result == []
         mock_print_logging.assert_called_once()
         mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
+        mock_get_connection.return_value.__exit__.assert_called_once()
+
 
+class TestInsertEmailQueuesBatch:
+    @patch('app.database.transactions.execute_values')
+    @patch('app.database.transactions.get_connection')
+    @patch('app.database.transactions.print_logging')
+    def test_insert_email_queues_batch_success(self, mock_print_logging, mock_get_connection, mock_execute_values, make_payload):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_execute_values.return_value = [(1,), (2,)]
+        mock_cursor.fetchall.return_value = [('welcome', ['default@example.com'], None, None)]
+
+        result = insert_email_queues_batch([
+            make_payload(),
+            make_payload(to_addresses=['custom@example.com'])
+        ])
+
+        assert [r['id'] for r in result] == [1, 2]
+        assert result[0]['to_address'] == ['default@example.com']
+        assert result[1]['to_address'] == ['custom@example.com']
+        assert mock_execute_values.call_count == 2
+        queue_call, outbox_call = mock_execute_values.call_args_list
+        assert len(queue_call[0][2]) == 2
+        assert queue_call[1]['page_size'] == 2
+        assert 'email_outbox' in outbox_call[0][1]
+        assert [row[0] for row in outbox_call[0][2]] == [1, 2]
+        assert outbox_call[0][2][0][2].adapted['email_data'] == {'name': 'John'}
+        mock_conn.commit.assert_called_once()
 
-class TestCheckEmailTypeRegistration:
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.execute_values')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_check_email_type_registration_exists(self, mock_print_logging, mock_connect):
+    def test_insert_email_queues_batch_exception(self, mock_print_logging, mock_get_connection, mock_execute_values, make_payload):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
-        mock_cursor.fetchall.return_value = [(1,)]
+        mock_execute_values.side_effect = Exception('Insert failed')
 
-        result = check_email_type_registration('welcome')
+        result = insert_email_queues_batch([make_payload()])
 
-        assert result is True
-        mock_cursor.execute.assert_called_once_with("SELECT 1 FROM email_types WHERE type = %s", ('welcome',))
+        assert result is False
+        mock_conn.commit.assert_not_called()
         mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
 
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.execute_values')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_check_email_type_registration_not_exists(self, mock_print_logging, mock_connect):
+    def test_insert_email_queues_batch_constraint_violation(self, mock_print_logging, mock_get_connection, mock_execute_values, make_payload):
+        mock_conn = MagicMock()
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        mock_execute_values.side_effect = psycopg2.errors.ForeignKeyViolation('email_type not present')
+
+        assert insert_email_queues_batch([make_payload()]) is None
+        mock_conn.commit.assert_not_called()
+
+    def test_insert_email_queues_batch_empty(self):
+        assert insert_email_queues_batch([]) == []
+
+
+class TestEmailOutbox:
+    @patch('app.database.transactions.get_connection')
+    @patch('app.database.transactions.print_logging')
+    def test_insert_email_queues_writes_outbox_in_same_statement(self, mock_print_logging, mock_get_connection):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
-        mock_cursor.fetchall.return_value = []
+        mock_cursor.fetchone.return_value = (123, None, None, None)
 
-        result = check_email_type_registration('unregistered_type')
+        payload = Mock()
+        payload.email_type = 'welcome'
+        payload.subject = 'Test Subject'
+        payload.email_template = 'welcome_email'
+        payload.email_data = {}
+        payload.priority_level = 1
+        payload.to_addresses = None
+        payload.cc_addresses = None
+        payload.bcc_addresses = None
 
-        assert result is False
-        mock_cursor.execute.assert_called_once_with("SELECT 1 FROM email_types WHERE type = %s", ('unregistered_type',))
-        mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
+        insert_email_queues(payload)
 
-    @patch('app.database.transactions.connect')
+        mock_cursor.execute.assert_called_once()
+        query, params = mock_cursor.execute.call_args[0]
+        assert 'INSERT INTO email_outbox' in query
+        mock_conn.commit.assert_called_once()
+
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_check_email_type_registration_connection_failure(self, mock_print_logging, mock_connect):
-        mock_connect.return_value = None
+    def test_claim_email_outbox(self, mock_print_logging, mock_get_connection):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.fetchall.return_value = [
+            (1, 'email-1', 5, {'id': 'email-1'}, 0),
+            (3, 'email-3', 1, {'id': 'email-3'}, 1),
+            (2, 'email-2', 1, {'id': 'email-2'}, 0)
+        ]
 
-        result = check_email_type_registration('welcome')
+        result = claim_email_outbox(limit=10, lease_seconds=60)
 
-        assert result is False
+        assert [message['id'] for message in result] == [2, 3, 1]
+        assert result[0]['payload'] == {'id': 'email-2'}
+        assert 'ORDER BY priority_level, id' in mock_cursor.execute.call_args[0][0]
+        assert mock_cursor.execute.call_args[0][1]['limit'] == 10
+        mock_conn.commit.assert_called_once()
+
+    @patch('app.database.transactions.get_connection')
+    @patch('app.database.transactions.print_logging')
+    def test_claim_email_outbox_connection_failure(self, mock_print_logging, mock_get_connection):
+        mock_get_connection.return_value.__enter__.return_value = None
+
+        assert claim_email_outbox(limit=10, lease_seconds=60) == []
         mock_print_logging.assert_called_once()
-        assert "Database connection unavailable" in mock_print_logging.call_args[0][1]
 
-    @patch('app.database.transactions.connect')
+    @patch('app.database.transactions.execute_batch')
+    @patch('app.database.transactions.get_connection')
     @patch('app.database.transactions.print_logging')
-    def test_check_email_type_registration_exception(self, mock_print_logging, mock_connect):
+    def test_complete_email_outbox(self, mock_print_logging, mock_get_connection, mock_execute_batch):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_connect.return_value = mock_conn
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
-        mock_cursor.execute.side_effect = Exception('Database query failed')
 
-        result = check_email_type_registration('welcome')
+        result = complete_email_outbox([1, 2], [(3, 'nack')], retry_delay_seconds=5, max_retry_delay_seconds=300)
 
-        assert result is False
+        assert result is True
+        assert mock_cursor.execute.call_args[0][1] == ([1, 2],)
+        assert mock_execute_batch.call_args[0][2] == [('nack', 5, 300, 3)]
+        mock_conn.commit.assert_called_once()
+
+    @patch('app.database.transactions.get_connection')
+    @patch('app.database.transactions.print_logging')
+    def test_count_email_outbox_backlog(self, mock_print_logging, mock_get_connection):
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_get_connection.return_value.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.fetchall.return_value = [(1, 4), (3, 120)]
+
+        assert count_email_outbox_backlog() == {1: 4, 3: 120}
+
+    @patch('app.database.transactions.get_connection')
+    @patch('app.database.transactions.print_logging')
+    def test_count_email_outbox_backlog_connection_failure(self, mock_print_logging, mock_get_connection):
+        mock_get_connection.return_value.__enter__.return_value = None
+
+        assert count_email_outbox_backlog() is None
         mock_print_logging.assert_called_once()
-        mock_cursor.close.assert_called_once()
-        mock_conn.close.assert_called_once()
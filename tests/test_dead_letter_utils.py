@@ -0,0 +1,164 @@
+import json
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+from app.utils.dead_letter_utils import (
+    dead_letter_policy, failure_headers, failed_at, matches_filters, replay_headers,
+    inspect_dead_letters, replay_dead_letters
+)
+
+
+def make_channel(dead_letters):
+    channel = MagicMock()
+    channel.queue_declare.return_value.method.message_count = len(dead_letters)
+    channel.basic_get.side_effect = dead_letters + [(None, None, None)]
+    return channel
+
+
+def published(channel, routing_key):
+    return [int(c.kwargs['body'].split(b'-')[1]) for c in channel.basic_publish.call_args_list if c.kwargs['routing_key'] == routing_key]
+
+
+class TestFailureHeaders:
+    def test_policy_dead_letters_queue_to_its_own_exchange(self):
+        *options, name, pattern, definition = dead_letter_policy('email.high')
+
+        assert name == 'email.high-dlx'
+        assert pattern == '^email\\.high$'
+        assert json.loads(definition) == {'dead-letter-exchange': 'email.high.dlx', 'dead-letter-routing-key': 'email.high'}
+        assert options == ['--apply-to', 'queues']
+
+    @patch('app.utils.dead_letter_utils.time.time', return_value=1700000000.5)
+    def test_failure_headers_keep_original_headers(self, mock_time):
+        headers = failure_headers(
+            {'x-envelope-version': 2, 'x-attempt': 5}, 'email.low', 'retries_exhausted',
+            ConnectionRefusedError('Connection refused'), {'id': 'email-1', 'email_type': 'welcome'}
+        )
+
+        assert headers == {
+            'x-envelope-version': 2,
+            'x-attempt': 5,
+            'x-failure-reason': 'retries_exhausted',
+            'x-error': 'Connection refused',
+            'x-failed-at': 1700000000,
+            'x-source-queue': 'email.low',
+            'x-email-id': 'email-1',
+            'x-email-type': 'welcome'
+        }
+
+    def test_failure_headers_truncate_long_errors(self):
+        headers = failure_headers(None, 'email.low', 'processing_error', 'x' * 5000)
+
+        assert len(headers['x-error']) == 1000
+
+    def test_failed_at_falls_back_to_broker_x_death(self):
+        headers = {'x-death': [{'queue': 'email.high', 'reason': 'rejected', 'time': datetime(2023, 11, 14, 22, 13, 20)}]}
+
+        assert failed_at(headers) == 1700000000
+        assert failed_at({}) is None
+
+    def test_replay_headers_drop_failure_details_and_attempt(self):
+        headers = failure_headers({'x-envelope-version': 2, 'x-attempt': 5}, 'email.low', 'smtp_permanent', 'rejected')
+        headers['x-death'] = []
+
+        assert replay_headers(headers) == {'x-envelope-version': 2}
+
+
+class TestMatchesFilters:
+    HEADERS = {
+        'x-failure-reason': 'retries_exhausted',
+        'x-error': 'Connection refused',
+        'x-failed-at': 1000,
+        'x-email-type': 'welcome'
+    }
+
+    def test_no_filters_match_everything(self):
+        assert matches_filters(self.HEADERS)
+        assert matches_filters(None)
+
+    def test_email_type_reason_and_error(self):
+        assert matches_filters(self.HEADERS, email_type='welcome', reason='retries_exhausted', error='REFUSED')
+        assert not matches_filters(self.HEADERS, email_type='invoice')
+        assert not matches_filters(self.HEADERS, reason='smtp_permanent')
+        assert not matches_filters(self.HEADERS, error='timeout')
+
+    def test_age_range(self):
+        assert matches_filters(self.HEADERS, min_age=50, max_age=200, now=1100)
+        assert not matches_filters(self.HEADERS, min_age=200, now=1100)
+        assert not matches_filters(self.HEADERS, max_age=50, now=1100)
+        assert not matches_filters({}, min_age=0, now=1100)
+
+
+class TestDeadLetterTool:
+    def test_inspect_returns_matches_and_releases_all(self, make_delivery):
+        channel = make_channel([
+            make_delivery(delivery_tag=1, headers={'x-email-type': 'welcome', 'x-failure-reason': 'smtp_permanent', 'x-email-id': 'email-1'}),
+            make_delivery(delivery_tag=2, headers={'x-email-type': 'invoice', 'x-failure-reason': 'smtp_permanent'})
+        ])
+
+        dead_letters = inspect_dead_letters(channel, 'email.high', {'email_type': 'welcome'})
+
+        assert [d['email_id'] for d in dead_letters] == ['email-1']
+        channel.queue_declare.assert_called_once_with(queue='email.high.dlq', passive=True)
+        channel.basic_ack.assert_not_called()
+        channel.basic_nack.assert_called_once_with(delivery_tag=0, multiple=True, requeue=True)
+
+    def test_replay_publishes_matches_to_live_queue(self, make_delivery):
+        channel = make_channel([
+            make_delivery(delivery_tag=1, headers={'x-email-type': 'welcome', 'x-attempt': 5, 'x-envelope-version': 2}),
+            make_delivery(delivery_tag=2, headers={'x-email-type': 'invoice'})
+        ])
+
+        replayed = replay_dead_letters(channel, 'email.high', {'email_type': 'welcome'})
+
+        assert replayed == 1
+        publish = channel.basic_publish.call_args_list[0].kwargs
+        assert publish['exchange'] == ''
+        assert publish['routing_key'] == 'email.high'
+        assert publish['body'] == b'body-1'
+        assert publish['properties'].headers == {'x-envelope-version': 2}
+        channel.basic_ack.assert_any_call(delivery_tag=1)
+
+    def test_replay_moves_non_matching_to_back_of_dead_letter_queue(self, make_delivery):
+        skipped = make_delivery(delivery_tag=1, headers={'x-email-type': 'invoice', 'x-failure-reason': 'smtp_permanent'})
+        channel = make_channel([skipped, make_delivery(delivery_tag=2, headers={'x-email-type': 'welcome'})])
+
+        replay_dead_letters(channel, 'email.high', {'email_type': 'welcome'})
+
+        channel.basic_publish.assert_any_call(exchange='', routing_key='email.high.dlq', body=b'body-1', properties=skipped[1])
+        assert channel.basic_ack.call_args_list[0].kwargs == {'delivery_tag': 1}
+        assert channel.basic_ack.call_count == 2
+
+    def test_unfiltered_replay_leaves_already_sent_emails_in_dead_letter_queue(self, make_delivery):
+        sent = make_delivery(delivery_tag=1, headers={'x-failure-reason': 'status_update_failed'})
+        channel = make_channel([sent, make_delivery(delivery_tag=2, headers={'x-failure-reason': 'retries_exhausted'})])
+
+        assert replay_dead_letters(channel, 'email.high', {}) == 1
+
+        assert published(channel, 'email.high') == [2]
+        channel.basic_publish.assert_any_call(exchange='', routing_key='email.high.dlq', body=b'body-1', properties=sent[1])
+
+    def test_already_sent_emails_are_replayed_when_named(self, make_delivery):
+        channel = make_channel([make_delivery(delivery_tag=1, headers={'x-failure-reason': 'status_update_failed'})])
+
+        assert replay_dead_letters(channel, 'email.high', {'reason': 'status_update_failed'}) == 1
+
+        channel = make_channel([make_delivery(delivery_tag=1, headers={'x-failure-reason': 'status_update_failed'})])
+
+        assert replay_dead_letters(channel, 'email.high', {}, include_sent=True) == 1
+
+    @patch('app.utils.dead_letter_utils.print_logging')
+    @patch('app.utils.dead_letter_utils.time.sleep')
+    def test_replay_is_throttled_per_batch(self, mock_sleep, mock_logging, make_delivery):
+        channel = make_channel([make_delivery(delivery_tag=tag, headers={}) for tag in range(1, 6)])
+
+        replayed = replay_dead_letters(channel, 'email.high', {}, batch_size=2, rate_per_second=1)
+
+        assert replayed == 5
+        assert mock_sleep.call_count == 2
+        assert all(1.9 < c.args[0] <= 2 for c in mock_sleep.call_args_list)
+
+    def test_replay_respects_limit(self, make_delivery):
+        channel = make_channel([make_delivery(delivery_tag=tag, headers={}) for tag in range(1, 6)])
+
+        assert replay_dead_letters(channel, 'email.high', {}, limit=3) == 3
+        assert channel.basic_get.call_count == 3
@@ -0,0 +1,97 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from app.database.email_type_cache import EmailTypeCache
+
+
+def mock_connection(mock_get_connection, rows):
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_get_connection.return_value.__enter__.return_value = mock_conn
+    mock_conn.cursor.return_value = mock_cursor
+    mock_cursor.fetchall.return_value = rows
+    return mock_cursor
+
+
+class TestEmailTypeCache:
+    @patch('app.database.email_type_cache.get_connection')
+    @patch('app.database.email_type_cache.print_logging')
+    def test_get_loads_once_and_serves_from_memory(self, mock_print_logging, mock_get_connection):
+        mock_cursor = mock_connection(mock_get_connection, [('welcome', ['to@example.com'], None, ['bcc@example.com'], None, 1)])
+        cache = EmailTypeCache(ttl=300, miss_reload_interval=5)
+
+        first = cache.get('welcome')
+        second = cache.get('welcome')
+
+        assert first == {'to_address': ['to@example.com'], 'cc_addresses': None, 'bcc_addresses': ['bcc@example.com'], 'quota_per_minute': None, 'quota_weight': 1}
+        assert second == first
+        mock_cursor.execute.assert_called_once()
+        assert cache.stats()['hits'] == 2
+
+    @patch('app.database.email_type_cache.time.monotonic')
+    @patch('app.database.email_type_cache.get_connection')
+    @patch('app.database.email_type_cache.print_logging')
+    def test_get_reloads_after_ttl(self, mock_print_logging, mock_get_connection, mock_monotonic):
+        mock_cursor = mock_connection(mock_get_connection, [('welcome', None, None, None, None, 1)])
+        cache = EmailTypeCache(ttl=300, miss_reload_interval=5)
+
+        mock_monotonic.return_value = 1000
+        cache.get('welcome')
+        mock_monotonic.return_value = 1100
+        cache.get('welcome')
+        mock_monotonic.return_value = 1301
+        cache.get('welcome')
+
+        assert mock_cursor.execute.call_count == 2
+
+    @patch('app.database.email_type_cache.time.monotonic')
+    @patch('app.database.email_type_cache.get_connection')
+    @patch('app.database.email_type_cache.print_logging')
+    def test_miss_reloads_at_most_once_per_interval(self, mock_print_logging, mock_get_connection, mock_monotonic):
+        mock_cursor = mock_connection(mock_get_connection, [('welcome', None, None, None, None, 1)])
+        cache = EmailTypeCache(ttl=300, miss_reload_interval=5)
+
+        mock_monotonic.return_value = 1000
+        assert cache.is_registered('unknown') is False
+        mock_monotonic.return_value = 1002
+        assert cache.is_registered('unknown') is False
+        assert mock_cursor.execute.call_count == 1
+
+        mock_cursor.fetchall.return_value = [('welcome', None, None, None, None, 1), ('unknown', None, None, None, None, 1)]
+        mock_monotonic.return_value = 1010
+        assert cache.is_registered('unknown') is True
+        assert mock_cursor.execute.call_count == 2
+
+    @patch('app.database.email_type_cache.get_connection')
+    @patch('app.database.email_type_cache.print_logging')
+    def test_invalidate_reloads_rows(self, mock_print_logging, mock_get_connection):
+        mock_cursor = mock_connection(mock_get_connection, [('welcome', None, None, None, None, 1)])
+        cache = EmailTypeCache(ttl=300, miss_reload_interval=5)
+        cache.load()
+
+        mock_cursor.fetchall.return_value = []
+        cache.invalidate('welcome')
+
+        assert cache.stats()['size'] == 0
+        assert cache.stats()['reloads'] == 2
+
+    @patch('app.database.email_type_cache.get_connection')
+    @patch('app.database.email_type_cache.print_logging')
+    def test_failed_reload_keeps_previous_rows(self, mock_print_logging, mock_get_connection):
+        mock_cursor = mock_connection(mock_get_connection, [('welcome', None, None, None, None, 1)])
+        cache = EmailTypeCache(ttl=300, miss_reload_interval=5)
+        cache.load()
+
+        mock_cursor.execute.side_effect = Exception('Database query failed')
+
+        assert cache.load() is False
+        assert cache.is_registered('welcome') is True
+        assert cache.stats()['reload_failures'] == 1
+
+    @patch('app.database.email_type_cache.get_connection')
+    @patch('app.database.email_type_cache.print_logging')
+    def test_connection_unavailable(self, mock_print_logging, mock_get_connection):
+        mock_get_connection.return_value.__enter__.return_value = None
+        cache = EmailTypeCache(ttl=300, miss_reload_interval=5)
+
+        assert cache.load() is False
+        assert cache.is_registered('welcome') is False
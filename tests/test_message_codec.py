@@ -0,0 +1,81 @@
+import gzip
+import json
+import pytest
+from app.utils.message_codec import MessageCodec
+
+
+def large_payload():
+    return {'id': 'email-1', 'email_data': {'rows': [{'name': 'item', 'value': i} for i in range(2000)]}}
+
+
+def make_codec(message_format='msgpack', compression='zstd', threshold=1024, level=3):
+    return MessageCodec(message_format=message_format, compression=compression, threshold=threshold, level=level)
+
+
+def decode(body, properties):
+    return MessageCodec.decode(body, properties['content_type'], properties['content_encoding'], properties['headers'])
+
+
+class TestMessageCodec:
+    def test_small_message_is_not_compressed(self):
+        codec = make_codec()
+
+        body, properties = codec.encode({'id': 'email-1'})
+
+        assert properties['content_encoding'] is None
+        assert decode(body, properties) == {'id': 'email-1'}
+
+    @pytest.mark.parametrize('compression', ['zstd', 'gzip'])
+    def test_large_message_round_trips_compressed(self, compression):
+        codec = make_codec(compression=compression)
+
+        body, properties = codec.encode(large_payload())
+
+        assert properties['content_encoding'] == compression
+        assert decode(body, properties) == large_payload()
+
+    def test_decode_ignores_local_settings(self):
+        body, properties = make_codec(message_format='json', compression='gzip', threshold=0, level=6).encode(large_payload())
+
+        assert properties['content_type'] == 'application/json'
+        assert make_codec(compression='none').decode(body, properties['content_type'], properties['content_encoding'], properties['headers']) == large_payload()
+
+    def test_msgpack_envelope_carries_native_values_and_version(self):
+        email_data = {'id': 'email-1', 'email_data': {'total': 12.5, 'items': [1, 2]}, 'to_address': ['a@example.com'], 'cc_addresses': None}
+
+        body, properties = make_codec().encode(email_data)
+
+        assert properties['content_type'] == 'application/msgpack'
+        assert properties['headers'] == {'x-envelope-version': 2}
+        assert len(body) < len(json.dumps(email_data))
+        assert decode(body, properties) == email_data
+
+    def test_legacy_json_message_without_properties_decodes(self):
+        legacy = json.dumps({'id': 'email-1', 'email_data': '{"name": "John"}'}).encode('utf-8')
+
+        assert MessageCodec.decode(legacy) == {'id': 'email-1', 'email_data': '{"name": "John"}'}
+
+    def test_incompressible_body_is_sent_as_is(self):
+        assert make_codec(threshold=0).encode({'id': 'x'})[1]['content_encoding'] is None
+
+    def test_stats_report_ratio_and_bytes_saved(self):
+        codec = make_codec()
+        codec.encode({'id': 'email-1'})
+        codec.encode(large_payload())
+
+        stats = codec.stats()
+
+        assert stats['messages'] == 2
+        assert stats['compressed'] == 1
+        assert stats['bytes_saved'] == stats['raw_bytes'] - stats['encoded_bytes'] > 0
+        assert stats['compression_ratio'] > 1
+
+    def test_unknown_settings_are_rejected(self):
+        with pytest.raises(ValueError):
+            make_codec(compression='brotli')
+        with pytest.raises(ValueError):
+            make_codec(message_format='xml')
+        with pytest.raises(ValueError):
+            MessageCodec.decode(b'{}', None, 'brotli')
+        with pytest.raises(ValueError):
+            MessageCodec.decode(gzip.compress(b'{}'), None, 'gzip', {'x-envelope-version': 3})
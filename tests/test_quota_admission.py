@@ -0,0 +1,137 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from app.utils.quota_admission import QuotaAdmission, get_client_id, parse_trusted_proxies
+from app.utils.rate_limiter import MemoryRateLimitBackend
+
+
+def make_admission(rows, client_per_minute=0, fair_share_per_minute=0, window_seconds=60):
+    type_cache = MagicMock()
+    type_cache.get.side_effect = lambda email_type: rows.get(email_type)
+    return QuotaAdmission(
+        backend=MemoryRateLimitBackend(),
+        type_cache=type_cache,
+        client_per_minute=client_per_minute,
+        fair_share_per_minute=fair_share_per_minute,
+        window_seconds=window_seconds
+    )
+
+
+class TestQuotaAdmission:
+    @patch('app.utils.quota_admission.time.time')
+    def test_email_type_quota_is_shared_by_all_clients(self, mock_time):
+        mock_time.return_value = 1000.0
+        admission = make_admission({'newsletter': {'quota_per_minute': 2, 'quota_weight': 1}})
+
+        results = [admission.admit(client, 'newsletter')[0] for client in ('a', 'b', 'c')]
+
+        assert results == [True, True, False]
+
+    @patch('app.utils.quota_admission.time.time')
+    def test_no_quota_configured_admits_everything(self, mock_time):
+        mock_time.return_value = 1000.0
+        admission = make_admission({'welcome': {'quota_per_minute': None, 'quota_weight': 1}})
+
+        assert all(admission.admit('a', 'welcome')[0] for _ in range(100))
+
+    @patch('app.utils.quota_admission.time.time')
+    def test_client_quota_applies_across_email_types(self, mock_time):
+        mock_time.return_value = 1000.0
+        admission = make_admission({}, client_per_minute=2)
+
+        results = [admission.admit('a', email_type)[0] for email_type in ('x', 'y', 'z')]
+
+        assert results == [True, True, False]
+        assert admission.admit('b', 'x')[0] is True
+
+    @patch('app.utils.quota_admission.time.time')
+    def test_single_flow_may_use_full_fair_share_capacity(self, mock_time):
+        mock_time.return_value = 1000.0
+        admission = make_admission({}, fair_share_per_minute=10)
+
+        results = [admission.admit('flooder', 'bulk')[0] for _ in range(11)]
+
+        assert results.count(True) == 10
+
+    @patch('app.utils.quota_admission.time.time')
+    def test_flooding_client_is_held_to_its_weighted_share(self, mock_time):
+        mock_time.return_value = 1000.0
+        rows = {
+            'bulk': {'quota_per_minute': None, 'quota_weight': 1},
+            'password_reset': {'quota_per_minute': None, 'quota_weight': 3}
+        }
+        admission = make_admission(rows, fair_share_per_minute=40)
+        admission.admit('other', 'password_reset')
+
+        flooder = [admission.admit('flooder', 'bulk')[0] for _ in range(40)]
+        other = [admission.admit('other', 'password_reset')[0] for _ in range(20)]
+
+        # weights 1:3 split the 40/minute capacity into 10 and 30
+        assert flooder.count(True) == 10
+        assert all(other)
+
+    @patch('app.utils.quota_admission.time.time')
+    def test_inactive_flows_stop_counting_after_window(self, mock_time):
+        mock_time.return_value = 1000.0
+        admission = make_admission({}, fair_share_per_minute=10, window_seconds=60)
+        admission.admit('a', 'x')
+        admission.admit('b', 'x')
+        assert admission.stats()['active_flows'] == 2
+
+        mock_time.return_value = 1100.0
+        admission.admit('a', 'x')
+
+        assert admission.stats() == {'active_flows': 1, 'active_weight': 1}
+
+    @patch('app.utils.quota_admission.time.time')
+    def test_reused_flow_is_not_expired_and_weight_is_not_double_counted(self, mock_time):
+        rows = {'x': {'quota_per_minute': None, 'quota_weight': 2}}
+        admission = make_admission(rows, fair_share_per_minute=10, window_seconds=60)
+        mock_time.return_value = 1000.0
+        admission.admit('a', 'x')
+        admission.admit('b', 'x')
+
+        mock_time.return_value = 1050.0
+        admission.admit('a', 'x')
+        mock_time.return_value = 1070.0
+        admission.admit('a', 'x')
+
+        assert admission.stats() == {'active_flows': 1, 'active_weight': 2}
+
+    @patch('app.utils.quota_admission.print_logging')
+    def test_backend_error_admits_request(self, mock_print_logging):
+        admission = make_admission({}, client_per_minute=1)
+        admission.backend = MagicMock()
+        admission.backend.acquire.side_effect = OSError('boom')
+
+        assert admission.admit('a', 'x') == (True, 0.0)
+        mock_print_logging.assert_called_once()
+
+
+class TestGetClientId:
+    @patch('app.utils.quota_admission.config')
+    def test_uses_client_header_from_trusted_proxy(self, mock_config):
+        mock_config.CLIENT_ID_HEADER = 'X-Client-Id'
+        request = MagicMock()
+        request.headers = {'X-Client-Id': 'billing'}
+        request.client.host = '10.0.0.7'
+
+        assert get_client_id(request, parse_trusted_proxies('10.0.0.0/24, 192.168.1.1')) == 'billing'
+
+    @patch('app.utils.quota_admission.config')
+    def test_ignores_client_header_from_untrusted_address(self, mock_config):
+        mock_config.CLIENT_ID_HEADER = 'X-Client-Id'
+        request = MagicMock()
+        request.headers = {'X-Client-Id': 'billing'}
+        request.client.host = '203.0.113.5'
+
+        assert get_client_id(request, parse_trusted_proxies('10.0.0.0/24')) == '203.0.113.5'
+        assert get_client_id(request, []) == '203.0.113.5'
+
+    @patch('app.utils.quota_admission.config')
+    def test_falls_back_to_remote_address(self, mock_config):
+        mock_config.CLIENT_ID_HEADER = 'X-Client-Id'
+        request = MagicMock()
+        request.headers = {}
+        request.client.host = '10.0.0.1'
+
+        assert get_client_id(request) == '10.0.0.1'
@@ -1,189 +1,155 @@
 import pytest
 from unittest.mock import patch, MagicMock
-import pika
-import json
-from app.utils.rabbitmq_publisher import publish_to_rabbitmq
+from app.utils.message_codec import MessageCodec
+from app.utils.rabbitmq_publisher import get_queue_name
 
 
-class TestPublishToRabbitmq:
-    @patch('app.utils.rabbitmq_publisher.pika.BlockingConnection')
-    @patch('app.utils.rabbitmq_publisher.pika.ConnectionParameters')
-    @patch('app.utils.rabbitmq_publisher.pika.PlainCredentials')
+class TestGetQueueName:
+    @pytest.mark.parametrize('priority_level, queue_name', [
+        (1, 'email.high'), (2, 'email.normal'), (3, 'email.low'), (10, 'email.low')
+    ])
     @patch('app.utils.rabbitmq_publisher.config')
-    @patch('app.utils.rabbitmq_publisher.print_logging')
-    def test_publish_to_rabbitmq_high_priority(self, mock_print_logging, mock_config, mock_plain_credentials, mock_connection_params, mock_connection):
-        mock_conn = MagicMock()
-        mock_channel = MagicMock()
-        mock_connection.return_value = mock_conn
-        mock_conn.channel.return_value = mock_channel
+    def test_priority_selects_queue(self, mock_config, priority_level, queue_name):
         mock_config.EMAIL_QUEUE_HIGH = 'email.high'
         mock_config.EMAIL_QUEUE_NORMAL = 'email.normal'
         mock_config.EMAIL_QUEUE_LOW = 'email.low'
-        mock_config.RABBITMQ_HOST = 'localhost'
-        mock_config.RABBITMQ_PORT = 5672
-        mock_config.RABBITMQ_VHOST = '/'
-        mock_config.RABBITMQ_USER = 'guest'
-        mock_config.RABBITMQ_PASSWORD = 'guest'
-
-        email_data = {'id': 123, 'subject': 'Test'}
-        result = publish_to_rabbitmq(email_data, priority_level=1)
-
-        assert result is True
-        mock_channel.queue_declare.assert_called_once_with(queue='email.high', durable=True)
-        mock_channel.basic_publish.assert_called_once()
-        mock_conn.close.assert_called_once()
-
-    @patch('app.utils.rabbitmq_publisher.pika.BlockingConnection')
-    @patch('app.utils.rabbitmq_publisher.pika.ConnectionParameters')
-    @patch('app.utils.rabbitmq_publisher.pika.PlainCredentials')
-    @patch('app.utils.rabbitmq_publisher.config')
-    @patch('app.utils.rabbitmq_publisher.print_logging')
-    def test_publish_to_rabbitmq_normal_priority(self, mock_print_logging, mock_config, mock_plain_credentials, mock_connection_params, mock_connection):
+
+        assert get_queue_name(priority_level) == queue_name
+
+
+class TestAsyncRabbitMQPublisher:
+    def make_publisher(self):
+        from app.utils.rabbitmq_publisher import AsyncRabbitMQPublisher
+        return AsyncRabbitMQPublisher(channel_pool_size=2, confirm_timeout=1, reconnect_interval=1)
+
+    def mock_connection(self, mock_connect_robust):
+        from unittest.mock import AsyncMock
         mock_conn = MagicMock()
+        mock_conn.is_closed = False
+        mock_conn.close = AsyncMock()
         mock_channel = MagicMock()
-        mock_connection.return_value = mock_conn
-        mock_conn.channel.return_value = mock_channel
-        mock_config.EMAIL_QUEUE_HIGH = 'email.high'
-        mock_config.EMAIL_QUEUE_NORMAL = 'email.normal'
-        mock_config.EMAIL_QUEUE_LOW = 'email.low'
-        mock_config.RABBITMQ_HOST = 'localhost'
-        mock_config.RABBITMQ_PORT = 5672
-        mock_config.RABBITMQ_VHOST = '/'
-        mock_config.RABBITMQ_USER = 'guest'
-        mock_config.RABBITMQ_PASSWORD = 'guest'
+        mock_channel.declare_queue = AsyncMock()
+        mock_channel.default_exchange.publish = AsyncMock()
+        mock_conn.channel = AsyncMock(return_value=mock_channel)
+        mock_connect_robust.return_value = mock_conn
+        return mock_conn, mock_channel
+
+    @pytest.mark.asyncio
+    @patch('app.utils.rabbitmq_publisher.aio_pika.connect_robust')
+    @patch('app.utils.rabbitmq_publisher.print_logging')
+    async def test_publish_uses_persistent_connection_and_confirms(self, mock_print_logging, mock_connect_robust):
+        mock_conn, mock_channel = self.mock_connection(mock_connect_robust)
+        publisher = self.make_publisher()
+
+        assert await publisher.publish({'id': 1}, priority_level=1) is True
+        assert await publisher.publish({'id': 2}, priority_level=1) is True
+
+        mock_connect_robust.assert_called_once()
+        mock_conn.channel.assert_called_once_with(publisher_confirms=True)
+        assert mock_channel.default_exchange.publish.call_count == 2
+        call_args = mock_channel.default_exchange.publish.call_args
+        assert call_args[1]['routing_key'] == 'email.high'
+        assert call_args[1]['timeout'] == 1
+        message = call_args[0][0]
+        assert message.content_type == 'application/json'
+        assert message.headers == {'x-envelope-version': 2}
+        assert MessageCodec.decode(message.body, message.content_type, message.content_encoding, message.headers)['id'] == 2
+
+    @pytest.mark.asyncio
+    @patch('app.utils.rabbitmq_publisher.aio_pika.connect_robust')
+    @patch('app.utils.rabbitmq_publisher.print_logging')
+    async def test_queue_declaration_is_cached(self, mock_print_logging, mock_connect_robust):
+        mock_conn, mock_channel = self.mock_connection(mock_connect_robust)
+        publisher = self.make_publisher()
 
-        email_data = {'id': 123, 'subject': 'Test'}
-        result = publish_to_rabbitmq(email_data, priority_level=2)
+        await publisher.publish({'id': 1}, priority_level=2)
+        await publisher.publish({'id': 2}, priority_level=2)
+        await publisher.publish({'id': 3}, priority_level=3)
 
-        assert result is True
-        mock_channel.queue_declare.assert_called_once_with(queue='email.normal', durable=True)
+        declared = [c[0][0] for c in mock_channel.declare_queue.call_args_list]
+        assert declared == ['email.normal', 'email.low']
 
-    @patch('app.utils.rabbitmq_publisher.pika.BlockingConnection')
-    @patch('app.utils.rabbitmq_publisher.pika.ConnectionParameters')
-    @patch('app.utils.rabbitmq_publisher.pika.PlainCredentials')
-    @patch('app.utils.rabbitmq_publisher.config')
+    @pytest.mark.asyncio
+    @patch('app.utils.rabbitmq_publisher.aio_pika.connect_robust')
     @patch('app.utils.rabbitmq_publisher.print_logging')
-    def test_publish_to_rabbitmq_low_priority(self, mock_print_logging, mock_config, mock_plain_credentials, mock_connection_params, mock_connection):
-        mock_conn = MagicMock()
-        mock_channel = MagicMock()
-        mock_connection.return_value = mock_conn
-        mock_conn.channel.return_value = mock_channel
-        mock_config.EMAIL_QUEUE_HIGH = 'email.high'
-        mock_config.EMAIL_QUEUE_NORMAL = 'email.normal'
-        mock_config.EMAIL_QUEUE_LOW = 'email.low'
-        mock_config.RABBITMQ_HOST = 'localhost'
-        mock_config.RABBITMQ_PORT = 5672
-        mock_config.RABBITMQ_VHOST = '/'
-        mock_config.RABBITMQ_USER = 'guest'
-        mock_config.RABBITMQ_PASSWORD = 'guest'
+    async def test_publish_confirm_timeout_returns_false(self, mock_print_logging, mock_connect_robust):
+        import asyncio
+        mock_conn, mock_channel = self.mock_connection(mock_connect_robust)
+        mock_channel.default_exchange.publish.side_effect = asyncio.TimeoutError()
+        publisher = self.make_publisher()
 
-        email_data = {'id': 123, 'subject': 'Test'}
-        result = publish_to_rabbitmq(email_data, priority_level=3)
+        assert await publisher.publish({'id': 1}, priority_level=1) is False
+        mock_print_logging.assert_called_with('error', 'Timed out after 1s waiting for RabbitMQ publisher confirm')
 
-        assert result is True
-        mock_channel.queue_declare.assert_called_once_with(queue='email.low', durable=True)
+    @pytest.mark.asyncio
+    @patch('app.utils.rabbitmq_publisher.aio_pika.connect_robust')
+    @patch('app.utils.rabbitmq_publisher.print_logging')
+    async def test_publish_connection_error_returns_false(self, mock_print_logging, mock_connect_robust):
+        mock_connect_robust.side_effect = Exception('Connection refused')
+        publisher = self.make_publisher()
 
-    @patch('app.utils.rabbitmq_publisher.pika.BlockingConnection')
-    @patch('app.utils.rabbitmq_publisher.pika.ConnectionParameters')
-    @patch('app.utils.rabbitmq_publisher.pika.PlainCredentials')
-    @patch('app.utils.rabbitmq_publisher.config')
+        assert await publisher.publish({'id': 1}, priority_level=1) is False
+        assert publisher.is_started is False
+
+    @pytest.mark.asyncio
+    @patch('app.utils.rabbitmq_publisher.aio_pika.connect_robust')
     @patch('app.utils.rabbitmq_publisher.print_logging')
-    def test_publish_to_rabbitmq_invalid_priority(self, mock_print_logging, mock_config, mock_plain_credentials, mock_connection_params, mock_connection):
-        mock_conn = MagicMock()
-        mock_channel = MagicMock()
-        mock_connection.return_value = mock_conn
-        mock_conn.channel.return_value = mock_channel
-        mock_config.EMAIL_QUEUE_HIGH = 'email.high'
-        mock_config.EMAIL_QUEUE_NORMAL = 'email.normal'
-        mock_config.EMAIL_QUEUE_LOW = 'email.low'
-        mock_config.RABBITMQ_HOST = 'localhost'
-        mock_config.RABBITMQ_PORT = 5672
-        mock_config.RABBITMQ_VHOST = '/'
-        mock_config.RABBITMQ_USER = 'guest'
-        mock_config.RABBITMQ_PASSWORD = 'guest'
+    async def test_stop_closes_connection(self, mock_print_logging, mock_connect_robust):
+        mock_conn, mock_channel = self.mock_connection(mock_connect_robust)
+        publisher = self.make_publisher()
 
-        email_data = {'id': 123, 'subject': 'Test'}
-        result = publish_to_rabbitmq(email_data, priority_level=10)
+        await publisher.start()
+        await publisher.stop()
 
-        assert result is True
-        mock_channel.queue_declare.assert_called_once_with(queue='email.low', durable=True)
+        mock_conn.close.assert_awaited_once()
+        assert publisher.is_started is False
 
-    @patch('app.utils.rabbitmq_publisher.pika.BlockingConnection')
-    @patch('app.utils.rabbitmq_publisher.pika.ConnectionParameters')
-    @patch('app.utils.rabbitmq_publisher.pika.PlainCredentials')
-    @patch('app.utils.rabbitmq_publisher.config')
+    @pytest.mark.asyncio
+    @patch('app.utils.rabbitmq_publisher.aio_pika.connect_robust')
     @patch('app.utils.rabbitmq_publisher.print_logging')
-    def test_publish_to_rabbitmq_connection_error(self, mock_print_logging, mock_config, mock_plain_credentials, mock_connection_params, mock_connection):
-        mock_connection.side_effect = Exception('Connection failed')
-        mock_config.EMAIL_QUEUE_HIGH = 'email.high'
-        mock_config.RABBITMQ_HOST = 'localhost'
-        mock_config.RABBITMQ_PORT = 5672
-        mock_config.RABBITMQ_VHOST = '/'
-        mock_config.RABBITMQ_USER = 'guest'
-        mock_config.RABBITMQ_PASSWORD = 'guest'
+    async def test_publish_batch_reports_per_item_results(self, mock_print_logging, mock_connect_robust):
+        mock_conn, mock_channel = self.mock_connection(mock_connect_robust)
+        mock_channel.default_exchange.publish.side_effect = [None, Exception('nack'), None]
+        publisher = self.make_publisher()
 
-        email_data = {'id': 123, 'subject': 'Test'}
-        result = publish_to_rabbitmq(email_data, priority_level=1)
+        result = await publisher.publish_batch([({'id': 1}, 1), ({'id': 2}, 2), ({'id': 3}, 1)])
 
-        assert result is False
-        mock_print_logging.assert_called_once()
+        assert result == [True, False, True]
+        mock_conn.channel.assert_called_once()
+        declared = sorted(c[0][0] for c in mock_channel.declare_queue.call_args_list)
+        assert declared == ['email.high', 'email.normal']
 
-    @patch('app.utils.rabbitmq_publisher.pika.BlockingConnection')
-    @patch('app.utils.rabbitmq_publisher.pika.ConnectionParameters')
-    @patch('app.utils.rabbitmq_publisher.pika.PlainCredentials')
-    @patch('app.utils.rabbitmq_publisher.config')
+    @pytest.mark.asyncio
+    @patch('app.utils.rabbitmq_publisher.aio_pika.connect_robust')
     @patch('app.utils.rabbitmq_publisher.print_logging')
-    def test_publish_to_rabbitmq_with_complex_data(self, mock_print_logging, mock_config, mock_plain_credentials, mock_connection_params, mock_connection):
-        mock_conn = MagicMock()
-        mock_channel = MagicMock()
-        mock_connection.return_value = mock_conn
-        mock_conn.channel.return_value = mock_channel
-        mock_config.EMAIL_QUEUE_HIGH = 'email.high'
-        mock_config.EMAIL_QUEUE_NORMAL = 'email.normal'
-        mock_config.EMAIL_QUEUE_LOW = 'email.low'
-        mock_config.RABBITMQ_HOST = 'localhost'
-        mock_config.RABBITMQ_PORT = 5672
-        mock_config.RABBITMQ_VHOST = '/'
-        mock_config.RABBITMQ_USER = 'guest'
-        mock_config.RABBITMQ_PASSWORD = 'guest'
-
-        email_data = {
-            'id': 123,
-            'email_type': 'welcome',
-            'subject': 'Welcome',
-            'email_template': 'welcome.html',
-            'email_data': {'name': 'John', 'company': 'Acme'},
-            'to_address': 'test@example.com'
-        }
-        result = publish_to_rabbitmq(email_data, priority_level=1)
-
-        assert result is True
-        call_args = mock_channel.basic_publish.call_args
-        assert 'body' in call_args[1]
-        body_data = json.loads(call_args[1]['body'])
-        assert body_data['id'] == 123
-
-    @patch('app.utils.rabbitmq_publisher.pika.BlockingConnection')
-    @patch('app.utils.rabbitmq_publisher.pika.ConnectionParameters')
-    @patch('app.utils.rabbitmq_publisher.pika.PlainCredentials')
-    @patch('app.utils.rabbitmq_publisher.config')
+    async def test_queue_depths_uses_passive_declares(self, mock_print_logging, mock_connect_robust):
+        from unittest.mock import AsyncMock
+        import aio_pika
+        mock_conn, mock_channel = self.mock_connection(mock_connect_robust)
+        mock_channel.close = AsyncMock()
+        high = MagicMock()
+        high.declaration_result.message_count = 12
+        high.declaration_result.consumer_count = 3
+        mock_channel.declare_queue.side_effect = [high, aio_pika.exceptions.ChannelNotFoundEntity()]
+        publisher = self.make_publisher()
+
+        result = await publisher.queue_depths(['email.high', 'email.low'])
+
+        assert result == {'email.high': (12, 3), 'email.low': (0, 0)}
+        assert all(c[1]['passive'] is True for c in mock_channel.declare_queue.call_args_list)
+
+    @pytest.mark.asyncio
+    @patch('app.utils.rabbitmq_publisher.aio_pika.connect_robust')
     @patch('app.utils.rabbitmq_publisher.print_logging')
-    def test_publish_to_rabbitmq_delivery_mode(self, mock_print_logging, mock_config, mock_plain_credentials, mock_connection_params, mock_connection):
-        mock_conn = MagicMock()
-        mock_channel = MagicMock()
-        mock_connection.return_value = mock_conn
-        mock_conn.channel.return_value = mock_channel
-        mock_config.EMAIL_QUEUE_HIGH = 'email.high'
-        mock_config.RABBITMQ_HOST = 'localhost'
-        mock_config.RABBITMQ_PORT = 5672
-        mock_config.RABBITMQ_VHOST = '/'
-        mock_config.RABBITMQ_USER = 'guest'
-        mock_config.RABBITMQ_PASSWORD = 'guest'
-
-        email_data = {'id': 123}
-        result = publish_to_rabbitmq(email_data, priority_level=1)
-
-        assert result is True
-        call_args = mock_channel.basic_publish.call_args
-        assert 'properties' in call_args[1]
-        assert call_args[1]['properties'].delivery_mode == 2
+    async def test_large_message_is_compressed(self, mock_print_logging, mock_connect_robust):
+        mock_conn, mock_channel = self.mock_connection(mock_connect_robust)
+        publisher = self.make_publisher()
+        codec = MessageCodec(message_format='msgpack', compression='zstd', threshold=1024, level=3)
+        email_data = {'id': 1, 'email_data': {'rows': ['row'] * 5000}}
+
+        with patch('app.utils.rabbitmq_publisher.message_codec', codec):
+            assert await publisher.publish(email_data, priority_level=3) is True
+
+        message = mock_channel.default_exchange.publish.call_args[0][0]
+        assert message.content_encoding == 'zstd'
+        assert codec.decode(message.body, message.content_type, message.content_encoding, message.headers) == email_data
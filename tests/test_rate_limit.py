@@ -52,3 +52,118 @@ class TestRateLimitConfig:
 
         assert config.RATE_LIMIT_GLOBAL_PER_MINUTE >= config.RATE_LIMIT_PER_MINUTE
         assert config.RATE_LIMIT_GLOBAL_PER_HOUR >= config.RATE_LIMIT_PER_HOUR
+
+
+class TestGcra:
+    """Test the GCRA decision function"""
+
+    def test_allows_burst_up_to_limit(self):
+        from app.utils.rate_limiter import gcra
+        tat = None
+        results = []
+        for _ in range(4):
+            allowed, retry_after, tat = gcra(tat, 100.0, 20.0, 60.0)
+            results.append(allowed)
+
+        assert results == [True, True, True, False]
+
+    def test_retry_after_is_time_until_next_emission(self):
+        from app.utils.rate_limiter import gcra
+        allowed, retry_after, tat = gcra(160.0, 100.0, 20.0, 60.0)
+
+        assert allowed is False
+        assert retry_after == 20.0
+        assert tat == 160.0
+
+    def test_expired_tat_is_treated_as_new_key(self):
+        from app.utils.rate_limiter import gcra
+        allowed, retry_after, tat = gcra(50.0, 100.0, 20.0, 60.0)
+
+        assert allowed is True
+        assert tat == 120.0
+
+
+class TestRateLimitBackends:
+    """Test that backends consume all limits together or not at all"""
+
+    def test_memory_backend_does_not_consume_when_any_limit_denies(self):
+        from app.utils.rate_limiter import MemoryRateLimitBackend
+        backend = MemoryRateLimitBackend()
+        limits = [("client", 30.0, 60.0), ("global", 60.0, 60.0)]
+
+        assert backend.acquire(limits, 0.0) == (True, 0.0, [30.0, 60.0])
+        allowed, retry_after, backlogs = backend.acquire(limits, 0.0)
+
+        assert allowed is False
+        assert retry_after == 60.0
+        assert backlogs == [30.0, 60.0]
+        assert backend.acquire([("client", 30.0, 60.0)], 0.0) == (True, 0.0, [60.0])
+
+    def test_shared_memory_backend_is_shared_between_instances(self, tmp_path):
+        from app.utils.rate_limiter import SharedMemoryRateLimitBackend
+        path = str(tmp_path / "rate_limit")
+        first = SharedMemoryRateLimitBackend(path, slots=64)
+        second = SharedMemoryRateLimitBackend(path, slots=64)
+        limits = [("client:1.2.3.4:minute", 30.0, 60.0)]
+
+        assert first.acquire(limits, 1000.0)[0] is True
+        assert second.acquire(limits, 1000.0)[0] is True
+        allowed, retry_after, backlogs = first.acquire(limits, 1000.0)
+
+        assert allowed is False
+        assert retry_after == 30.0
+        assert backlogs == [60.0]
+
+    def test_shared_memory_backend_keeps_keys_of_one_request_apart(self, tmp_path):
+        from app.utils.rate_limiter import SharedMemoryRateLimitBackend
+        backend = SharedMemoryRateLimitBackend(str(tmp_path / "rate_limit"), slots=2, probe_length=2)
+
+        assert backend.acquire([("a", 60.0, 60.0), ("b", 60.0, 60.0)], 0.0)[0] is True
+
+        assert backend.acquire([("a", 60.0, 60.0)], 0.0)[0] is False
+        assert backend.acquire([("b", 60.0, 60.0)], 0.0)[0] is False
+
+    def test_redis_backend_requires_redis_package(self):
+        from unittest.mock import patch
+        from app.utils.rate_limiter import RedisRateLimitBackend
+        with patch.dict('sys.modules', {'redis': None}):
+            with pytest.raises(RuntimeError):
+                RedisRateLimitBackend("redis://localhost:6379/0")
+
+
+class TestRateLimiter:
+    """Test the per-client and global rule composition"""
+
+    def test_check_builds_client_and_global_keys(self):
+        from unittest.mock import MagicMock
+        from app.utils.rate_limiter import RateLimiter
+        backend = MagicMock()
+        backend.acquire.return_value = (True, 0.0, [6.0, 0.12])
+        limiter = RateLimiter(backend, [("minute", 10, 60), ("hour", 0, 3600)], [("minute", 500, 60)])
+
+        assert limiter.check("1.2.3.4")[:2] == (True, 0.0)
+        limits = backend.acquire.call_args[0][0]
+        assert limits == [("client:1.2.3.4:minute", 6.0, 60), ("global:minute", 0.12, 60)]
+
+    def test_headers_describe_limit_with_fewest_requests_left(self):
+        from unittest.mock import MagicMock, patch
+        from app.utils.rate_limiter import RateLimiter
+        backend = MagicMock()
+        backend.acquire.return_value = (True, 0.0, [54.0, 0.12])
+        limiter = RateLimiter(backend, [("minute", 10, 60)], [("minute", 500, 60)])
+
+        with patch('app.utils.rate_limiter.time.time', return_value=1000.0):
+            allowed, retry_after, headers = limiter.check("1.2.3.4")
+
+        assert headers == {"X-RateLimit-Limit": "10", "X-RateLimit-Remaining": "1", "X-RateLimit-Reset": "1054"}
+
+    def test_check_allows_request_when_backend_fails(self):
+        from unittest.mock import MagicMock, patch
+        from app.utils.rate_limiter import RateLimiter
+        backend = MagicMock()
+        backend.acquire.side_effect = OSError("disk full")
+        limiter = RateLimiter(backend, [("minute", 10, 60)], [])
+
+        with patch('app.utils.rate_limiter.print_logging') as mock_print_logging:
+            assert limiter.check("1.2.3.4") == (True, 0.0, {})
+            mock_print_logging.assert_called_once()
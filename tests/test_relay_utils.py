@@ -0,0 +1,70 @@
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.utils.relay_utils import OutboxRelay
+
+
+def make_relay(publisher, batch_size=10):
+    return OutboxRelay(
+        publisher=publisher,
+        batch_size=batch_size,
+        poll_interval=0.01,
+        lease_seconds=60,
+        retry_delay_seconds=5,
+        max_retry_delay_seconds=300
+    )
+
+
+class TestOutboxRelay:
+    @pytest.mark.asyncio
+    @patch('app.utils.relay_utils.complete_email_outbox')
+    @patch('app.utils.relay_utils.claim_email_outbox')
+    @patch('app.utils.relay_utils.print_logging')
+    async def test_relay_batch_deletes_confirmed_and_retries_failed(self, mock_print_logging, mock_claim, mock_complete):
+        publisher = MagicMock()
+        publisher.publish_batch = AsyncMock(return_value=[True, False])
+        mock_claim.return_value = [
+            {'id': 1, 'email_queue_id': 'email-1', 'priority_level': 1, 'payload': {'id': 'email-1'}, 'attempts': 0},
+            {'id': 2, 'email_queue_id': 'email-2', 'priority_level': 3, 'payload': {'id': 'email-2'}, 'attempts': 0}
+        ]
+
+        claimed = await make_relay(publisher).relay_batch()
+
+        assert claimed == 2
+        publisher.publish_batch.assert_awaited_once_with([({'id': 'email-1'}, 1), ({'id': 'email-2'}, 3)])
+        published_ids, failed, retry_delay, max_retry_delay = mock_complete.call_args[0]
+        assert published_ids == [1]
+        assert [outbox_id for outbox_id, _ in failed] == [2]
+        assert (retry_delay, max_retry_delay) == (5, 300)
+
+    @pytest.mark.asyncio
+    @patch('app.utils.relay_utils.complete_email_outbox')
+    @patch('app.utils.relay_utils.claim_email_outbox')
+    @patch('app.utils.relay_utils.print_logging')
+    async def test_relay_batch_with_empty_outbox(self, mock_print_logging, mock_claim, mock_complete):
+        publisher = MagicMock()
+        publisher.publish_batch = AsyncMock()
+        mock_claim.return_value = []
+
+        assert await make_relay(publisher).relay_batch() == 0
+        publisher.publish_batch.assert_not_awaited()
+        mock_complete.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch('app.utils.relay_utils.notification_listener')
+    @patch('app.utils.relay_utils.print_logging')
+    async def test_run_drains_until_stopped(self, mock_print_logging, mock_listener):
+        relay = make_relay(MagicMock(), batch_size=2)
+        calls = []
+
+        async def fake_relay_batch():
+            calls.append(1)
+            if len(calls) == 3:
+                relay.stop()
+            return 2 if len(calls) < 3 else 0
+
+        relay.relay_batch = fake_relay_batch
+        await relay.run()
+
+        assert len(calls) == 3
+        mock_listener.start.assert_called_once()
+        mock_listener.stop.assert_called_once()
@@ -0,0 +1,98 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from app.utils.render_cache import RenderCache
+from app.utils.template_utils import render_email_template
+
+
+def make_template(name='welcome.html'):
+    template = MagicMock()
+    template.name = name
+    return template
+
+
+class TestRenderCache:
+    def test_make_key_is_stable_across_key_order(self):
+        template = make_template()
+
+        key1 = RenderCache.make_key(template, {'name': 'John', 'items': [1, 2]})
+        key2 = RenderCache.make_key(template, {'items': [1, 2], 'name': 'John'})
+
+        assert key1 == key2
+        assert key1 != RenderCache.make_key(template, {'name': 'Jane', 'items': [1, 2]})
+
+    def test_make_key_returns_none_for_unserializable_data(self):
+        assert RenderCache.make_key(make_template(), {'value': object()}) is None
+
+    def test_get_counts_hits_and_misses(self):
+        cache = RenderCache(max_entries=10, max_bytes=1024)
+        template = make_template()
+        key = cache.make_key(template, {'name': 'John'})
+
+        assert cache.get(key, template) is None
+        cache.put(key, template, '<p>John</p>')
+
+        assert cache.get(key, template) == '<p>John</p>'
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['bytes'] == len('<p>John</p>')
+
+    def test_get_ignores_entry_of_reloaded_template(self):
+        cache = RenderCache(max_entries=10, max_bytes=1024)
+        old_template = make_template()
+        new_template = make_template()
+        key = cache.make_key(old_template, {'name': 'John'})
+        cache.put(key, old_template, '<p>old</p>')
+
+        assert cache.get(key, new_template) is None
+
+    def test_put_evicts_least_recently_used_by_entries(self):
+        cache = RenderCache(max_entries=2, max_bytes=1024)
+        template = make_template()
+        keys = [cache.make_key(template, {'n': i}) for i in range(3)]
+        cache.put(keys[0], template, 'a')
+        cache.put(keys[1], template, 'b')
+        cache.get(keys[0], template)
+
+        cache.put(keys[2], template, 'c')
+
+        assert cache.get(keys[1], template) is None
+        assert cache.get(keys[0], template) == 'a'
+        assert cache.stats()['evictions'] == 1
+
+    def test_put_evicts_by_bytes(self):
+        cache = RenderCache(max_entries=10, max_bytes=10)
+        template = make_template()
+        key1 = cache.make_key(template, {'n': 1})
+        key2 = cache.make_key(template, {'n': 2})
+        cache.put(key1, template, 'x' * 6)
+
+        cache.put(key2, template, 'y' * 6)
+
+        assert cache.get(key1, template) is None
+        assert cache.stats()['bytes'] == 6
+
+    def test_put_skips_entry_larger_than_limit(self):
+        cache = RenderCache(max_entries=10, max_bytes=4)
+        template = make_template()
+        key = cache.make_key(template, {'n': 1})
+
+        cache.put(key, template, 'too large')
+
+        assert cache.stats()['entries'] == 0
+
+
+class TestRenderEmailTemplateWithCache:
+    @patch('app.utils.template_utils.render_cache', new_callable=lambda: RenderCache(max_entries=10, max_bytes=1024))
+    @patch('app.utils.template_utils.jinja_env')
+    def test_render_email_template_renders_identical_data_once(self, mock_jinja_env, mock_render_cache):
+        template = make_template()
+        template.render.return_value = '<h1>Hello John!</h1>'
+        mock_jinja_env.get_template.return_value = template
+
+        first = render_email_template('welcome', {'name': 'John'})
+        second = render_email_template('welcome', {'name': 'John'})
+
+        assert first == second == '<h1>Hello John!</h1>'
+        template.render.assert_called_once_with(name='John')
+        assert mock_render_cache.stats()['hits'] == 1
@@ -0,0 +1,71 @@
+import smtplib
+import aiosmtplib
+from unittest.mock import patch
+from app.utils.retry_utils import RetryPolicy, is_permanent_smtp_error, get_attempt
+
+
+def make_policy(**overrides):
+    settings = {'max_retries': 5, 'base_delay': 30, 'max_delay': 100, 'jitter': 0.2}
+    settings.update(overrides)
+    return RetryPolicy(**settings)
+
+
+class TestRetryPolicy:
+    def test_delays_grow_exponentially_up_to_the_cap(self):
+        policy = make_policy()
+
+        assert [policy.delay_for(attempt) for attempt in range(1, 5)] == [30, 60, 100, 100]
+        assert policy.delays() == [30, 60, 100]
+
+    def test_retry_queues_dead_letter_back_to_source_queue(self):
+        policy = make_policy(max_retries=2)
+
+        assert policy.retry_queues('email.low') == [(
+            'email.low.retry.30s',
+            {'x-message-ttl': 30000, 'x-dead-letter-exchange': '', 'x-dead-letter-routing-key': 'email.low'}
+        )]
+
+    @patch('app.utils.retry_utils.random.uniform', return_value=0.2)
+    def test_next_retry_applies_jitter_and_increments_attempt(self, mock_uniform):
+        policy = make_policy()
+
+        queue, expiration_ms, headers = policy.next_retry('email.high', 2, {'x-envelope-version': 2})
+
+        assert queue == 'email.high.retry.60s'
+        assert expiration_ms == 48000
+        assert headers == {'x-envelope-version': 2, 'x-attempt': 3}
+        mock_uniform.assert_called_once_with(0, 0.2)
+
+    def test_should_retry_stops_at_max_retries(self):
+        policy = make_policy(max_retries=3)
+        error = ConnectionRefusedError('Connection refused')
+
+        assert policy.should_retry(2, error)
+        assert not policy.should_retry(3, error)
+
+    def test_get_attempt_defaults_to_first(self):
+        assert get_attempt(None) == 1
+        assert get_attempt({'x-attempt': 4}) == 4
+
+
+class TestIsPermanentSmtpError:
+    def test_5xx_reply_is_permanent(self):
+        assert is_permanent_smtp_error(smtplib.SMTPResponseException(550, b'no such user'))
+        assert is_permanent_smtp_error(aiosmtplib.SMTPResponseException(554, 'rejected'))
+
+    def test_4xx_reply_and_connection_errors_are_transient(self):
+        assert not is_permanent_smtp_error(smtplib.SMTPResponseException(421, b'try later'))
+        assert not is_permanent_smtp_error(smtplib.SMTPServerDisconnected('gone'))
+        assert not is_permanent_smtp_error(ConnectionRefusedError())
+
+    def test_authentication_failure_is_transient(self):
+        assert not is_permanent_smtp_error(smtplib.SMTPAuthenticationError(535, b'bad credentials'))
+
+    def test_recipients_refused_is_permanent_only_if_all_5xx(self):
+        assert is_permanent_smtp_error(smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'no')}))
+        assert not is_permanent_smtp_error(smtplib.SMTPRecipientsRefused({
+            'a@example.com': (550, b'no'), 'b@example.com': (450, b'busy')
+        }))
+        assert is_permanent_smtp_error(aiosmtplib.SMTPRecipientsRefused([
+            aiosmtplib.SMTPRecipientRefused(550, 'no', 'a@example.com')
+        ]))
@@ -0,0 +1,93 @@
+import signal
+import socket
+import pytest
+from unittest.mock import patch, MagicMock
+from app.utils.server_utils import create_listen_socket, PreforkServer
+
+
+def make_server(workers=2, graceful_timeout=0):
+    return PreforkServer(
+        app=MagicMock(),
+        host="127.0.0.1",
+        port=0,
+        workers=workers,
+        reuse_port=True,
+        backlog=16,
+        graceful_timeout=graceful_timeout
+    )
+
+
+class TestCreateListenSocket:
+    @pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="SO_REUSEPORT not available")
+    def test_reuse_port_sockets_share_a_port(self):
+        first = create_listen_socket("127.0.0.1", 0, True, 16)
+        try:
+            port = first.getsockname()[1]
+            second = create_listen_socket("127.0.0.1", port, True, 16)
+            try:
+                assert second.getsockname()[1] == port
+                assert second.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT) != 0
+                assert second.get_inheritable() is True
+            finally:
+                second.close()
+        finally:
+            first.close()
+
+
+class TestPreforkServer:
+    @patch('app.utils.server_utils.print_logging')
+    @patch('app.utils.server_utils.os.waitpid')
+    def test_unexpected_exit_is_replaced(self, mock_waitpid, mock_print_logging):
+        server = make_server()
+        server._children = {101: 0.0, 102: 0.0}
+        mock_waitpid.side_effect = [(101, 256), (0, 0)]
+
+        with patch.object(server, 'spawn_worker') as mock_spawn:
+            server.reap_workers()
+
+        mock_spawn.assert_called_once()
+        assert 101 not in server._children
+
+    @patch('app.utils.server_utils.os.waitpid')
+    def test_retired_workers_are_not_replaced(self, mock_waitpid):
+        server = make_server()
+        server._retiring = {101: 0.0}
+        mock_waitpid.side_effect = [(101, 0), ChildProcessError()]
+
+        with patch.object(server, 'spawn_worker') as mock_spawn:
+            server.reap_workers()
+
+        mock_spawn.assert_not_called()
+        assert server._retiring == {}
+
+    @patch('app.utils.server_utils.print_logging')
+    @patch('app.utils.server_utils.os.kill')
+    def test_reload_starts_new_workers_before_retiring_old_ones(self, mock_kill, mock_print_logging):
+        server = make_server(workers=2)
+        server._children = {101: 0.0, 102: 0.0}
+        calls = []
+        mock_kill.side_effect = lambda pid, sig: calls.append(('kill', pid, sig))
+
+        def spawn():
+            calls.append(('spawn',))
+            server._children[200 + len(server._children)] = 0.0
+
+        with patch.object(server, 'spawn_worker', side_effect=spawn):
+            server.reload()
+
+        assert calls == [('spawn',), ('spawn',), ('kill', 101, signal.SIGTERM), ('kill', 102, signal.SIGTERM)]
+        assert set(server._retiring) == {101, 102}
+        assert set(server._children) == {200, 201}
+
+    @patch('app.utils.server_utils.print_logging')
+    @patch('app.utils.server_utils.os.waitpid')
+    @patch('app.utils.server_utils.os.kill')
+    def test_shutdown_kills_workers_after_graceful_timeout(self, mock_kill, mock_waitpid, mock_print_logging):
+        server = make_server(graceful_timeout=0)
+        server._children = {101: 0.0}
+        mock_waitpid.return_value = (0, 0)
+
+        server.shutdown()
+
+        assert [c[0] for c in mock_kill.call_args_list] == [(101, signal.SIGTERM), (101, signal.SIGKILL)]
+        assert server._children == {}
@@ -0,0 +1,140 @@
+import smtplib
+import aiosmtplib
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.utils.smtp_pool import SmtpConnectionPool, AsyncSmtpConnectionPool, ssl_context
+
+
+def pool_settings(**overrides):
+    settings = {
+        'host': 'smtp.example.com', 'port': 465, 'username': 'user@example.com', 'password': 'secret',
+        'max_size': 2, 'max_messages': 100, 'idle_timeout': 60, 'noop_after': 15, 'timeout': 30
+    }
+    settings.update(overrides)
+    return settings
+
+
+def make_message():
+    message = MagicMock()
+    message.as_string.return_value = 'raw message'
+    return message
+
+
+class TestSmtpConnectionPool:
+    @patch('app.utils.smtp_pool.smtplib.SMTP_SSL')
+    def test_connection_is_reused_between_emails(self, mock_smtp_ssl):
+        pool = SmtpConnectionPool(**pool_settings())
+
+        assert pool.send(make_message(), 'user@example.com', ['a@example.com']) == (True, 'success')
+        assert pool.send(make_message(), 'user@example.com', ['b@example.com']) == (True, 'success')
+
+        mock_smtp_ssl.assert_called_once_with('smtp.example.com', 465, context=ssl_context, timeout=30)
+        mock_smtp_ssl.return_value.login.assert_called_once_with('user@example.com', 'secret')
+        assert mock_smtp_ssl.return_value.sendmail.call_count == 2
+        assert pool.stats()['created'] == 1
+        assert pool.stats()['reused'] == 1
+        assert pool.stats()['idle'] == 1
+
+    @patch('app.utils.smtp_pool.smtplib.SMTP_SSL')
+    def test_connection_is_replaced_after_max_messages(self, mock_smtp_ssl):
+        pool = SmtpConnectionPool(**pool_settings(max_messages=2))
+
+        for _ in range(3):
+            pool.send(make_message(), 'user@example.com', ['a@example.com'])
+
+        assert mock_smtp_ssl.call_count == 2
+        assert pool.stats()['closed'] == 1
+
+    @patch('app.utils.smtp_pool.time.monotonic')
+    @patch('app.utils.smtp_pool.smtplib.SMTP_SSL')
+    def test_idle_connection_past_timeout_is_closed(self, mock_smtp_ssl, mock_monotonic):
+        pool = SmtpConnectionPool(**pool_settings())
+        mock_monotonic.return_value = 100
+        pool.send(make_message(), 'user@example.com', ['a@example.com'])
+
+        mock_monotonic.return_value = 200
+        pool.send(make_message(), 'user@example.com', ['a@example.com'])
+
+        assert mock_smtp_ssl.call_count == 2
+        mock_smtp_ssl.return_value.noop.assert_not_called()
+
+    @patch('app.utils.smtp_pool.time.monotonic')
+    @patch('app.utils.smtp_pool.smtplib.SMTP_SSL')
+    def test_failed_noop_replaces_connection(self, mock_smtp_ssl, mock_monotonic):
+        stale, fresh = MagicMock(), MagicMock()
+        stale.noop.return_value = (421, b'closing')
+        mock_smtp_ssl.side_effect = [stale, fresh]
+        pool = SmtpConnectionPool(**pool_settings())
+        mock_monotonic.return_value = 100
+        pool.send(make_message(), 'user@example.com', ['a@example.com'])
+
+        mock_monotonic.return_value = 130
+        assert pool.send(make_message(), 'user@example.com', ['a@example.com']) == (True, 'success')
+
+        fresh.sendmail.assert_called_once()
+        assert pool.stats()['noop_failures'] == 1
+
+    @patch('app.utils.smtp_pool.smtplib.SMTP_SSL')
+    def test_disconnected_reused_connection_is_retried_on_new_one(self, mock_smtp_ssl):
+        stale, fresh = MagicMock(), MagicMock()
+        mock_smtp_ssl.side_effect = [stale, fresh]
+        pool = SmtpConnectionPool(**pool_settings())
+        pool.send(make_message(), 'user@example.com', ['a@example.com'])
+        stale.sendmail.side_effect = smtplib.SMTPServerDisconnected('gone')
+
+        assert pool.send(make_message(), 'user@example.com', ['a@example.com']) == (True, 'success')
+
+        fresh.sendmail.assert_called_once()
+        assert pool.stats()['reconnects'] == 1
+
+    @patch('app.utils.smtp_pool.print_logging')
+    @patch('app.utils.smtp_pool.smtplib.SMTP_SSL')
+    def test_error_on_fresh_connection_is_returned(self, mock_smtp_ssl, mock_logging):
+        error = smtplib.SMTPResponseException(421, b'try later')
+        mock_smtp_ssl.return_value.sendmail.side_effect = error
+        pool = SmtpConnectionPool(**pool_settings())
+
+        assert pool.send(make_message(), 'user@example.com', ['a@example.com']) == (False, error)
+        assert mock_smtp_ssl.call_count == 1
+        assert pool.stats()['idle'] == 0
+
+
+class TestAsyncSmtpConnectionPool:
+    @pytest.mark.asyncio
+    @patch('app.utils.smtp_pool.aiosmtplib.SMTP')
+    async def test_connection_is_reused_between_emails(self, mock_smtp):
+        client = mock_smtp.return_value
+        client.connect = AsyncMock()
+        client.login = AsyncMock()
+        client.send_message = AsyncMock()
+        client.is_connected = True
+        pool = AsyncSmtpConnectionPool(**pool_settings())
+
+        assert await pool.send(make_message(), 'user@example.com', ['a@example.com']) == (True, 'success')
+        assert await pool.send(make_message(), 'user@example.com', ['b@example.com']) == (True, 'success')
+
+        mock_smtp.assert_called_once_with(hostname='smtp.example.com', port=465, use_tls=True, tls_context=ssl_context, timeout=30)
+        client.login.assert_awaited_once_with('user@example.com', 'secret')
+        assert client.send_message.await_count == 2
+        assert pool.stats()['reused'] == 1
+
+    @pytest.mark.asyncio
+    @patch('app.utils.smtp_pool.aiosmtplib.SMTP')
+    async def test_421_on_reused_connection_is_retried_on_new_one(self, mock_smtp):
+        stale, fresh = MagicMock(), MagicMock()
+        for client in (stale, fresh):
+            client.connect = AsyncMock()
+            client.login = AsyncMock()
+            client.send_message = AsyncMock()
+            client.quit = AsyncMock()
+            client.is_connected = True
+        mock_smtp.side_effect = [stale, fresh]
+        pool = AsyncSmtpConnectionPool(**pool_settings())
+        await pool.send(make_message(), 'user@example.com', ['a@example.com'])
+        stale.send_message.side_effect = aiosmtplib.SMTPResponseException(421, 'closing')
+
+        assert await pool.send(make_message(), 'user@example.com', ['a@example.com']) == (True, 'success')
+
+        fresh.send_message.assert_awaited_once()
+        assert pool.stats()['reconnects'] == 1
+        assert pool.stats()['closed'] == 1
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from app.utils.status_hub import EmailStatusHub, describe_status, RESYNC
+
+
+class TestDescribeStatus:
+    def test_adds_state_label(self):
+        result = describe_status({'id': 'a', 'status': 1, 'sent_at': '2026-01-01T00:00:00'})
+
+        assert result == {'id': 'a', 'status': 1, 'state': 'sent', 'created_at': None, 'sent_at': '2026-01-01T00:00:00'}
+
+
+class TestEmailStatusHub:
+    @pytest.mark.asyncio
+    async def test_publish_reaches_only_subscribers_of_the_email(self):
+        hub = EmailStatusHub()
+        loop = asyncio.get_running_loop()
+        watching, other = asyncio.Queue(), asyncio.Queue()
+        hub.subscribe(['a'], watching, loop)
+        hub.subscribe(['b'], other, loop)
+
+        hub.publish('{"id": "a", "status": 1, "sent_at": null}')
+
+        assert await asyncio.wait_for(watching.get(), timeout=1) == {'id': 'a', 'status': 1, 'sent_at': None}
+        assert other.empty()
+        assert hub.stats()['delivered'] == 1
+
+    @pytest.mark.asyncio
+    async def test_unsubscribe_removes_waiters(self):
+        hub = EmailStatusHub()
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        hub.subscribe(['a', 'b'], queue, loop)
+
+        hub.unsubscribe(['a', 'b'], queue, loop)
+
+        assert hub.stats() == {'watched_emails': 0, 'waiters': 0, 'delivered': 0}
+
+    @pytest.mark.asyncio
+    async def test_resync_wakes_every_waiter_once(self):
+        hub = EmailStatusHub()
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        hub.subscribe(['a', 'b'], queue, loop)
+
+        hub.resync()
+
+        assert await asyncio.wait_for(queue.get(), timeout=1) is RESYNC
+        await asyncio.sleep(0)
+        assert queue.empty()
+
+    @patch('app.utils.status_hub.print_logging')
+    def test_invalid_payload_is_logged(self, mock_print_logging):
+        hub = EmailStatusHub()
+
+        hub.publish('not json')
+
+        mock_print_logging.assert_called_once()
@@ -0,0 +1,76 @@
+import os
+import pytest
+from unittest.mock import patch, MagicMock
+from jinja2 import Environment, FileSystemLoader, ChoiceLoader
+from app.utils.template_registry import TemplateRegistry
+
+
+def make_registry(tmp_path, poll_interval=0):
+    user_dir = tmp_path / "user"
+    app_dir = tmp_path / "app"
+    app_dir.mkdir()
+    (app_dir / "default_template.html").write_text("<p>{{ name }}</p>")
+    env = Environment(loader=ChoiceLoader([
+        FileSystemLoader(str(user_dir)),
+        FileSystemLoader(str(app_dir))
+    ]))
+    return TemplateRegistry(env, poll_interval=poll_interval), user_dir, app_dir
+
+
+class TestTemplateRegistry:
+    @patch('app.utils.template_registry.print_logging')
+    def test_exists_loads_index_lazily(self, mock_print_logging, tmp_path):
+        registry, _, _ = make_registry(tmp_path)
+
+        assert registry.exists("default_template.html") is True
+        assert registry.exists("missing.html") is False
+        assert registry.stats()["reloads"] == 1
+
+    @patch('app.utils.template_registry.print_logging')
+    def test_exists_does_not_touch_filesystem_after_load(self, mock_print_logging, tmp_path):
+        registry, _, app_dir = make_registry(tmp_path)
+        registry.load()
+        (app_dir / "new_template.html").write_text("<p>new</p>")
+
+        assert registry.exists("new_template.html") is False
+
+        registry.reload()
+
+        assert registry.exists("new_template.html") is True
+
+    @patch('app.utils.template_registry.print_logging')
+    def test_index_includes_user_templates(self, mock_print_logging, tmp_path):
+        registry, user_dir, _ = make_registry(tmp_path)
+        user_dir.mkdir()
+        (user_dir / "welcome.html").write_text("<p>welcome</p>")
+
+        assert registry.load() == 2
+        assert registry.exists("welcome.html") is True
+
+    @patch('app.utils.template_registry.print_logging')
+    def test_watcher_detects_added_template(self, mock_print_logging, tmp_path):
+        registry, _, app_dir = make_registry(tmp_path)
+        registry.load()
+        signature = registry._signature
+        (app_dir / "added.html").write_text("<p>added</p>")
+        os.utime(app_dir, ns=(1, 1))
+
+        assert registry._directory_signature() != signature
+
+    @patch('app.utils.template_registry.print_logging')
+    def test_load_keeps_previous_index_on_error(self, mock_print_logging, tmp_path):
+        registry, _, _ = make_registry(tmp_path)
+        registry.load()
+        registry.env = MagicMock()
+        registry.env.list_templates.side_effect = Exception("boom")
+
+        assert registry.load() == 1
+        assert registry.exists("default_template.html") is True
+        mock_print_logging.assert_called_once()
+
+    def test_start_is_noop_when_polling_disabled(self, tmp_path):
+        registry, _, _ = make_registry(tmp_path, poll_interval=0)
+
+        registry.start()
+
+        assert registry._thread is None
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from app.utils.template_utils import render_email_template
+from app.utils.template_utils import render_email_template, precompile_templates
 
 
 class TestRenderEmailTemplate:
@@ -67,3 +67,27 @@ class TestRenderEmailTemplate:
 
         mock_template.render.assert_called_once_with(items=['Item 1', 'Item 2'])
         assert '<ul>' in result
+
+
+class TestPrecompileTemplates:
+    @patch('app.utils.template_utils.jinja_env')
+    @patch('app.utils.template_utils.print_logging')
+    def test_precompile_templates_compiles_every_template(self, mock_print_logging, mock_jinja_env):
+        mock_jinja_env.list_templates.return_value = ['default_template.html', 'welcome.html']
+
+        result = precompile_templates()
+
+        assert result == 2
+        mock_jinja_env.list_templates.assert_called_once_with(extensions=['html'])
+        assert mock_jinja_env.get_template.call_count == 2
+
+    @patch('app.utils.template_utils.jinja_env')
+    @patch('app.utils.template_utils.print_logging')
+    def test_precompile_templates_skips_broken_template(self, mock_print_logging, mock_jinja_env):
+        mock_jinja_env.list_templates.return_value = ['broken.html', 'welcome.html']
+        mock_jinja_env.get_template.side_effect = [Exception('Syntax error'), MagicMock()]
+
+        result = precompile_templates()
+
+        assert result == 1
+        mock_print_logging.assert_called_once()
@@ -0,0 +1,138 @@
+import smtplib
+import pytest
+from unittest.mock import patch, MagicMock
+from app.utils.worker_utils import callback, schedule_stats_log
+from app.utils.retry_utils import RetryPolicy
+
+
+EMAIL = {'id': 'email-1', 'subject': 'Hi', 'body': '<p>Hi</p>', 'to_address': ['a@example.com'], 'cc_addresses': None, 'bcc_addresses': None, 'attachments': []}
+
+
+@pytest.fixture
+def pipeline():
+    policy = RetryPolicy(max_retries=3, base_delay=30, max_delay=900, jitter=0)
+    with patch('app.utils.worker_utils.decode_message') as mock_decode, \
+         patch('app.utils.worker_utils.prepare_email') as mock_prepare, \
+         patch('app.utils.worker_utils.send_email_via_smtp') as mock_send, \
+         patch('app.utils.worker_utils.update_email_status') as mock_update, \
+         patch('app.utils.worker_utils.retry_policy', policy), \
+         patch('app.utils.worker_utils.print_logging'):
+        mock_decode.return_value = {'id': 'email-1', 'email_type': 'welcome'}
+        mock_prepare.return_value = EMAIL
+        yield {'send': mock_send, 'update': mock_update, 'decode': mock_decode}
+
+
+def published(channel, routing_key):
+    return [c.kwargs for c in channel.basic_publish.call_args_list if c.kwargs['routing_key'] == routing_key]
+
+
+class TestCallback:
+    def test_sent_email_is_acked_after_status_update(self, pipeline, make_delivery):
+        channel = MagicMock()
+        pipeline['send'].return_value = (True, 'success')
+        order = []
+        pipeline['update'].side_effect = lambda status, email_id: order.append(('status', status)) or True
+        channel.basic_ack.side_effect = lambda delivery_tag: order.append(('ack',))
+
+        callback(channel, *make_delivery())
+
+        assert order == [('status', 1), ('ack',)]
+        channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    def test_sent_email_is_dead_lettered_when_status_update_fails(self, pipeline, make_delivery):
+        channel = MagicMock()
+        pipeline['send'].return_value = (True, 'success')
+        pipeline['update'].return_value = False
+
+        callback(channel, *make_delivery())
+
+        dead_letter = channel.basic_publish.call_args.kwargs
+        assert dead_letter['exchange'] == 'email.high.dlx'
+        assert dead_letter['properties'].headers['x-failure-reason'] == 'status_update_failed'
+        channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    def test_failed_attempt_is_republished_to_retry_queue_before_ack(self, pipeline, make_delivery):
+        channel = MagicMock()
+        pipeline['send'].return_value = (False, ConnectionRefusedError('Connection refused'))
+
+        callback(channel, *make_delivery({'x-envelope-version': 2}))
+
+        assert [c[0] for c in channel.mock_calls] == ['basic_publish', 'basic_ack']
+        retry = published(channel, 'email.high.retry.30s')[0]
+        assert retry['exchange'] == ''
+        assert retry['body'] == b'body-7'
+        assert retry['properties'].headers == {'x-envelope-version': 2, 'x-attempt': 2}
+        assert retry['properties'].expiration == '30000'
+        pipeline['update'].assert_not_called()
+
+    def test_permanent_smtp_error_is_not_retried(self, pipeline, make_delivery):
+        channel = MagicMock()
+        pipeline['send'].return_value = (False, smtplib.SMTPResponseException(550, b'No such user'))
+
+        callback(channel, *make_delivery())
+
+        assert not published(channel, 'email.high.retry.30s')
+        dead_letter = channel.basic_publish.call_args.kwargs
+        assert dead_letter['exchange'] == 'email.high.dlx'
+        assert dead_letter['properties'].headers['x-failure-reason'] == 'smtp_permanent'
+        pipeline['update'].assert_called_once_with(2, 'email-1')
+        channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    def test_last_attempt_is_marked_failed_and_dead_lettered(self, pipeline, make_delivery):
+        channel = MagicMock()
+        pipeline['send'].return_value = (False, ConnectionRefusedError('Connection refused'))
+
+        callback(channel, *make_delivery({'x-attempt': 3}))
+
+        pipeline['update'].assert_called_once_with(2, 'email-1')
+        dead_letter = channel.basic_publish.call_args.kwargs
+        assert dead_letter['exchange'] == 'email.high.dlx'
+        assert dead_letter['routing_key'] == 'email.high'
+        headers = dead_letter['properties'].headers
+        assert headers['x-failure-reason'] == 'retries_exhausted'
+        assert headers['x-email-id'] == 'email-1'
+        assert headers['x-attempt'] == 3
+        channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    def test_undecodable_message_is_dead_lettered(self, pipeline, make_delivery):
+        channel = MagicMock()
+        pipeline['decode'].side_effect = ValueError('bad payload')
+
+        callback(channel, *make_delivery())
+
+        assert channel.basic_publish.call_args.kwargs['properties'].headers['x-failure-reason'] == 'decode_error'
+        pipeline['send'].assert_not_called()
+        channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    def test_message_is_rejected_when_dead_letter_publish_fails(self, pipeline, make_delivery):
+        channel = MagicMock()
+        channel.basic_publish.side_effect = ConnectionError('channel closed')
+        pipeline['send'].return_value = (False, smtplib.SMTPResponseException(550, b'No such user'))
+
+        callback(channel, *make_delivery())
+
+        channel.basic_nack.assert_called_once_with(delivery_tag=7, requeue=False)
+        channel.basic_ack.assert_not_called()
+
+
+class TestScheduleStatsLog:
+    @patch('app.utils.worker_utils.print_logging')
+    @patch('app.utils.worker_utils.smtp_pool')
+    def test_stats_are_logged_on_every_interval(self, mock_smtp_pool, mock_logging):
+        connection = MagicMock()
+        render_cache = MagicMock()
+        render_cache.stats.return_value = {'hits': 3}
+        mock_smtp_pool.stats.return_value = {'reused': 5}
+
+        with patch('app.utils.worker_utils.render_cache', render_cache):
+            schedule_stats_log(connection, 300)
+            mock_logging.assert_not_called()
+
+            interval, log_and_reschedule = connection.call_later.call_args.args
+            log_and_reschedule()
+
+        assert interval == 300
+        assert [c.args[1] for c in mock_logging.call_args_list] == [
+            "SMTP pool stats: {'reused': 5}", "Render cache stats: {'hits': 3}"
+        ]
+        assert connection.call_later.call_args_list[1].args == (300, log_and_reschedule)